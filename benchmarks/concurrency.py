@@ -0,0 +1,167 @@
+"""
+Throughput of the async API against the old sync handlers under high concurrency.
+
+    python -m benchmarks.concurrency --concurrency 500 --requests 20000
+
+Starts two uvicorn servers on the same generated SQLite database: the real
+app (async handlers on AsyncSession) and `sync_app` below, which serves the
+same read endpoints the way they were written before, as sync `def`s on a
+blocking Session. Each is then hit by --concurrency open connections.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException
+
+from benchmarks.run import DEFAULT_WORKDIR, Dataset
+
+PATHS = ["/tracks/{id}", "/likes/{id}"]
+
+
+# -------------------------------
+# Sync reference app
+# -------------------------------
+def _sync_get_db():
+    from music_app.db import SessionLocal
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+sync_app = FastAPI(title="Music App (sync reference)")
+
+
+@sync_app.get("/health")
+def sync_health():
+    return {"status": "ok"}
+
+
+@sync_app.get("/tracks/{track_id}")
+def sync_get_track(track_id: int, db=Depends(_sync_get_db)):
+    from music_app.models import Track
+    track = db.query(Track).filter(Track.id == track_id).first()
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    return {"id": track.id, "title": track.title, "artist": track.artist, "album": track.album}
+
+
+@sync_app.get("/likes/{user_id}")
+def sync_list_user_likes(user_id: int, db=Depends(_sync_get_db)):
+    from music_app.models import UserLike
+    likes = db.query(UserLike).filter(UserLike.user_id == user_id).all()
+    return [
+        {"id": l.id, "track": {"id": l.track.id, "title": l.track.title, "artist": l.track.artist}}
+        for l in likes
+    ]
+
+
+# -------------------------------
+# Load generator
+# -------------------------------
+async def load(base_url: str, paths: List[str], concurrency: int, total: int, id_range: int) -> Dict:
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def worker(n: int):
+            nonlocal issued, errors
+            while issued < total:
+                i = issued
+                issued += 1
+                path = paths[i % len(paths)].format(id=1 + (i * 7919) % id_range)
+                start = time.perf_counter()
+                try:
+                    r = await client.get(path)
+                    if r.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def _serve(app_path: str, port: int, database_url: str) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": database_url}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port),
+         "--log-level", "warning", "--no-access-log", "--backlog", "4096"],
+        env=env,
+    )
+    import httpx
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"{app_path} did not start on port {port}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare async vs sync handler throughput.")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--size", type=int, default=10_000, help="synthetic uploads in the dataset")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-o", "--output", default="bench_concurrency.json")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(args.workdir, 'app.db')}")
+    dataset = Dataset(args.workdir, args.size)
+    database_url = f"sqlite:///{os.path.abspath(dataset.path)}"
+    id_range = max(10, args.size // 10)
+
+    results = {}
+    for name, app_path, port in [
+        ("async", "music_app.main:app", args.port),
+        ("sync", "benchmarks.concurrency:sync_app", args.port + 1),
+    ]:
+        proc = _serve(app_path, port, database_url)
+        try:
+            results[name] = asyncio.run(
+                load(f"http://127.0.0.1:{port}", PATHS, args.concurrency, args.requests, id_range)
+            )
+        finally:
+            proc.terminate()
+            proc.wait()
+        r = results[name]
+        print(f"{name:<6} {r['throughput_rps']:>9.0f} req/s  p50 {r['p50_ms']:>7.1f} ms  "
+              f"p99 {r['p99_ms']:>7.1f} ms  errors {r['errors']}", file=sys.stderr)
+
+    with open(args.output, "w") as f:
+        json.dump({"concurrency": args.concurrency, "size": args.size, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
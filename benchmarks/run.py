@@ -0,0 +1,389 @@
+"""
+Benchmarks for the recommendation and similarity hot paths, and startup.
+
+    python -m benchmarks.run                                  # 1k and 100k uploads
+    python -m benchmarks.run --sizes 1000 100000 1000000 -o results.json
+    python -m benchmarks.run --compare baseline.json          # fail on regressions
+
+Sized cases run against a SQLite database filled by `music_app.generate`;
+databases are cached in --workdir so the expensive 1M build happens once.
+Results are written as JSON so runs can be diffed with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_SIZES = [1_000, 100_000]
+DEFAULT_WORKDIR = ".bench"
+SEED = 1234
+
+CASES: List[Dict] = []
+
+
+def case(name: str, sized: bool = True):
+    """Register a benchmark; the function returns the zero-argument callable to time."""
+    def register(fn):
+        CASES.append({"name": name, "sized": sized, "setup": fn})
+        return fn
+    return register
+
+
+def measure(fn: Callable[[], object], min_time: float = 0.2, rounds: int = 5) -> Dict[str, float]:
+    """Time `fn`, batching fast calls so each round lasts at least `min_time`."""
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    number = max(1, int(min_time / first)) if first > 0 else 1000
+    if first > 5 * min_time:
+        rounds = min(rounds, 3)
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "mean_s": statistics.fmean(samples),
+        "rounds": rounds,
+        "calls_per_round": number,
+    }
+
+
+# -------------------------------
+# Fixtures
+# -------------------------------
+def _missing_columns(engine) -> bool:
+    from sqlalchemy import inspect
+    from music_app.db import Base
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        have = {c["name"] for c in inspector.get_columns(table.name)}
+        if have and not set(table.c.keys()) <= have:
+            return True
+    return False
+
+
+class Dataset:
+    """A generated SQLite database plus an app client bound to it."""
+
+    def __init__(self, workdir: str, size: int):
+        from sqlalchemy import create_engine
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        from music_app.db import Base, make_async_engine
+        from music_app.generate import generate
+        from music_app.utils.schema import ensure_indexes
+        from music_app.utils.search import ensure_search_index
+
+        self.size = size
+        path = os.path.join(workdir, f"uploads_{size}_seed{SEED}.db")
+        self.path = path
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        if os.path.exists(path) and _missing_columns(self.engine):
+            self.engine.dispose()
+            os.remove(path)  # cached before a column was added; cheaper to regenerate than to patch
+        fresh = not os.path.exists(path)
+        if fresh:
+            Base.metadata.create_all(bind=self.engine)
+            generate(
+                self.engine,
+                users=max(10, size // 10),
+                tracks=max(100, min(size, 100_000)),
+                uploads=size,
+                likes_per_user=50,
+                history_per_user=0,
+                seed=SEED,
+                log=lambda msg: print(f"  [{size}] {msg}", file=sys.stderr),
+            )
+        with self.engine.begin() as conn:
+            # datasets cached before these indexes existed
+            ensure_indexes(conn)
+            ensure_search_index(conn)
+        self.async_engine = make_async_engine(f"sqlite:///{path}")
+        self.AsyncSessionLocal = async_sessionmaker(self.async_engine, expire_on_commit=False)
+        self._client = None
+
+    def client(self):
+        """A TestClient kept open so every call shares one event loop and pool."""
+        from fastapi.testclient import TestClient
+        from music_app.db import get_db
+        from music_app.main import app
+        from music_app.utils.response_cache import response_cache
+
+        response_cache.backend = None  # measure the handlers; the cached path has its own case
+
+        async def override_get_db():
+            async with self.AsyncSessionLocal() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = override_get_db
+        if self._client is None:
+            self._client = TestClient(app)
+            self._client.__enter__()
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            self._client.__exit__(None, None, None)
+            self._client = None
+
+
+def synthetic_candidates(size: int):
+    from music_app.generate import synthetic_features
+    rng = np.random.default_rng([SEED, size])
+    feats = synthetic_features(rng, size + 1)
+    return feats[0], list(enumerate(feats[1:], start=1))
+
+
+def synthetic_audio(workdir: str, seconds: float = 30.0, sr: int = 22050) -> str:
+    import soundfile as sf
+    path = os.path.join(workdir, f"tone_{int(seconds)}s.wav")
+    if not os.path.exists(path):
+        rng = np.random.default_rng(SEED)
+        t = np.arange(int(seconds * sr)) / sr
+        clicks = (np.sin(2 * np.pi * 2.0 * t) > 0.99).astype(float)  # 120 bpm pulse
+        y = 0.3 * np.sin(2 * np.pi * 440.0 * t) + 0.5 * clicks + 0.05 * rng.standard_normal(t.size)
+        sf.write(path, y.astype(np.float32), sr)
+    return path
+
+
+# -------------------------------
+# Cases
+# -------------------------------
+@case("similarity.features_to_vector", sized=False)
+def bench_similarity_vector(ctx, size):
+    from music_app.utils.similarity import features_to_vector
+    target, _ = synthetic_candidates(1)
+    return lambda: features_to_vector(target)
+
+
+@case("top_k_similar")
+def bench_top_k_similar(ctx, size):
+    from music_app.utils.similarity import top_k_similar
+    target, candidates = synthetic_candidates(size)
+    return lambda: top_k_similar(target, candidates, k=10)
+
+
+@case("feature_store.top_k")
+def bench_feature_store(ctx, size):
+    from music_app.utils.feature_store import FeatureStore
+    from music_app.utils.similarity import features_to_vector
+    target, candidates = synthetic_candidates(size)
+    store = FeatureStore(os.path.join(ctx["workdir"], f"store_{size}_seed{SEED}"))
+    if not store.exists():
+        store.append([uid for uid, _ in candidates], np.stack([features_to_vector(f) for _, f in candidates]))
+    vec = features_to_vector(target)
+    return lambda: store.top_k(vec, k=10)
+
+
+@case("GET /recommendations")
+def bench_recommendations(ctx, size):
+    client = ctx["dataset"](size).client()
+    return lambda: client.get("/recommendations", params={"upload_id": 1, "k": 10})
+
+
+@case("GET /recommendations (cached)")
+def bench_recommendations_cached(ctx, size):
+    from music_app.utils.response_cache import MemoryBackend, response_cache
+    client = ctx["dataset"](size).client()
+    response_cache.backend = MemoryBackend(ttl=3600)
+    client.get("/recommendations", params={"upload_id": 1, "k": 10})
+    return lambda: client.get("/recommendations", params={"upload_id": 1, "k": 10})
+
+
+@case("GET /uploads/{id}/similar")
+def bench_similar_uploads(ctx, size):
+    client = ctx["dataset"](size).client()
+    return lambda: client.get("/uploads/1/similar", params={"k": 10})
+
+
+@case("GET /search")
+def bench_search(ctx, size):
+    client = ctx["dataset"](size).client()
+    return lambda: client.get("/search", params={"q": "golden riv", "limit": 20, "fallback": False})
+
+
+@case("GET /search/autocomplete")
+def bench_autocomplete(ctx, size):
+    client = ctx["dataset"](size).client()
+    client.get("/search/autocomplete", params={"q": "ne"})  # build the prefix index outside the timing
+    return lambda: client.get("/search/autocomplete", params={"q": "ne", "limit": 10})
+
+
+# full-table listings: at --sizes 10000 these are the 10k-row responses
+@case("GET /tracks/all")
+def bench_list_tracks(ctx, size):
+    client = ctx["dataset"](size).client()
+    return lambda: client.get("/tracks/all")
+
+
+@case("GET /uploads/all")
+def bench_list_uploads(ctx, size):
+    client = ctx["dataset"](size).client()
+    return lambda: client.get("/uploads/all")
+
+
+@case("GET /likes/{user_id}")
+def bench_list_user_likes(ctx, size):
+    client = ctx["dataset"](size).client()
+    return lambda: client.get("/likes/1")
+
+
+@case("GET /likes/{user_id}/contains")
+def bench_check_likes(ctx, size):
+    client = ctx["dataset"](size).client()
+    page = {"track_id": list(range(1, 51))}  # one page of results
+    client.get("/likes/1/contains", params=page)  # load the user's set outside the timing
+    return lambda: client.get("/likes/1/contains", params=page)
+
+
+@case("analyze_file", sized=False)
+def bench_analyze_file(ctx, size):
+    from music_app.utils.audio import analyze_file
+    path = synthetic_audio(ctx["workdir"])
+    return lambda: analyze_file(path)
+
+
+@case("analyze_file (canonical pcm)", sized=False)
+def bench_analyze_canonical(ctx, size):
+    from music_app.utils.audio import analyze_file, transcode
+    src = synthetic_audio(ctx["workdir"])
+    path = os.path.join(ctx["workdir"], "canonical_" + os.path.basename(src))
+    if not os.path.exists(path):
+        os.link(src, path)
+        transcode(path)
+    return lambda: analyze_file(path)
+
+
+def _python(code: str, env: Dict[str, str]) -> Callable[[], None]:
+    """A fresh interpreter running `code`: what a worker pays before it can serve."""
+    env = {**os.environ, **env}
+    return lambda: subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
+
+@case("startup: import music_app.main", sized=False)
+def bench_import_app(ctx, size):
+    return _python("import music_app.main", {"DB_AUTO_MIGRATE": "false"})
+
+
+@case("startup: first request (migrated db)", sized=False)
+def bench_first_request(ctx, size):
+    code = (
+        "from fastapi.testclient import TestClient\n"
+        "from music_app.main import app\n"
+        "with TestClient(app) as client:\n"
+        "    client.get('/health').raise_for_status()\n"
+    )
+    run_once = _python(code, {"DB_AUTO_MIGRATE": "true"})
+    run_once()  # the timed runs find the database already at head, like a restart does
+    return run_once
+
+
+# -------------------------------
+# Runner
+# -------------------------------
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes: List[int], workdir: str, only: Optional[List[str]] = None) -> Dict:
+    os.makedirs(workdir, exist_ok=True)
+    # music_app.db builds its engine at import time; keep it off the real database
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'app.db')}")
+    # datasets build their own schema; the startup cases opt back in
+    os.environ.setdefault("DB_AUTO_MIGRATE", "false")
+
+    datasets: Dict[int, Dataset] = {}
+
+    def dataset(size: int) -> Dataset:
+        if size not in datasets:
+            datasets[size] = Dataset(workdir, size)
+        return datasets[size]
+
+    ctx = {"workdir": workdir, "dataset": dataset}
+    results = []
+    for bench in CASES:
+        if only and not any(sel in bench["name"] for sel in only):
+            continue
+        for size in (sizes if bench["sized"] else [None]):
+            fn = bench["setup"](ctx, size)
+            stats = measure(fn)
+            results.append({"name": bench["name"], "size": size, **stats})
+            label = f"{bench['name']} [{size}]" if size else bench["name"]
+            print(f"{label:<45} {stats['median_s'] * 1000:>10.3f} ms", file=sys.stderr)
+
+    for data in datasets.values():
+        data.close()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Return a line per case that got slower than `threshold` x the baseline median."""
+    before = {(r["name"], r["size"]): r["median_s"] for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        old = before.get((r["name"], r["size"]))
+        if not old:
+            continue
+        ratio = r["median_s"] / old
+        line = f"{r['name']} [{r['size']}]: {old * 1000:.3f} ms -> {r['median_s'] * 1000:.3f} ms ({ratio:.2f}x)"
+        print(line, file=sys.stderr)
+        if ratio > threshold:
+            regressions.append(line)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run music_app benchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="synthetic upload counts for sized cases")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="where datasets are cached")
+    parser.add_argument("-k", "--only", nargs="+", help="run cases whose name contains any of these")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.workdir, args.only)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(current, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold}x", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
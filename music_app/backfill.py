@@ -0,0 +1,212 @@
+"""
+Batched, resumable data backfills.
+
+    python -m music_app.backfill --status
+    python -m music_app.backfill --pending              # whatever migrations queued
+    python -m music_app.backfill like_counts --batch-size 5000 --duty 0.25
+
+Migrations only change the schema cheaply (nullable columns, no table
+rewrites); filling the new columns in on a big table is a backfill. Each
+one walks its table in primary-key order, a batch of ids at a time, and
+every batch commits together with its progress in backfill_state, so an
+interrupted run picks up after the last committed batch. Between batches
+the runner sleeps so the database spends at most --duty of the wall time
+on the backfill, and on PostgreSQL a batch waits at most LOCK_TIMEOUT for
+row locks instead of queueing the app's writes behind it.
+
+New backfills register with @backfill and are queued by the migration
+that needs them (an INSERT into backfill_state).
+"""
+import argparse
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import create_engine, insert, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from music_app.models import BackfillState
+from music_app.utils.likes import recount_like_counts
+from music_app.utils.response_cache import TRACKS, response_cache
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+LOCK_TIMEOUT = "5s"
+
+state_table = BackfillState.__table__
+
+
+@dataclass(frozen=True)
+class Backfill:
+    name: str
+    table: str  # walked by its integer `id` primary key
+    apply: Callable[[Connection, int, int], None]  # fills in rows with lo <= id <= hi
+    description: str
+    invalidates: Sequence[str] = ()  # response-cache tags the batches change
+
+
+BACKFILLS: Dict[str, Backfill] = {}
+
+
+def backfill(name: str, table: str, description: str, invalidates: Sequence[str] = ()):
+    def register(fn: Callable[[Connection, int, int], None]):
+        BACKFILLS[name] = Backfill(name, table, fn, description, tuple(invalidates))
+        return fn
+    return register
+
+
+# -------------------------------
+# Registered backfills
+# -------------------------------
+@backfill("like_counts", "tracks", "recount tracks.like_count from user_likes", invalidates=[TRACKS])
+def _like_counts(conn: Connection, lo: int, hi: int) -> None:
+    recount_like_counts(conn, lo, hi)
+
+
+@backfill("users_created_at", "users", "set missing users.created_at to the user's first upload, else now")
+def _users_created_at(conn: Connection, lo: int, hi: int) -> None:
+    conn.execute(text(
+        "UPDATE users SET created_at = COALESCE("
+        "(SELECT MIN(uploads.uploaded_at) FROM uploads WHERE uploads.user_id = users.id), "
+        "CURRENT_TIMESTAMP) "
+        "WHERE id BETWEEN :lo AND :hi AND created_at IS NULL"
+    ), {"lo": lo, "hi": hi})
+
+
+# -------------------------------
+# Runner
+# -------------------------------
+class DutyCycle:
+    """Sleep after each batch so batches take at most `duty` of the wall time."""
+
+    def __init__(self, duty: float, sleep: Callable[[float], None] = time.sleep):
+        if not 0 < duty <= 1:
+            raise ValueError("duty must be in (0, 1]")
+        self.duty = duty
+        self._sleep = sleep
+
+    def pace(self, busy: float) -> float:
+        """Call with how long the batch took; returns how long it slept."""
+        delay = busy * (1 - self.duty) / self.duty
+        if delay:
+            self._sleep(delay)
+        return delay
+
+
+def _claim_state(conn: Connection, name: str):
+    """The backfill's progress row, locked for this batch on databases that can."""
+    query = select(state_table).where(state_table.c.name == name).with_for_update()
+    state = conn.execute(query).first()
+    if state is None:
+        conn.execute(insert(state_table).values(name=name, last_id=0, rows=0, done=False))
+        state = conn.execute(query).first()
+    return state
+
+
+def run_backfill(
+    engine: Engine,
+    name: str,
+    batch_size: int = BATCH_SIZE,
+    duty: float = 0.5,
+    max_batches: Optional[int] = None,
+    throttle: Optional[DutyCycle] = None,
+) -> Dict[str, int]:
+    """Run `name` until it is done or `max_batches` have committed; returns this run's counts."""
+    spec = BACKFILLS[name]
+    throttle = throttle or DutyCycle(duty)
+    counts = {"batches": 0, "rows": 0, "done": 0}
+
+    while max_batches is None or counts["batches"] < max_batches:
+        started = time.monotonic()
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+            state = _claim_state(conn, name)
+            if state.done:
+                counts["done"] = 1
+                break
+            ids = conn.execute(
+                text(f"SELECT id FROM {spec.table} WHERE id > :last ORDER BY id LIMIT :n"),
+                {"last": state.last_id, "n": batch_size},
+            ).scalars().all()
+            progress = {"updated_at": text("CURRENT_TIMESTAMP")}
+            if ids:
+                spec.apply(conn, ids[0], ids[-1])
+                progress.update(last_id=ids[-1], rows=state_table.c.rows + len(ids))
+            else:
+                progress.update(done=True)
+            conn.execute(update(state_table).where(state_table.c.name == name).values(**progress))
+        if not ids:
+            counts["done"] = 1
+            logger.info("Backfill %s finished", name)
+            break
+        counts["batches"] += 1
+        counts["rows"] += len(ids)
+        # after the commit, so a reader can't re-cache what the batch replaced
+        response_cache.invalidate_sync(*spec.invalidates)
+        throttle.pace(time.monotonic() - started)
+    return counts
+
+
+def backfill_status(engine: Engine) -> List[Dict]:
+    with engine.connect() as conn:
+        rows = conn.execute(select(state_table).order_by(state_table.c.name)).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def pending_backfills(engine: Engine) -> List[str]:
+    return [row["name"] for row in backfill_status(engine) if not row["done"] and row["name"] in BACKFILLS]
+
+
+def reset_backfill(engine: Engine, name: str) -> None:
+    """Start `name` over from the first id on its next run."""
+    with engine.begin() as conn:
+        _claim_state(conn, name)
+        conn.execute(update(state_table).where(state_table.c.name == name).values(last_id=0, rows=0, done=False))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run batched data backfills.")
+    parser.add_argument("names", nargs="*", metavar="NAME",
+                        help=f"backfills to run: {', '.join(sorted(BACKFILLS))}")
+    parser.add_argument("--pending", action="store_true", help="run every queued backfill that hasn't finished")
+    parser.add_argument("--status", action="store_true", help="show progress and exit")
+    parser.add_argument("--restart", action="store_true", help="start the named backfills over")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--duty", type=float, default=0.5, help="fraction of wall time spent in batches")
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches each")
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+    unknown = [n for n in args.names if n not in BACKFILLS]
+    if unknown:
+        parser.error(f"unknown backfill: {', '.join(unknown)}")
+    logging.basicConfig(level=logging.INFO)
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from music_app.db import engine
+
+    if args.status:
+        for row in backfill_status(engine):
+            state = "done" if row["done"] else f"at id {row['last_id']}"
+            print(f"{row['name']}: {state}, {row['rows']} rows")
+        return
+
+    names = list(args.names) + (pending_backfills(engine) if args.pending else [])
+    if not names:
+        parser.error("name a backfill, or pass --pending or --status")
+    throttle = DutyCycle(args.duty)
+    for name in dict.fromkeys(names):
+        if args.restart:
+            reset_backfill(engine, name)
+        counts = run_backfill(engine, name, batch_size=args.batch_size,
+                              max_batches=args.max_batches, throttle=throttle)
+        state = "done" if counts["done"] else "paused"
+        print(f"{name}: {counts['rows']} rows in {counts['batches']} batches ({state})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,164 @@
 import os
-from sqlalchemy import create_engine
+from fastapi import Depends
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
 from dotenv import load_dotenv
+from music_app.utils.metrics import instrument_sqlalchemy
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Engines connect lazily, so importing this module never touches the database.
+# Only dev and test (ENV=dev / ENV=test) fall back to a local SQLite file;
+# anywhere else a missing DATABASE_URL is an error, not a fresh empty database.
+ENV = os.getenv("ENV", "production")
+DEV_DATABASE_URL = "sqlite:///./app.db"
+DATABASE_URL = os.getenv("DATABASE_URL") or (DEV_DATABASE_URL if ENV in ("dev", "test") else None)
+# Optional read replica; read-only endpoints use it when set
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Run pending migrations when the app starts; turn off where a deploy step runs `alembic upgrade head`
+DB_AUTO_MIGRATE = _env_bool("DB_AUTO_MIGRATE", True)
+
+
+def pool_options(url: str) -> dict:
+    """Engine pool settings from DB_POOL_* environment variables."""
+    options = {
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+    # SQLite uses a per-thread pool that has no size/overflow knobs
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+            pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        )
+    return options
+
+
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def enforce_foreign_keys(engine):
+    """
+    SQLite ignores FOREIGN KEY clauses unless each connection opts in; turn
+    them on so writes can rely on the constraint, as they do on Postgres.
+    Accepts sync or async engines.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _sqlite_foreign_keys)
+    return engine
+
+
+class DatabaseNotConfigured(RuntimeError):
+    pass
+
+
+def require_database_url() -> str:
+    if DATABASE_URL is None:
+        raise DatabaseNotConfigured(
+            f"DATABASE_URL is not set; set it, or set ENV=dev to use {DEV_DATABASE_URL}"
+        )
+    return DATABASE_URL
+
+
+def _unconfigured(*args, **kwargs):
+    require_database_url()
+
+
+async def _unconfigured_async(*args, **kwargs):
+    require_database_url()
+
+
+def make_engine(url: str, **kwargs):
+    return enforce_foreign_keys(create_engine(url, **{**pool_options(url), **kwargs}))
+
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_url(url: str):
+    """The same database through its asyncio driver (asyncpg / aiosqlite)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def make_async_engine(url: str, **kwargs):
+    return enforce_foreign_keys(create_async_engine(async_url(url), **{**pool_options(url), **kwargs}))
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to a replica once marked read-only.
+
+    Anything that writes (flushes, INSERT/UPDATE/DELETE statements) always
+    goes to the primary, so a read-only session can't write to the replica.
+    """
+
+    def __init__(self, primary=None, replica=None, **kwargs):
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.replica = replica or primary
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.primary is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self.info.get("read_only") and not self._flushing and not isinstance(clause, UpdateBase):
+            return self.replica
+        return self.primary
+
+
+# Sync engine/session for scripts (create_all, generators, migrations).
+# Without a DATABASE_URL they still import, and fail on first connect.
+engine = make_engine(DATABASE_URL) if DATABASE_URL else create_engine("sqlite://", creator=_unconfigured)
+replica_engine = make_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+SessionLocal = sessionmaker(
+    class_=RoutingSession, primary=engine, replica=replica_engine, autocommit=False, autoflush=False
+)
+
+# Async engine/session used by the API
+async_engine = (
+    make_async_engine(DATABASE_URL) if DATABASE_URL
+    else create_async_engine("sqlite+aiosqlite://", async_creator=_unconfigured_async)
+)
+async_replica_engine = make_async_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=RoutingSession,
+    primary=async_engine.sync_engine,
+    replica=async_replica_engine.sync_engine if async_replica_engine else None,
+    autoflush=False,
+    expire_on_commit=False,
+)
 
 Base = declarative_base()
 
+instrument_sqlalchemy()
+
 # Dependency for FastAPI
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+# Dependency for endpoints that only read; routed to the replica if there is one
+def get_read_db(db: AsyncSession = Depends(get_db)):
+    db.info["read_only"] = True
+    return db
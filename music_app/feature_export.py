@@ -0,0 +1,103 @@
+"""
+Export analysed upload features into the memory-mapped feature store.
+
+    python -m music_app.feature_export export --out /var/lib/music/features
+    python -m music_app.feature_export export --out /var/lib/music/features --incremental
+    python -m music_app.feature_export compact --out /var/lib/music/features
+
+A full export builds a fresh store from every analysed upload and swaps
+it in, so uploads deleted or no longer analysed drop out; it also repairs
+a store that has drifted. --incremental only appends uploads with an id
+above the highest one already stored. Point the API at the result
+with FEATURE_STORE_DIR.
+"""
+import argparse
+import json
+from typing import Callable, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine, select
+from sqlalchemy.engine import Engine
+
+from music_app.models import Upload
+from music_app.utils.feature_store import FeatureStore
+from music_app.utils.similarity import features_to_vector
+
+BATCH_SIZE = 10_000
+
+
+def vectorize_rows(rows) -> tuple:
+    """(id, features JSON) rows -> (ids, matrix); rows that don't vectorize are skipped."""
+    ids, vectors = [], []
+    for upload_id, features in rows:
+        vec = features_to_vector(json.loads(features))
+        if vec is not None:
+            ids.append(upload_id)
+            vectors.append(vec)
+    return np.asarray(ids, dtype=np.int64), np.asarray(vectors, dtype=np.float32)
+
+
+def export_features(
+    engine: Engine,
+    store: FeatureStore,
+    incremental: bool = False,
+    batch_size: int = BATCH_SIZE,
+    log: Callable[[str], None] = lambda msg: None,
+) -> int:
+    """Write analysed uploads to `store`: all of them in place of its contents, or only newer ones; returns the row count."""
+    query = select(Upload.id, Upload.features).where(Upload.features.isnot(None)).order_by(Upload.id)
+    if incremental and store.exists():
+        stored = store.ids()
+        if stored.size:
+            query = query.where(Upload.id > int(stored.max()))
+
+    id_parts: List[np.ndarray] = []
+    vec_parts: List[np.ndarray] = []
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for rows in result.partitions():
+            ids, vectors = vectorize_rows(rows)
+            if ids.size:
+                id_parts.append(ids)
+                vec_parts.append(vectors)
+                log(f"vectorized {sum(len(p) for p in id_parts)} uploads")
+
+    if not incremental:
+        if id_parts:
+            store.replace(np.concatenate(id_parts), np.concatenate(vec_parts))
+        elif store.exists():
+            store.refresh()
+            store.replace([], np.empty((0, store.dim), dtype=np.float32))
+    elif id_parts:
+        store.append(np.concatenate(id_parts), np.concatenate(vec_parts))
+        store.compact_if_needed()
+    if not id_parts:
+        log("nothing to export")
+    return sum(len(p) for p in id_parts)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the feature store.")
+    parser.add_argument("command", choices=["export", "compact"])
+    parser.add_argument("--out", required=True, help="feature store directory")
+    parser.add_argument("--incremental", action="store_true", help="only append uploads newer than the store")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    store = FeatureStore(args.out)
+    if args.command == "compact":
+        store.compact()
+        print(f"compacted {args.out}: {len(store)} vectors")
+        return
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from music_app.db import engine
+    count = export_features(engine, store, args.incremental, args.batch_size, log=print)
+    print(f"exported {count} uploads to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
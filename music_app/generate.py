@@ -0,0 +1,325 @@
+"""
+Synthetic load-test data generator.
+
+    python -m music_app.generate --users 1000000 --tracks 200000 --uploads 500000 \\
+        --likes-per-user 20 --history-per-user 50 --seed 42
+
+Rows are produced column-wise with NumPy, one batch at a time, and written
+with a single executemany per batch (COPY on Postgres/psycopg2), so memory
+stays flat and run time grows linearly with the row counts. The same seed
+and batch size always produce the same data.
+"""
+import argparse
+import csv
+import io
+import json
+import time
+from datetime import datetime, timedelta
+from math import gcd
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.engine import Engine
+
+from music_app.migrations import upgrade_database
+from music_app.models import User, Track, Upload, UserLike, UserHistory
+from music_app.utils.likes import recount_like_counts
+from music_app.utils.similarity import FEATURE_VERSION
+
+BATCH_SIZE = 10_000
+
+# Fixed anchor so generated timestamps don't depend on when the run happens
+HISTORY_ANCHOR = datetime(2025, 1, 1)
+
+KEY_LABELS = ['C','C#','D','D#','E','F','F#','G','G#','A','A#','B']
+PROVIDERS = ["spotify", "apple", "soundcloud", "local"]
+WORDS = [
+    "midnight", "echo", "golden", "river", "neon", "summer", "ghost", "velvet",
+    "signal", "paper", "ocean", "fire", "silver", "dream", "city", "rain",
+    "electric", "shadow", "wild", "heart", "glass", "static", "honey", "north",
+]
+FIRST_NAMES = [
+    "Ava", "Leo", "Mia", "Kai", "Zoe", "Eli", "Ivy", "Max", "Nia", "Sam",
+    "Ada", "Jay", "Ruby", "Omar", "Lena", "Theo", "Yara", "Finn", "Maya", "Ezra",
+]
+LAST_NAMES = [
+    "Stone", "Rivers", "Vale", "Hart", "Moreno", "Okafor", "Nguyen", "Fox",
+    "Lark", "Bishop", "Cruz", "Ward", "Sato", "Reyes", "Quinn", "Adeyemi",
+]
+
+# Offsets mixed into the seed so every table draws from its own stream
+TABLE_STREAMS = {"users": 1, "tracks": 2, "uploads": 3, "user_likes": 4, "user_history": 5}
+
+
+def _rng(seed: int, table: str, batch_no: int) -> np.random.Generator:
+    return np.random.default_rng([seed, TABLE_STREAMS[table], batch_no])
+
+
+def _pick(rng: np.random.Generator, words: List[str], n: int) -> np.ndarray:
+    return np.asarray(words, dtype=object)[rng.integers(0, len(words), n)]
+
+
+# -------------------------------
+# Column generators
+# -------------------------------
+def synthetic_features(rng: np.random.Generator, n: int) -> List[Dict]:
+    """Feature dicts with the same keys and ranges as `analyze_file` output."""
+    duration = rng.uniform(90.0, 420.0, n)
+    tempo = np.clip(rng.normal(120.0, 25.0, n), 60.0, 200.0)
+    centroid = rng.gamma(6.0, 350.0, n)
+    contrast = rng.normal(20.0, 4.0, n)
+    zcr = rng.beta(2.0, 20.0, n)
+    rms = rng.gamma(2.0, 0.04, n)
+    mfcc = rng.normal(0.0, 1.0, (n, 13)) * np.linspace(60.0, 5.0, 13) + np.linspace(-200.0, 0.0, 13)
+    keys = rng.integers(0, 12, n)
+    liveness = rng.random(n)
+
+    energy = np.minimum(1.0, rms / 0.1)
+    danceability = np.minimum(1.0, tempo / 200.0)
+    valence = np.clip(0.5 + centroid / 5000.0 - contrast / 5000.0, 0, 1)
+    acousticness = np.maximum(0.0, 1.0 - centroid / 5000.0)
+    instrumentalness = np.maximum(0.0, 1.0 - zcr)
+
+    features = []
+    for i in range(n):
+        beat = 60.0 / tempo[i]
+        features.append({
+            "duration": float(duration[i]),
+            "tempo_bpm": float(tempo[i]),
+            "beat_times": [round(beat * b, 4) for b in range(1, 21)],
+            "key": KEY_LABELS[keys[i]],
+            "spectral_centroid": float(centroid[i]),
+            "spectral_contrast": float(contrast[i]),
+            "zero_crossing_rate": float(zcr[i]),
+            "mfcc": [float(x) for x in mfcc[i]],
+            "rms_energy": float(rms[i]),
+            "energy": float(energy[i]),
+            "danceability": float(danceability[i]),
+            "valence": float(valence[i]),
+            "acousticness": float(acousticness[i]),
+            "instrumentalness": float(instrumentalness[i]),
+            "liveness": float(liveness[i]),
+        })
+    return features
+
+
+def user_rows(rng: np.random.Generator, ids: np.ndarray) -> Dict[str, list]:
+    return {
+        "id": ids.tolist(),
+        "email": [f"user{i}@load.example.com" for i in ids.tolist()],
+        "password": [f"pw{x:08x}" for x in rng.integers(0, 2**32, len(ids)).tolist()],
+    }
+
+
+def track_rows(rng: np.random.Generator, ids: np.ndarray) -> Dict[str, list]:
+    n = len(ids)
+    titles = _pick(rng, WORDS, n) + " " + _pick(rng, WORDS, n)
+    artists = _pick(rng, FIRST_NAMES, n) + " " + _pick(rng, LAST_NAMES, n)
+    return {
+        "id": ids.tolist(),
+        "title": [t.title() for t in titles],
+        "artist": artists.tolist(),
+        "album": [w.capitalize() for w in _pick(rng, WORDS, n)],
+        "provider": _pick(rng, PROVIDERS, n).tolist(),
+        "external_id": [f"gen-{i}" for i in ids.tolist()],
+        "duration": rng.integers(120, 361, n).tolist(),
+    }
+
+
+def upload_rows(rng: np.random.Generator, ids: np.ndarray, user_lo: int, user_hi: int) -> Dict[str, list]:
+    n = len(ids)
+    track_names = _pick(rng, WORDS, n) + " " + _pick(rng, WORDS, n)
+    return {
+        "id": ids.tolist(),
+        "filename": [f"gen_{i}.mp3" for i in ids.tolist()],
+        "user_id": rng.integers(user_lo, user_hi + 1, n).tolist(),
+        "features": [json.dumps(f) for f in synthetic_features(rng, n)],
+        "feature_version": [FEATURE_VERSION] * n,
+        "track_name": [t.title() for t in track_names],
+        "artist_name": (_pick(rng, FIRST_NAMES, n) + " " + _pick(rng, LAST_NAMES, n)).tolist(),
+        "album_name": [w.capitalize() for w in _pick(rng, WORDS, n)],
+    }
+
+
+def like_rows(
+    rng: np.random.Generator, user_ids: np.ndarray, per_user: int,
+    track_lo: int, n_tracks: int, step: int,
+) -> Dict[str, list]:
+    """
+    `per_user` distinct tracks for each user.
+
+    Each user walks the track id space from a random offset with a fixed
+    stride coprime to the track count, which guarantees unique pairs
+    without any per-user sampling loop.
+    """
+    offsets = rng.integers(0, n_tracks, len(user_ids))
+    walk = (offsets[:, None] + np.arange(per_user)[None, :] * step) % n_tracks
+    return {
+        "user_id": np.repeat(user_ids, per_user).tolist(),
+        "track_id": (walk.ravel() + track_lo).tolist(),
+    }
+
+
+def history_rows(
+    rng: np.random.Generator, user_ids: np.ndarray, per_user: int, track_lo: int, track_hi: int,
+) -> Dict[str, list]:
+    n = len(user_ids) * per_user
+    seconds = rng.integers(0, 365 * 24 * 3600, n)
+    return {
+        "user_id": np.repeat(user_ids, per_user).tolist(),
+        "track_id": rng.integers(track_lo, track_hi + 1, n).tolist(),
+        "played_at": [HISTORY_ANCHOR - timedelta(seconds=int(s)) for s in seconds],
+    }
+
+
+# -------------------------------
+# Writers
+# -------------------------------
+def _use_copy(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+
+
+def write_batch(engine: Engine, table, columns: Dict[str, list]) -> int:
+    """Write one column-oriented batch in its own transaction."""
+    names = list(columns)
+    n = len(columns[names[0]])
+    with engine.begin() as conn:
+        if _use_copy(engine):
+            buf = io.StringIO()
+            csv.writer(buf).writerows(zip(*columns.values()))
+            buf.seek(0)
+            cursor = conn.connection.cursor()
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)", buf
+            )
+        else:
+            conn.execute(table.insert(), [dict(zip(names, row)) for row in zip(*columns.values())])
+    return n
+
+
+def _next_id(engine: Engine, table) -> int:
+    with engine.connect() as conn:
+        return (conn.scalar(select(func.max(table.c.id))) or 0) + 1
+
+
+def _fix_sequence(engine: Engine, table) -> None:
+    # explicit ids bypass the serial sequence, so move it past what we wrote
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 1) FROM {table.name}))"
+        ))
+
+
+def _coprime_step(rng: np.random.Generator, n: int) -> int:
+    if n <= 2:
+        return 1
+    step = int(rng.integers(n // 3, n)) or 1
+    while gcd(step, n) != 1:
+        step += 1
+    return step
+
+
+def generate(
+    engine: Engine,
+    users: int = 0,
+    tracks: int = 0,
+    uploads: int = 0,
+    likes_per_user: int = 0,
+    history_per_user: int = 0,
+    seed: int = 0,
+    batch_size: int = BATCH_SIZE,
+    log=None,
+) -> Dict[str, int]:
+    """
+    Append a synthetic dataset to the database behind `engine`.
+
+    Likes and history are generated for the users created in this run and
+    point at the tracks created in this run. Returns rows written per table.
+    """
+    written = {}
+
+    def timed(name, table, total, make_batch, rows_per_batch=batch_size):
+        start = time.perf_counter()
+        count = 0
+        for batch_no, lo in enumerate(range(0, total, rows_per_batch)):
+            rng = _rng(seed, name, batch_no)
+            count += write_batch(engine, table, make_batch(rng, lo, min(total, lo + rows_per_batch)))
+        if count:
+            _fix_sequence(engine, table)
+        written[name] = count
+        if log and total:
+            elapsed = time.perf_counter() - start
+            log(f"{name}: {count} rows in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    user_lo = _next_id(engine, User.__table__)
+    timed("users", User.__table__, users,
+          lambda rng, lo, hi: user_rows(rng, np.arange(user_lo + lo, user_lo + hi)))
+    user_hi = user_lo + users - 1
+
+    track_lo = _next_id(engine, Track.__table__)
+    timed("tracks", Track.__table__, tracks,
+          lambda rng, lo, hi: track_rows(rng, np.arange(track_lo + lo, track_lo + hi)))
+    track_hi = track_lo + tracks - 1
+
+    if users:
+        upload_lo = _next_id(engine, Upload.__table__)
+        timed("uploads", Upload.__table__, uploads,
+              lambda rng, lo, hi: upload_rows(rng, np.arange(upload_lo + lo, upload_lo + hi), user_lo, user_hi))
+
+    # likes and history are batched by user so each batch holds ~batch_size rows
+    per_user = min(likes_per_user, tracks)
+    if users and per_user:
+        step = _coprime_step(np.random.default_rng(seed), tracks)
+        timed("user_likes", UserLike.__table__, users,
+              lambda rng, lo, hi: like_rows(
+                  rng, np.arange(user_lo + lo, user_lo + hi), per_user, track_lo, tracks, step),
+              rows_per_batch=max(1, batch_size // per_user))
+        with engine.begin() as conn:
+            recount_like_counts(conn, track_lo, track_hi)
+
+    if users and tracks and history_per_user:
+        timed("user_history", UserHistory.__table__, users,
+              lambda rng, lo, hi: history_rows(
+                  rng, np.arange(user_lo + lo, user_lo + hi), history_per_user, track_lo, track_hi),
+              rows_per_batch=max(1, batch_size // history_per_user))
+
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic load-test data.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tracks", type=int, default=1000)
+    parser.add_argument("--uploads", type=int, default=1000)
+    parser.add_argument("--likes-per-user", type=int, default=10)
+    parser.add_argument("--history-per-user", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from music_app.db import engine
+
+    upgrade_database(engine)
+    generate(
+        engine,
+        users=args.users,
+        tracks=args.tracks,
+        uploads=args.uploads,
+        likes_per_user=args.likes_per_user,
+        history_per_user=args.history_per_user,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        log=print,
+    )
+
+
+if __name__ == "__main__":
+    main()
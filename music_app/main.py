@@ -1,28 +1,70 @@
+import math
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI
-from music_app.db import Base, engine
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
+from music_app.db import DB_AUTO_MIGRATE, engine, require_database_url
+from music_app.migrations import upgrade_database
 from music_app.routers import users, tracks, uploads, likes
 from music_app.routers import spotify
 from music_app.routers import recommendations
+from music_app.routers import search
+from music_app.utils import compute
+from music_app.utils.metrics import REGISTRY, MetricsMiddleware
+from music_app.utils.upstream import RateLimited
 
 # Load .env
 load_dotenv()
 
-# --- Database init ---
-Base.metadata.create_all(bind=engine)
-
 # --- FastAPI app ---
-app = FastAPI(title="Music App")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # at startup rather than import, so tools and tests can import the app without a database
+    require_database_url()
+    if DB_AUTO_MIGRATE:
+        await run_in_threadpool(upgrade_database, engine)
+    yield
+    compute.shutdown()
+
+app = FastAPI(title="Music App", lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(compute.Overloaded)
+async def overloaded_handler(request: Request, exc: compute.Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server busy ({exc.name}), retry later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(compute.TaskTimeout)
+async def task_timeout_handler(request: Request, exc: compute.TaskTimeout):
+    return JSONResponse(status_code=504, content={"detail": f"{exc.name} timed out after {exc.timeout:g}s"})
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # --- Routers ---
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(tracks.router, prefix="/tracks", tags=["Tracks"])
 app.include_router(uploads.router, prefix="/uploads", tags=["Uploads"])
 app.include_router(likes.router, prefix="/likes", tags=["Likes"])
 app.include_router(spotify.router, prefix="/spotify", tags=["Spotify"])
+app.include_router(search.router, prefix="/search", tags=["Search"])
 app.include_router(recommendations.router, tags=["Recommendations"])
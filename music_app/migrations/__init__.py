@@ -0,0 +1,46 @@
+"""
+Alembic migrations for the music_app schema.
+
+    alembic upgrade head                  # from the repo root, uses DATABASE_URL
+    alembic revision -m "add foo" --autogenerate
+
+Revision 0001 adopts databases that were built by create_all() before
+migrations existed: it creates what is missing and stamps the rest.
+Schema changes on big tables stay cheap (nullable columns, no rewrites);
+filling them in is a backfill, see music_app/backfill.py.
+"""
+import os
+
+from sqlalchemy.engine import Engine
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def alembic_config(url: str = None):
+    from alembic.config import Config  # alembic is only needed when migrating, not to serve
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    if url:
+        config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    return config
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """Leave the search index (FTS tables, tsvector columns) out of autogenerate; utils/search.py owns it."""
+    if type_ == "table":
+        return "_fts" not in name
+    if type_ == "column":
+        return name not in ("search_vector", "search_text")
+    if type_ == "index":
+        return not name.endswith(("_search_vector", "_search_trgm"))
+    return True
+
+
+def upgrade_database(engine: Engine, revision: str = "head") -> None:
+    """Migrate the database behind `engine` (used at startup and in tests)."""
+    from alembic import command
+    config = alembic_config()
+    # no transaction of ours: revisions may need to step outside one (CREATE INDEX CONCURRENTLY)
+    with engine.connect() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, revision)
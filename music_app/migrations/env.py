@@ -0,0 +1,74 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, text
+
+from music_app.db import Base
+from music_app.migrations import include_object
+import music_app.models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+target_metadata = Base.metadata
+
+if config.config_file_name is not None:  # the alembic CLI; the app has its own logging
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+
+def _url() -> str:
+    url = config.get_main_option("sqlalchemy.url")
+    if url:
+        return url
+    from music_app.db import require_database_url
+    return require_database_url()
+
+
+def _configure(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite can't ALTER most things in place; batch ops rebuild the table
+        render_as_batch=connection.dialect.name == "sqlite",
+        compare_type=True,
+        include_object=include_object,
+    )
+
+
+def run_migrations_offline() -> None:
+    context.configure(url=_url(), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:  # handed over by upgrade_database()
+        _configure(connection)
+        _run(connection)
+        return
+    engine = create_engine(_url())
+    with engine.connect() as connection:
+        _configure(connection)
+        _run(connection)
+    engine.dispose()
+
+
+def _run(connection) -> None:
+    # workers booting together would otherwise race through the same revisions; a
+    # session lock, since revisions may commit midway (CREATE INDEX CONCURRENTLY)
+    locked = connection.dialect.name == "postgresql"
+    if locked:
+        connection.execute(text("SELECT pg_advisory_lock(hashtext('music_app.migrations'))"))
+        connection.commit()
+    try:
+        with context.begin_transaction():
+            context.run_migrations()
+    finally:
+        if locked:
+            connection.execute(text("SELECT pg_advisory_unlock(hashtext('music_app.migrations'))"))
+            connection.commit()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
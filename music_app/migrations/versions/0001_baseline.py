@@ -0,0 +1,150 @@
+"""Baseline schema; adopts databases created by create_all()
+
+Before migrations existed the app ran Base.metadata.create_all() at
+startup, and columns were added to the models over time without ever
+reaching existing tables. This revision therefore works on whatever it
+finds: missing tables are created, missing columns are added (nullable
+when existing rows couldn't satisfy NOT NULL), missing indexes are built,
+and the full-text search tables are set up.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:00:00
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def _tables(metadata: sa.MetaData):
+    """The schema as of this revision, frozen here rather than read from the models."""
+    analyzed = sa.text("features IS NOT NULL")
+    return [
+        sa.Table(
+            "users", metadata,
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("email", sa.String(255), nullable=False, unique=True, index=True),
+            sa.Column("password", sa.String(255), nullable=False),
+        ),
+        sa.Table(
+            "tracks", metadata,
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("title", sa.String(255), nullable=False),
+            sa.Column("artist", sa.String(255), nullable=False),
+            sa.Column("album", sa.String(255)),
+            sa.Column("provider", sa.String(50), nullable=False),
+            sa.Column("external_id", sa.String(255), unique=True, index=True),
+            sa.Column("duration", sa.Integer),
+            sa.Column("like_count", sa.Integer, nullable=False, server_default="0"),
+        ),
+        sa.Table(
+            "uploads", metadata,
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("filename", sa.String(255), nullable=False),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("uploaded_at", sa.DateTime, server_default=sa.func.now()),
+            sa.Column("features", sa.Text),
+            sa.Column("feature_version", sa.Integer, index=True),
+            sa.Column("segments", sa.LargeBinary),
+            sa.Column("beat_grid", sa.LargeBinary),
+            sa.Column("size_bytes", sa.BigInteger),
+            sa.Column("checksum", sa.String(64), index=True),
+            sa.Column("spotify_id", sa.String, index=True),
+            sa.Column("spotify_url", sa.String),
+            sa.Column("track_name", sa.String),
+            sa.Column("artist_name", sa.String),
+            sa.Column("album_name", sa.String),
+            sa.Column("album_image_url", sa.String),
+            sa.Column("popularity", sa.Integer),
+            sa.Column("preview_url", sa.String),
+            sa.Column("duration_ms", sa.Integer),
+            sa.Index("ix_uploads_user_id", "user_id"),
+            sa.Index("ix_uploads_analyzed", "id", sqlite_where=analyzed, postgresql_where=analyzed),
+        ),
+        sa.Table(
+            "user_likes", metadata,
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id")),
+            sa.Column("track_id", sa.Integer, sa.ForeignKey("tracks.id")),
+            sa.Index("ux_user_likes_user_track", "user_id", "track_id", unique=True),
+            sa.Index("ix_user_likes_track_id", "track_id"),
+        ),
+        sa.Table(
+            "user_history", metadata,
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id")),
+            sa.Column("track_id", sa.Integer, sa.ForeignKey("tracks.id")),
+            sa.Column("played_at", sa.DateTime, server_default=sa.func.now()),
+            sa.Index("ix_user_history_user_played", "user_id", "played_at"),
+            sa.Index("ix_user_history_track_id", "track_id"),
+        ),
+        sa.Table(
+            "fingerprints", metadata,
+            sa.Column("hash", sa.Integer, primary_key=True),
+            sa.Column("upload_id", sa.Integer, sa.ForeignKey("uploads.id"), primary_key=True, index=True),
+            sa.Column("time_offset", sa.Integer, primary_key=True),
+        ),
+    ]
+
+
+def _add_missing_columns(bind, table: sa.Table) -> None:
+    present = {c["name"] for c in sa.inspect(bind).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in present:
+            continue
+        column = column._copy()
+        if not column.nullable and column.server_default is None:
+            logger.warning("Adding %s.%s as nullable: existing rows have no value for it",
+                           table.name, column.name)
+            column.nullable = True
+        op.add_column(table.name, column)
+
+
+def _create_index(bind, index: sa.Index) -> None:
+    if bind.dialect.name != "postgresql":
+        index.create(bind)
+        return
+    # the table is live: build without holding off writes for the duration
+    index.dialect_kwargs["postgresql_concurrently"] = True
+    with op.get_context().autocommit_block():
+        index.create(bind)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    from music_app.utils.schema import LIKES_UNIQUE_INDEX, dedupe_likes
+    from music_app.utils.search import ensure_search_index
+
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+    for table in _tables(sa.MetaData()):
+        if table.name not in existing:
+            table.create(bind)
+            continue
+        _add_missing_columns(bind, table)
+        present = {ix["name"] for ix in sa.inspect(bind).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in present:
+                continue
+            if index.name == LIKES_UNIQUE_INDEX:
+                dedupe_likes(bind)
+            _create_index(bind, index)
+    ensure_search_index(bind)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # dropping the baseline drops everything; the FTS tables go with their before_drop hooks
+    from music_app.db import Base
+    Base.metadata.drop_all(op.get_bind())
@@ -0,0 +1,63 @@
+"""created_at on users and tracks; backfill bookkeeping
+
+The new columns go in nullable and without a rewrite: on PostgreSQL the
+now() default is attached after ADD COLUMN, so only new rows get it and
+existing ones are left NULL for the users_created_at backfill. SQLite
+can't add a column with a non-constant default, so there the model's
+Python-side default fills new rows.
+
+Databases adopted by 0001 may already have created_at (the legacy
+top-level schema had it) and may have had like_count added at 0, so both
+backfills are queued for `python -m music_app.backfill --pending`.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+QUEUED = ("users_created_at", "like_counts")
+
+
+def _add_created_at(bind, table: str) -> None:
+    if "created_at" in {c["name"] for c in sa.inspect(bind).get_columns(table)}:
+        return
+    op.add_column(table, sa.Column("created_at", sa.DateTime, nullable=True))
+    if bind.dialect.name == "postgresql":
+        # metadata-only: existing rows keep NULL, new rows get now()
+        op.alter_column(table, "created_at", server_default=sa.func.now())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    _add_created_at(bind, "users")
+    _add_created_at(bind, "tracks")
+    state = op.create_table(
+        "backfill_state",
+        sa.Column("name", sa.String(100), primary_key=True),
+        sa.Column("last_id", sa.Integer, nullable=False),
+        sa.Column("rows", sa.BigInteger, nullable=False),
+        sa.Column("done", sa.Boolean, nullable=False),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    op.bulk_insert(state, [{"name": name, "last_id": 0, "rows": 0, "done": False} for name in QUEUED])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("backfill_state")
+    with op.batch_alter_table("tracks") as batch:
+        batch.drop_column("created_at")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("created_at")
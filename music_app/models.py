@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import BigInteger, Boolean, Column, Index, Integer, LargeBinary, String, DateTime, ForeignKey, Text, text
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from music_app.db import Base
 
 
@@ -11,6 +11,9 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     password = Column(String(255), nullable=False)
+    # default as well as server_default: columns added by a migration carry no
+    # server default on SQLite, which can't ALTER one in
+    created_at = Column(DateTime, default=func.now(), server_default=func.now())
 
     # relationships
     uploads = relationship("Upload", back_populates="user")
@@ -29,6 +32,8 @@ class Track(Base):
     provider = Column(String(50), nullable=False)
     external_id = Column(String(255), unique=True, index=True, nullable=True)
     duration = Column(Integer, nullable=True)
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")  # see utils/likes.py
+    created_at = Column(DateTime, default=func.now(), server_default=func.now())
 
     # relationships
     likes = relationship("UserLike", back_populates="track")
@@ -38,12 +43,26 @@ class Track(Base):
 # ---------- UPLOADS ----------
 class Upload(Base):
     __tablename__ = "uploads"
+    __table_args__ = (
+        Index("ix_uploads_user_id", "user_id"),
+        # similarity candidates, exports and re-analysis only walk analyzed uploads
+        Index(
+            "ix_uploads_analyzed", "id",
+            sqlite_where=text("features IS NOT NULL"),
+            postgresql_where=text("features IS NOT NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String(255), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     uploaded_at = Column(DateTime, server_default=func.now())
     features = Column(Text, nullable=True)  # store JSON/text features (SQLite safe)
+    feature_version = Column(Integer, nullable=True, index=True)  # FEATURE_VERSION that produced `features`
+    segments = deferred(Column(LargeBinary, nullable=True))  # float16 (n, SEGMENT_DIM), see utils/segments.py
+    beat_grid = deferred(Column(LargeBinary, nullable=True))  # delta-encoded beat times, see utils/beatgrid.py
+    size_bytes = Column(BigInteger, nullable=True)
+    checksum = Column(String(64), nullable=True, index=True)  # sha256 hex of the file
 
     # 🔹 Spotify enrichment fields
     spotify_id = Column(String, nullable=True, index=True)
@@ -63,6 +82,12 @@ class Upload(Base):
 # ---------- USER LIKES ----------
 class UserLike(Base):
     __tablename__ = "user_likes"
+    __table_args__ = (
+        # one like per pair; the write path relies on it for ON CONFLICT DO NOTHING
+        Index("ux_user_likes_user_track", "user_id", "track_id", unique=True),
+        # per-track counts and the FK check when a track is deleted
+        Index("ix_user_likes_track_id", "track_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -76,6 +101,10 @@ class UserLike(Base):
 # ---------- USER HISTORY ----------
 class UserHistory(Base):
     __tablename__ = "user_history"
+    __table_args__ = (
+        Index("ix_user_history_user_played", "user_id", "played_at"),  # a user's plays, newest first
+        Index("ix_user_history_track_id", "track_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -85,3 +114,26 @@ class UserHistory(Base):
     # relationships
     user = relationship("User", back_populates="history")
     track = relationship("Track", back_populates="history")
+
+
+# ---------- FINGERPRINTS ----------
+class Fingerprint(Base):
+    """Inverted index of spectral-peak pair hashes, see utils/fingerprint.py."""
+    __tablename__ = "fingerprints"
+
+    # (hash, ...) leads the primary key so lookups by hash are an index range scan
+    hash = Column(Integer, primary_key=True)
+    upload_id = Column(Integer, ForeignKey("uploads.id"), primary_key=True, index=True)
+    time_offset = Column(Integer, primary_key=True)  # anchor frame
+
+
+# ---------- BACKFILLS ----------
+class BackfillState(Base):
+    """Progress of the batched data backfills in music_app/backfill.py, one row per backfill."""
+    __tablename__ = "backfill_state"
+
+    name = Column(String(100), primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)  # highest primary key processed
+    rows = Column(BigInteger, nullable=False, default=0)
+    done = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -0,0 +1,188 @@
+"""
+Background re-analysis of uploads whose features are out of date.
+
+    python -m music_app.reanalyze                       # one pass, half a core
+    python -m music_app.reanalyze --cpu-budget 2 --watch 600
+
+Only uploads with `feature_version` below FEATURE_VERSION (or NULL, from
+before versions were recorded) are touched, so a pass over an up-to-date
+database is a single indexed query. Work is throttled to --cpu-budget
+cores: after each file the scheduler sleeps long enough that the CPU time
+it used stays within budget over the wall time it took.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, create_engine, delete, insert, or_, select, update
+from sqlalchemy.engine import Engine
+
+from music_app.models import Fingerprint, Upload
+from music_app.utils import fingerprint
+from music_app.utils.feature_store import get_store
+from music_app.utils.response_cache import UPLOADS, response_cache
+from music_app.utils.similarity import FEATURE_VERSION, features_to_vector
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+
+class CpuThrottle:
+    """Sleep so that process CPU time stays within `budget` cores of wall time."""
+
+    def __init__(self, budget: float, sleep: Callable[[float], None] = time.sleep):
+        if budget <= 0:
+            raise ValueError("CPU budget must be positive")
+        self.budget = budget
+        self._sleep = sleep
+        self._cpu = time.process_time()
+        self._wall = time.monotonic()
+
+    def pace(self) -> float:
+        """Call after each unit of work; returns how long it slept."""
+        cpu = time.process_time() - self._cpu
+        wall = time.monotonic() - self._wall
+        delay = max(0.0, cpu / self.budget - wall)
+        if delay:
+            self._sleep(delay)
+        self._cpu = time.process_time()
+        self._wall = time.monotonic()
+        return delay
+
+
+def stale_uploads(include_unanalyzed: bool = False):
+    stale = or_(Upload.feature_version.is_(None), Upload.feature_version < FEATURE_VERSION)
+    query = select(Upload.id, Upload.filename)
+    if include_unanalyzed:
+        return query.where(or_(stale, Upload.features.is_(None)))
+    return query.where(stale, Upload.features.isnot(None))
+
+
+def reanalyze(
+    engine: Engine,
+    upload_dir: str = "uploads",
+    cpu_budget: float = 0.5,
+    batch_size: int = BATCH_SIZE,
+    limit: Optional[int] = None,
+    include_unanalyzed: bool = False,
+    analyze: Optional[Callable[[str], Dict]] = None,
+    throttle: Optional[CpuThrottle] = None,
+) -> Dict[str, int]:
+    """One pass over stale uploads in id order; returns {"updated", "failed"}."""
+    if analyze is None:
+        from music_app.utils.audio import analyze_file as analyze
+    from music_app.utils.audio import pack_artifacts, split_artifacts
+    throttle = throttle or CpuThrottle(cpu_budget)
+    store = get_store()
+    counts = {"updated": 0, "failed": 0}
+    last_id = 0
+
+    while limit is None or counts["updated"] + counts["failed"] < limit:
+        with engine.connect() as conn:
+            batch = conn.execute(
+                stale_uploads(include_unanalyzed).where(Upload.id > last_id).order_by(Upload.id).limit(batch_size)
+            ).all()
+        if not batch:
+            break
+
+        results: List[Dict] = []
+        for upload_id, filename in batch:
+            if limit is not None and counts["updated"] + counts["failed"] >= limit:
+                break
+            last_id = upload_id
+            try:
+                features, artifacts = split_artifacts(analyze(os.path.join(upload_dir, filename)))
+            except Exception as e:
+                # failures stay stale and are retried on the next pass
+                logger.warning("Re-analysis of upload %s failed: %s", upload_id, e)
+                counts["failed"] += 1
+            else:
+                blobs = pack_artifacts(artifacts)
+                results.append({
+                    "id": upload_id,
+                    "features": features,
+                    "segments": blobs.get("segments"),
+                    "beat_grid": blobs.get("beat_grid"),
+                    "fingerprint": artifacts.get("fingerprint"),
+                })
+                counts["updated"] += 1
+            throttle.pace()
+
+        if results:
+            with engine.begin() as conn:
+                table = Upload.__table__
+                conn.execute(
+                    update(table).where(table.c.id == bindparam("uid")).values(
+                        features=bindparam("features"),
+                        segments=bindparam("segments"),
+                        beat_grid=bindparam("beat_grid"),
+                        feature_version=FEATURE_VERSION,
+                    ),
+                    [
+                        {
+                            "uid": r["id"],
+                            "features": json.dumps(r["features"]),
+                            "segments": r["segments"],
+                            "beat_grid": r["beat_grid"],
+                        }
+                        for r in results
+                    ],
+                )
+                for r in results:
+                    if r["fingerprint"] is None:
+                        continue
+                    conn.execute(delete(Fingerprint).where(Fingerprint.upload_id == r["id"]))
+                    rows = fingerprint.index_rows(r["id"], r["fingerprint"])
+                    if rows:
+                        conn.execute(insert(Fingerprint), rows)
+            vectors = [(r["id"], features_to_vector(r["features"])) for r in results]
+            vectors = [(uid, vec) for uid, vec in vectors if vec is not None]
+            if store is not None and vectors:
+                store.append([uid for uid, _ in vectors], [vec for _, vec in vectors])
+                store.compact_if_needed()
+            # only reaches API processes through a shared (Redis) response cache
+            response_cache.invalidate_sync(UPLOADS)
+
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-analyse uploads with stale feature versions.")
+    parser.add_argument("--cpu-budget", type=float, default=0.5, help="cores to use on average")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many uploads")
+    parser.add_argument("--include-unanalyzed", action="store_true", help="also analyse uploads with no features")
+    parser.add_argument("--upload-dir", default="uploads")
+    parser.add_argument("--watch", type=float, default=None, metavar="SECONDS",
+                        help="keep running, starting a new pass this long after the last one")
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from music_app.db import engine
+
+    throttle = CpuThrottle(args.cpu_budget)
+    while True:
+        counts = reanalyze(
+            engine,
+            upload_dir=args.upload_dir,
+            batch_size=args.batch_size,
+            limit=args.limit,
+            include_unanalyzed=args.include_unanalyzed,
+            throttle=throttle,
+        )
+        print(f"re-analysed {counts['updated']} uploads to v{FEATURE_VERSION} ({counts['failed']} failed)")
+        if args.watch is None:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
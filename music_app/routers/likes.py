@@ -1,51 +1,153 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from music_app.db import get_db
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from music_app.db import get_db, get_read_db
 from music_app.models import User, Track, UserLike
+from music_app.schemas import (
+    BulkImportResult, LikeAddResponse, LikeBatch, LikeBatchResponse, LikeCreate, LikedCheckResponse, LikeResponse,
+    MessageResponse,
+)
+from music_app.utils.bulk import bulk_import, conflict_insert
+from music_app.utils.likes import adjust_like_counts, liked_sets
+from music_app.utils.response_cache import LIKES, TRACKS, response_cache, track_tag, user_likes_tag
 
 router = APIRouter()
 
-@router.post("/add")
-def add_like(user_id: int = Query(...), track_id: int = Query(...), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    track = db.query(Track).filter(Track.id == track_id).first()
-    if not track:
-        raise HTTPException(status_code=404, detail="Track not found")
-
-    existing = db.query(UserLike).filter_by(user_id=user_id, track_id=track_id).first()
-    if existing:
-        return {"message": "Already liked"}
+MAX_CHECK_IDS = 500
+
+async def _likes_changed(user_id: int, track_ids) -> None:
+    """After commit: drop the user's cached likes and the like counts of the tracks."""
+    liked_sets.invalidate(user_id)
+    await response_cache.invalidate(user_likes_tag(user_id), *(track_tag(t) for t in set(track_ids)))
+
+def _insert_likes(db: AsyncSession):
+    """INSERT into user_likes that skips pairs already liked, by way of the unique index."""
+    dialect_insert = conflict_insert(db)
+    if dialect_insert is None:
+        return insert(UserLike)  # repeats surface as IntegrityError instead
+    return dialect_insert(UserLike).on_conflict_do_nothing(index_elements=["user_id", "track_id"])
 
-    new_like = UserLike(user_id=user_id, track_id=track_id)
-    db.add(new_like)
-    db.commit()
-    db.refresh(new_like)
-    return {"message": f"User {user_id} liked track {track_id}", "like_id": new_like.id}
+async def _missing_reference(db: AsyncSession, user_id: int, track_id: Optional[int] = None) -> Optional[str]:
+    """Which side of a rejected like doesn't exist; only asked once a constraint has fired."""
+    if await db.scalar(select(User.id).where(User.id == user_id)) is None:
+        return "User not found"
+    if track_id is not None and await db.scalar(select(Track.id).where(Track.id == track_id)) is None:
+        return "Track not found"
+    return None
 
-@router.delete("/remove")
-def remove_like(user_id: int = Query(...), track_id: int = Query(...), db: Session = Depends(get_db)):
-    like = db.query(UserLike).filter_by(user_id=user_id, track_id=track_id).first()
-    if not like:
+@router.post("/add", response_model=LikeAddResponse)
+async def add_like(user_id: int = Query(...), track_id: int = Query(...), db: AsyncSession = Depends(get_db)):
+    # One statement: the unique index absorbs repeats, the foreign keys reject unknown ids
+    stmt = _insert_likes(db).values(user_id=user_id, track_id=track_id).returning(UserLike.id)
+    try:
+        like_id = await db.scalar(stmt)
+        if like_id is not None:
+            await adjust_like_counts(db, [track_id], +1)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        detail = await _missing_reference(db, user_id, track_id)
+        if detail:
+            raise HTTPException(status_code=404, detail=detail)
+        like_id = None
+    if like_id is None:
+        return {"message": "Already liked"}
+    await _likes_changed(user_id, [track_id])
+    return {"message": f"User {user_id} liked track {track_id}", "like_id": like_id}
+
+@router.delete("/remove", response_model=MessageResponse)
+async def remove_like(user_id: int = Query(...), track_id: int = Query(...), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(delete(UserLike).filter_by(user_id=user_id, track_id=track_id))
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Like not found")
-    db.delete(like)
-    db.commit()
+    await adjust_like_counts(db, [track_id], -1)
+    await db.commit()
+    await _likes_changed(user_id, [track_id])
     return {"message": f"User {user_id} unliked track {track_id}"}
 
-@router.get("/{user_id}")
-def list_user_likes(user_id: int, db: Session = Depends(get_db)):
-    likes = db.query(UserLike).filter(UserLike.user_id == user_id).all()
-    return [
+@router.post("/batch", response_model=LikeBatchResponse)
+async def batch_likes(body: LikeBatch, db: AsyncSession = Depends(get_db)):
+    """Like and unlike many tracks for one user in one transaction."""
+    liked, unliked = [], []
+    if body.unlike:
+        unliked = list(await db.scalars(
+            delete(UserLike)
+            .where(UserLike.user_id == body.user_id, UserLike.track_id.in_(body.unlike))
+            .returning(UserLike.track_id)
+        ))
+        await adjust_like_counts(db, unliked, -1)
+    if body.like:
+        # unknown track ids drop out of the SELECT; an unknown user trips the foreign key
+        rows = select(literal(body.user_id), Track.id).where(Track.id.in_(body.like))
+        stmt = _insert_likes(db).from_select(["user_id", "track_id"], rows).returning(UserLike.track_id)
+        try:
+            liked = list(await db.scalars(stmt))
+            await adjust_like_counts(db, liked, +1)
+        except IntegrityError:
+            await db.rollback()
+            detail = await _missing_reference(db, body.user_id)
+            raise HTTPException(status_code=404 if detail else 409, detail=detail or "Like rejected")
+    await db.commit()
+    if liked or unliked:
+        await _likes_changed(body.user_id, liked + unliked)
+    return {"liked": sorted(liked), "unliked": sorted(unliked)}
+
+async def _write_likes(db: AsyncSession, rows, errors) -> int:
+    # Existence is checked per batch so one bad row doesn't fail (and replay) the whole batch
+    user_ids = {like.user_id for _, like in rows}
+    track_ids = {like.track_id for _, like in rows}
+    known_users = set(await db.scalars(select(User.id).where(User.id.in_(user_ids))))
+    known_tracks = set(await db.scalars(select(Track.id).where(Track.id.in_(track_ids))))
+
+    new_likes = []
+    for row, like in rows:
+        if like.user_id not in known_users:
+            errors.append({"row": row, "error": "User not found"})
+            continue
+        if like.track_id not in known_tracks:
+            errors.append({"row": row, "error": "Track not found"})
+            continue
+        new_likes.append({"user_id": like.user_id, "track_id": like.track_id})
+
+    if not new_likes:
+        return 0
+    # pairs already liked, in the table or earlier in the batch, are skipped like /add does
+    inserted = (await db.scalars(_insert_likes(db).returning(UserLike.track_id), new_likes)).all()
+    await adjust_like_counts(db, inserted, +1)
+    return len(inserted)
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_add_likes(request: Request, db: AsyncSession = Depends(get_db)):
+    """Import likes from a JSON array, NDJSON or CSV body; existing likes are skipped."""
+    result = await bulk_import(request, db, LikeCreate, _write_likes)
+    liked_sets.clear()
+    await response_cache.invalidate(LIKES, TRACKS)
+    return result
+
+@router.get("/{user_id}/contains", response_model=LikedCheckResponse)
+async def check_likes(user_id: int, track_id: List[int] = Query(..., max_length=MAX_CHECK_IDS),
+                      db: AsyncSession = Depends(get_read_db)):
+    """Which of the given tracks the user has liked, e.g. to mark a page of results in one call."""
+    liked = await liked_sets.contains(db, user_id, track_id)
+    return {"liked": [t for t, hit in zip(track_id, liked) if hit]}
+
+@router.get("/{user_id}", response_model=List[LikeResponse])
+async def list_user_likes(user_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    cached = await response_cache.begin(request, [LIKES, user_likes_tag(user_id)])
+    if cached.hit:
+        return cached.hit
+    rows = await db.execute(
+        select(UserLike.id, Track.id, Track.title, Track.artist, Track.album, Track.provider)
+        .join(Track, Track.id == UserLike.track_id)
+        .where(UserLike.user_id == user_id)
+        .order_by(UserLike.id)
+    )
+    return await cached.respond([
         {
-            "id": l.id,
-            "track": {
-                "id": l.track.id,
-                "title": l.track.title,
-                "artist": l.track.artist,
-                "album": l.track.album,
-                "provider": l.track.provider,
-            }
+            "id": like_id,
+            "track": {"id": track_id, "title": title, "artist": artist, "album": album, "provider": provider},
         }
-        for l in likes
-    ]
\ No newline at end of file
+        for like_id, track_id, title, artist, album, provider in rows
+    ])
@@ -1,73 +1,134 @@
 # music_app/routers/recommendations.py
 
+import asyncio
 import json
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from music_app.db import get_db
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from music_app.db import get_db, get_read_db
 from music_app.models import Upload
-from music_app.utils.similarity import top_k_similar
+from music_app.schemas import LinkFromSearchResponse, RecommendationsResponse
+from music_app.utils import compute
+from music_app.utils.feature_store import get_store
+from music_app.utils.metrics import span
+from music_app.utils.response_cache import UPLOADS, response_cache
+from music_app.utils.similarity import features_to_vector, top_k_similar
 from music_app.utils.spotify import cached_track_lookup, search_tracks
 
 router = APIRouter()
 
+# Enrichment is best effort: whatever Spotify hasn't answered by then is left out.
+ENRICH_DEADLINE = float(os.getenv("SPOTIFY_ENRICH_DEADLINE", "1.5"))
+
+
+def _rank(target_features: str, rows, k: int):
+    """Parse candidate features and score them; runs on the scoring pool."""
+    with span("recommendations.parse_features"):
+        target = json.loads(target_features)
+        candidates = [(uid, json.loads(features)) for uid, features in rows]
+    with span("recommendations.score"):
+        return top_k_similar(target, candidates, k=k)
+
+
+def _rank_from_store(store, target_features: str, upload_id: int, k: int):
+    """Score against the memory-mapped feature store instead of loading rows."""
+    with span("recommendations.score"):
+        target = features_to_vector(json.loads(target_features))
+        if target is None:
+            return []
+        return store.top_k(target, k, exclude=[upload_id])
+
+
+async def _enrich(spotify_ids: dict):
+    """
+    -> ({upload id: Spotify track or None}, complete), looked up concurrently
+    under ENRICH_DEADLINE; complete is False if any lookup failed or timed out.
+    """
+    lookups = {
+        uid: asyncio.ensure_future(run_in_threadpool(cached_track_lookup, sid))
+        for uid, sid in spotify_ids.items() if sid
+    }
+    if not lookups:
+        return {}, True
+    _, pending = await asyncio.wait(lookups.values(), timeout=ENRICH_DEADLINE)
+    for task in pending:
+        task.cancel()  # the lookup finishes (and fills the cache) in its thread anyway
+    tracks = {
+        uid: task.result() if task.done() and not task.cancelled() and task.exception() is None else None
+        for uid, task in lookups.items()
+    }
+    return tracks, not pending and all(t is not None for t in tracks.values())
+
+
 # -------------------------------
 # Get Recommendations
 # -------------------------------
-@router.get("/recommendations")
-def get_recommendations(
+@router.get("/recommendations", response_model=RecommendationsResponse)
+async def get_recommendations(
     upload_id: int,
+    request: Request,
     k: int = 5,
     max_popularity: int = 100,
     page: int = 1,
     per_page: int = 10,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Recommend similar uploads enriched with Spotify metadata.
     Supports popularity filter + pagination.
     """
+    cached = await response_cache.begin(request, [UPLOADS])
+    if cached.hit:
+        return cached.hit
+
     # get the target upload
-    upload = db.query(Upload).filter(Upload.id == upload_id).first()
+    upload = await db.scalar(select(Upload).where(Upload.id == upload_id))
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
     if not upload.features:
         raise HTTPException(status_code=400, detail="Upload has not been analyzed yet")
 
-    # load features
-    target_features = json.loads(upload.features)
+    store = get_store()
+    if store is not None:
+        results = await compute.scoring.run(_rank_from_store, store, upload.features, upload_id, k)
+        # the store can still hold uploads deleted since it was written
+        existing = set(await db.scalars(select(Upload.id).where(Upload.id.in_([uid for uid, _ in results]))))
+        results = [(uid, score) for uid, score in results if uid in existing]
+    else:
+        # collect candidate uploads
+        with span("recommendations.load_candidates"):
+            rows = (await db.execute(
+                select(Upload.id, Upload.features)
+                .where(Upload.id != upload_id, Upload.features.isnot(None))
+            )).all()
+
+        # parse + score off the event loop
+        results = await compute.scoring.run(_rank, upload.features, rows, k) if rows else []
 
-    # collect candidate uploads
-    candidates = [
-        (u.id, json.loads(u.features))
-        for u in db.query(Upload)
-        .filter(Upload.id != upload_id, Upload.features.isnot(None))
-        .all()
-    ]
-    if not candidates:
-        return {
+    if not results:
+        return await cached.respond({
             "upload_id": upload_id,
             "recommendations": [],
             "page": 1,
             "per_page": k,
             "total": 0,
-        }
-
-    # compute similarities
-    results = top_k_similar(target_features, candidates, k=k)
+        })
 
     # enrich with Spotify
-    recs = []
-    for uid, score in results:
-        candidate = db.query(Upload).filter(Upload.id == uid).first()
-        item = {"id": uid, "similarity": score}
-
-        if candidate.spotify_id:
-            try:
-                item["spotify"] = cached_track_lookup(candidate.spotify_id)
-            except Exception:
-                item["spotify"] = None
-
-        recs.append(item)
+    with span("recommendations.enrich"):
+        spotify_ids = dict((await db.execute(
+            select(Upload.id, Upload.spotify_id)
+            .where(Upload.id.in_([uid for uid, _ in results]))
+        )).all())
+        tracks, complete = await _enrich(spotify_ids)
+        recs = []
+        for uid, score in results:
+            item = {"id": uid, "similarity": score}
+            if uid in tracks:
+                item["spotify"] = tracks[uid]
+            recs.append(item)
 
     # filter by popularity if field exists
     recs = [
@@ -79,27 +140,28 @@ def get_recommendations(
     start = (page - 1) * per_page
     end = start + per_page
 
-    return {
+    # an answer missing Spotify data is served but not cached
+    return await cached.respond({
         "upload_id": upload_id,
         "recommendations": recs[start:end],
         "page": page,
         "per_page": per_page,
         "total": len(recs),
-    }
+    }, store=complete)
 
 
 # -------------------------------
 # Link Upload to Spotify from Search
 # -------------------------------
-@router.post("/recommendations/link_from_search")
-def link_from_search(upload_id: int, query: str, db: Session = Depends(get_db)):
+@router.post("/recommendations/link_from_search", response_model=LinkFromSearchResponse)
+async def link_from_search(upload_id: int, query: str, db: AsyncSession = Depends(get_db)):
     """Search Spotify and link the first result to an upload."""
-    results = search_tracks(query, limit=1)
+    results = await run_in_threadpool(search_tracks, query, limit=1)
     if not results:
         raise HTTPException(status_code=404, detail="No track found")
 
     track = results[0]
-    upload = db.query(Upload).filter(Upload.id == upload_id).first()
+    upload = await db.scalar(select(Upload).where(Upload.id == upload_id))
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
 
@@ -110,7 +172,8 @@ def link_from_search(upload_id: int, query: str, db: Session = Depends(get_db)):
     upload.popularity = track["popularity"]
     upload.duration_ms = track["duration_ms"]
 
-    db.commit()
-    db.refresh(upload)
+    await db.commit()
+    await db.refresh(upload)
+    await response_cache.invalidate(UPLOADS)
 
     return {"upload_id": upload.id, "spotify": track}
@@ -0,0 +1,50 @@
+import logging
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from music_app.db import get_read_db
+from music_app.schemas import AutocompleteResponse, SearchResponse
+from music_app.utils import search as catalog
+from music_app.utils.spotify import search_tracks
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=2),
+    limit: int = Query(20, ge=1, le=100),
+    type: str = Query("all", pattern="^(all|track|upload)$"),
+    fallback: bool = True,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Ranked local search over tracks and uploads. Spotify is only asked
+    when nothing local matches (and `fallback` is on).
+    """
+    sources = tuple(catalog.SOURCES) if type == "all" else (type,)
+    hits = await catalog.search(db, q, limit=limit, sources=sources)
+    if hits or not fallback:
+        return {"query": q, "source": "local", "results": [asdict(h) for h in hits]}
+
+    try:
+        results = await run_in_threadpool(search_tracks, q, limit=min(limit, 50))
+    except Exception as e:
+        logger.warning("Spotify fallback search failed: %s", e)
+        results = []
+    return {"query": q, "source": "spotify", "results": results}
+
+
+@router.get("/autocomplete", response_model=AutocompleteResponse)
+async def autocomplete(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Title and artist completions for a partial query, from the in-process prefix index."""
+    index = await catalog.autocomplete.get(db)
+    return {"query": q, "suggestions": index.complete(q, limit=limit)}
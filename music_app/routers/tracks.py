@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from music_app.db import get_db
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from music_app.db import get_db, get_read_db
 from music_app.models import Track
+from music_app.schemas import BulkImportResult, MessageResponse, TrackCreate, TrackResponse
+from music_app.utils.bulk import bulk_import, upsert
+from music_app.utils.likes import liked_sets
+from music_app.utils.response_cache import LIKES, TRACKS, response_cache, track_tag
+from music_app.utils.serialize import rows_response
 
 router = APIRouter()
 
-@router.post("/add")
-def add_track(title: str, artist: str, album: str = None, provider: str = None,
-              external_id: str = None, duration: int = None, db: Session = Depends(get_db)):
+@router.post("/add", response_model=TrackResponse)
+async def add_track(title: str, artist: str, album: str = None, provider: str = None,
+                    external_id: str = None, duration: int = None, db: AsyncSession = Depends(get_db)):
     new_track = Track(
         title=title,
         artist=artist,
@@ -17,26 +24,43 @@ def add_track(title: str, artist: str, album: str = None, provider: str = None,
         duration=duration
     )
     db.add(new_track)
-    db.commit()
-    db.refresh(new_track)
+    await db.commit()
+    await db.refresh(new_track)
     return new_track
 
-@router.get("/all")
-def get_tracks(db: Session = Depends(get_db)):
-    return db.query(Track).all()
+async def _write_tracks(db: AsyncSession, rows, errors) -> int:
+    return await upsert(
+        db, Track, [track.model_dump() for _, track in rows],
+        key="external_id",
+        update=["title", "artist", "album", "provider", "duration"],
+    )
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_add_tracks(request: Request, db: AsyncSession = Depends(get_db)):
+    """Import tracks from a JSON array, NDJSON or CSV body, upserting on external_id."""
+    result = await bulk_import(request, db, TrackCreate, _write_tracks)
+    await response_cache.invalidate(TRACKS, LIKES)
+    return result
 
-@router.get("/{track_id}")
-def get_track(track_id: int, db: Session = Depends(get_db)):
-    track = db.query(Track).filter(Track.id == track_id).first()
+@router.get("/all", response_model=List[TrackResponse])
+async def get_tracks(db: AsyncSession = Depends(get_read_db)):
+    return rows_response(await db.execute(select(*Track.__table__.c)))
+
+@router.get("/{track_id}", response_model=TrackResponse)
+async def get_track(track_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    cached = await response_cache.begin(request, [TRACKS, track_tag(track_id)])
+    if cached.hit:
+        return cached.hit
+    track = await db.scalar(select(Track).where(Track.id == track_id))
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
-    return track
+    return await cached.respond(track)
 
-@router.put("/{track_id}")
-def update_track(track_id: int, title: str = None, artist: str = None, album: str = None,
-                 provider: str = None, external_id: str = None, duration: int = None,
-                 db: Session = Depends(get_db)):
-    track = db.query(Track).filter(Track.id == track_id).first()
+@router.put("/{track_id}", response_model=TrackResponse)
+async def update_track(track_id: int, title: str = None, artist: str = None, album: str = None,
+                       provider: str = None, external_id: str = None, duration: int = None,
+                       db: AsyncSession = Depends(get_db)):
+    track = await db.scalar(select(Track).where(Track.id == track_id))
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
     if title: track.title = title
@@ -45,15 +69,18 @@ def update_track(track_id: int, title: str = None, artist: str = None, album: st
     if provider: track.provider = provider
     if external_id: track.external_id = external_id
     if duration: track.duration = duration
-    db.commit()
-    db.refresh(track)
+    await db.commit()
+    await db.refresh(track)
+    await response_cache.invalidate(track_tag(track_id), LIKES)  # like lists embed track details
     return track
 
-@router.delete("/{track_id}")
-def delete_track(track_id: int, db: Session = Depends(get_db)):
-    track = db.query(Track).filter(Track.id == track_id).first()
+@router.delete("/{track_id}", response_model=MessageResponse)
+async def delete_track(track_id: int, db: AsyncSession = Depends(get_db)):
+    track = await db.scalar(select(Track).where(Track.id == track_id))
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
-    db.delete(track)
-    db.commit()
+    await db.delete(track)
+    await db.commit()
+    liked_sets.clear()  # its likes are detached, and may sit in any user's set
+    await response_cache.invalidate(track_tag(track_id), LIKES)
     return {"message": f"Track {track_id} deleted"}
@@ -1,61 +1,343 @@
 import os
 import json
-import shutil
-import uuid
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-from music_app.db import get_db
-from music_app.models import Upload
-from music_app.utils.audio import analyze_file
+import hashlib
+from typing import List, Literal, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from music_app.db import get_db, get_read_db
+from music_app.models import Fingerprint, Upload
+from music_app.schemas import (
+    AnalyzeResponse, BeatGridResponse, DuplicatesResponse, SimilarResponse, SpotifyLinkResponse,
+    UploadResponse, UploadSessionResponse,
+)
+from music_app.utils import compute
+from music_app.utils import beatgrid, fingerprint, ingest, waveform
+from music_app.utils import segments
+from music_app.utils.audio import (
+    analyze_file, canonical_path, pack_artifacts, prepare_media, preview_path, split_artifacts, waveform_path,
+)
+from music_app.utils.http import etag_matches, file_etag
+from music_app.utils.response_cache import UPLOADS, response_cache
+from music_app.utils.serialize import rows_response
+from music_app.utils.feature_store import get_store
+from music_app.utils.similarity import FEATURE_VERSION, features_to_vector, top_k_similar
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-router = APIRouter()
+# segment modes rerank this many whole-track neighbours (at least)
+SEGMENT_SHORTLIST = 200
 
-@router.post("/")
-def upload_file(user_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    safe_filename = f"{uuid.uuid4()}_{os.path.basename(file.filename)}"
-    file_path = os.path.join(UPLOAD_DIR, safe_filename)
+router = APIRouter()
 
+def _save_file(src, file_path: str):
+    """Copy a spooled upload to disk, returning (size, sha256)."""
+    h = hashlib.sha256()
+    size = 0
     with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+        for block in iter(lambda: src.read(ingest.WRITE_BUFFER), b""):
+            size += len(block)
+            if size > ingest.MAX_UPLOAD_BYTES:
+                break
+            h.update(block)
+            buffer.write(block)
+    if size > ingest.MAX_UPLOAD_BYTES:
+        os.remove(file_path)
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {ingest.MAX_UPLOAD_BYTES} bytes")
+    return size, h.hexdigest()
 
-    new_upload = Upload(filename=safe_filename, user_id=user_id)
-    db.add(new_upload)
-    db.commit()
-    db.refresh(new_upload)
+def remove_upload_files(filenames) -> None:
+    """Delete uploaded files along with the media derived from them."""
+    for filename in filenames:
+        file_path = os.path.join(UPLOAD_DIR, filename)
+        for path in (file_path, canonical_path(file_path), waveform_path(file_path), preview_path(file_path)):
+            ingest.remove_file(path)
 
+async def _prepare_media(file_path: str) -> None:
+    """Decode the upload once (canonical PCM, waveform, preview) in the background."""
+    try:
+        await compute.analysis.run(prepare_media, file_path)
+    except (compute.Overloaded, compute.TaskTimeout):
+        pass  # not fatal: analysis falls back to decoding the original
+
+async def _create_upload(db: AsyncSession, background_tasks: BackgroundTasks, user_id: int,
+                         filename: str, size: int, checksum: str) -> Upload:
+    new_upload = Upload(filename=filename, user_id=user_id, size_bytes=size, checksum=checksum)
+    db.add(new_upload)
+    try:
+        await db.commit()
+    except IntegrityError:  # the only foreign key is the user
+        await db.rollback()
+        await run_in_threadpool(os.remove, os.path.join(UPLOAD_DIR, filename))
+        raise HTTPException(status_code=404, detail="User not found")
+    await db.refresh(new_upload)
+    background_tasks.add_task(_prepare_media, os.path.join(UPLOAD_DIR, filename))
     return new_upload
 
-@router.get("/all")
-def get_uploads(db: Session = Depends(get_db)):
-    return db.query(Upload).all()
+@router.post("/", response_model=UploadResponse)
+async def upload_file(user_id: int, background_tasks: BackgroundTasks, file: UploadFile = File(...),
+                      db: AsyncSession = Depends(get_db)):
+    ingest.check_declared_size(file.size)
+    safe_filename = ingest.safe_filename(file.filename)
+    file_path = os.path.join(UPLOAD_DIR, safe_filename)
+
+    # disk I/O stays off the event loop
+    size, checksum = await run_in_threadpool(_save_file, file.file, file_path)
+
+    return await _create_upload(db, background_tasks, user_id, safe_filename, size, checksum)
+
+# -------------------------------
+# Streaming + resumable uploads
+# -------------------------------
+@router.post("/stream", response_model=UploadResponse)
+async def upload_stream(user_id: int, filename: str, request: Request, background_tasks: BackgroundTasks,
+                        db: AsyncSession = Depends(get_db)):
+    """
+    Upload the raw request body straight to its final location.
+    Content-Length is checked before reading; the size limit is also enforced while streaming.
+    """
+    ingest.check_declared_size(ingest.declared_length(request.headers.get("content-length")))
+
+    safe_filename = ingest.safe_filename(filename)
+    file_path = os.path.join(UPLOAD_DIR, safe_filename)
+    hasher = hashlib.sha256()
+    try:
+        size = await ingest.stream_to_file(request.stream(), file_path, hasher=hasher)
+    except BaseException:
+        ingest.remove_file(file_path)
+        raise
+
+    return await _create_upload(db, background_tasks, user_id, safe_filename, size, hasher.hexdigest())
+
+def _sessions() -> ingest.UploadSessions:
+    return ingest.UploadSessions(UPLOAD_DIR)
+
+@router.post("/sessions", response_model=UploadSessionResponse)
+async def create_upload_session(user_id: int, filename: str, size: Optional[int] = None):
+    """Start a resumable upload; send the bytes with PUT /uploads/sessions/{id}?offset=N."""
+    return await run_in_threadpool(_sessions().create, user_id, filename, size)
+
+@router.get("/sessions/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session(session_id: str):
+    """Report how many bytes have arrived, so a client knows where to resume."""
+    return await run_in_threadpool(_sessions().get, session_id)
 
-@router.get("/{upload_id}")
-def get_upload(upload_id: int, db: Session = Depends(get_db)):
-    upload = db.query(Upload).filter(Upload.id == upload_id).first()
+@router.put("/sessions/{session_id}")
+async def put_upload_chunk(session_id: str, offset: int, request: Request):
+    sessions = _sessions()
+    session = await run_in_threadpool(sessions.get, session_id)
+    if offset != session["offset"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Offset mismatch: expected {session['offset']}",
+            headers={"Upload-Offset": str(session["offset"])},
+        )
+    limit = min(session["size"] or ingest.MAX_UPLOAD_BYTES, ingest.MAX_UPLOAD_BYTES)
+    written = await ingest.stream_to_file(
+        request.stream(), sessions.part_path(session["session_id"]), offset=offset, limit=limit
+    )
+    return {"session_id": session["session_id"], "offset": offset + written, "size": session["size"]}
+
+@router.post("/sessions/{session_id}/complete", response_model=UploadResponse)
+async def complete_upload_session(session_id: str, background_tasks: BackgroundTasks,
+                                  db: AsyncSession = Depends(get_db)):
+    sessions = _sessions()
+    session = await run_in_threadpool(sessions.get, session_id)
+    if session["size"] is not None and session["offset"] != session["size"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {session['offset']} of {session['size']} bytes",
+            headers={"Upload-Offset": str(session["offset"])},
+        )
+
+    safe_filename = ingest.safe_filename(session["filename"])
+    file_path = os.path.join(UPLOAD_DIR, safe_filename)
+    await run_in_threadpool(os.replace, sessions.part_path(session["session_id"]), file_path)
+    await run_in_threadpool(sessions.discard, session["session_id"])
+    checksum = await run_in_threadpool(ingest.file_sha256, file_path)
+
+    return await _create_upload(db, background_tasks, session["user_id"], safe_filename, session["offset"], checksum)
+
+# everything but the blobs, which have endpoints of their own
+UPLOAD_COLUMNS = [c for c in Upload.__table__.c if c.name not in ("segments", "beat_grid")]
+
+@router.get("/all", response_model=List[UploadResponse])
+async def get_uploads(db: AsyncSession = Depends(get_read_db)):
+    return rows_response(await db.execute(select(*UPLOAD_COLUMNS)))
+
+@router.get("/{upload_id}", response_model=UploadResponse)
+async def get_upload(upload_id: int, db: AsyncSession = Depends(get_read_db)):
+    upload = await db.scalar(select(Upload).where(Upload.id == upload_id))
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
     return upload
 
-@router.post("/{upload_id}/analyze")
-def analyze_upload(upload_id: int, db: Session = Depends(get_db)):
-    upload = db.query(Upload).filter(Upload.id == upload_id).first()
+# -------------------------------
+# Waveform + preview
+# -------------------------------
+MEDIA_CACHE_CONTROL = "public, max-age=3600"
+
+async def _media_path(db: AsyncSession, upload_id: int, to_path, what: str) -> str:
+    filename = await db.scalar(select(Upload.filename).where(Upload.id == upload_id))
+    if filename is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    path = to_path(os.path.join(UPLOAD_DIR, filename))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"{what} not generated for this upload")
+    return path
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+@router.get("/{upload_id}/waveform")
+async def get_waveform(
+    upload_id: int,
+    request: Request,
+    buckets: int = 1000,
+    format: Literal["json", "binary"] = "json",
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Precomputed min/max peaks at the coarsest level with at least `buckets` buckets.
+    `binary` returns int8 (min, max) pairs; supports If-None-Match.
+    """
+    path = await _media_path(db, upload_id, waveform_path, "Waveform")
+    etag = file_etag(path, buckets, format)
+    headers = {"ETag": etag, "Cache-Control": MEDIA_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    sr, levels = waveform.read(await run_in_threadpool(_read_bytes, path))
+    spb, peaks = levels[waveform.pick_level(levels, buckets)]
+    if format == "binary":
+        headers.update({"X-Sample-Rate": str(sr), "X-Samples-Per-Bucket": str(spb)})
+        return Response(content=peaks.tobytes(), media_type="application/octet-stream", headers=headers)
+    return Response(
+        content=json.dumps({
+            "upload_id": upload_id,
+            "sample_rate": sr,
+            "samples_per_bucket": spb,
+            "min": peaks[:, 0].tolist(),
+            "max": peaks[:, 1].tolist(),
+        }),
+        media_type="application/json",
+        headers=headers,
+    )
+
+@router.get("/{upload_id}/preview")
+async def get_preview(upload_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Short OGG preview clip; Range requests and If-None-Match are honoured."""
+    path = await _media_path(db, upload_id, preview_path, "Preview")
+    etag = file_etag(path)
+    headers = {"ETag": etag, "Cache-Control": MEDIA_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="audio/ogg", headers=headers)
+
+@router.post("/{upload_id}/analyze", response_model=AnalyzeResponse)
+async def analyze_upload(upload_id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+    upload = await db.scalar(select(Upload).where(Upload.id == upload_id))
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
 
-    features = analyze_file(os.path.join(UPLOAD_DIR, upload.filename))
-    
+    result = await compute.analysis.run(analyze_file, os.path.join(UPLOAD_DIR, upload.filename))
+    features, artifacts = split_artifacts(result)
+
     # Convert dict to JSON string for database storage
     upload.features = json.dumps(features)
-    db.commit()
-    db.refresh(upload)
+    upload.feature_version = FEATURE_VERSION
+    for column, blob in pack_artifacts(artifacts).items():
+        setattr(upload, column, blob)
+    if artifacts.get("fingerprint") is not None:
+        await db.execute(delete(Fingerprint).where(Fingerprint.upload_id == upload.id))
+        rows = fingerprint.index_rows(upload.id, artifacts["fingerprint"])
+        if rows:
+            await db.execute(insert(Fingerprint), rows)
+    await db.commit()
+    await db.refresh(upload)
+
+    # publish to the shared feature store so recommendations see it without a re-export
+    store = get_store()
+    vector = features_to_vector(features)
+    if store is not None and vector is not None:
+        await run_in_threadpool(store.append, [upload.id], [vector])
+        background_tasks.add_task(store.compact_if_needed)  # after the response: it rewrites the store
+    await response_cache.invalidate(UPLOADS)
 
     return {"upload_id": upload.id, "features": features}  # Return original dict to client
 
-@router.post("/{upload_id}/link_spotify")
-def link_upload_to_spotify(
+@router.get("/{upload_id}/duplicates", response_model=DuplicatesResponse)
+async def find_duplicates(upload_id: int, min_matches: int = 20, limit: int = 10,
+                          db: AsyncSession = Depends(get_read_db)):
+    """
+    Other uploads of the same recording, even re-encoded or trimmed.
+    Matches come from the hash index; a duplicate is an upload with at least
+    `min_matches` hashes agreeing on one time alignment.
+    """
+    upload = await db.scalar(select(Upload).where(Upload.id == upload_id))
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    total = await db.scalar(select(func.count()).select_from(Fingerprint).where(Fingerprint.upload_id == upload_id))
+    if not total:
+        raise HTTPException(status_code=400, detail="Upload has no fingerprint; re-analyze it")
+
+    ours, theirs = aliased(Fingerprint), aliased(Fingerprint)
+    delta = (theirs.time_offset - ours.time_offset).label("delta")
+    votes = func.count().label("votes")
+    rows = (await db.execute(
+        select(theirs.upload_id, delta, votes)
+        .select_from(ours)
+        .join(theirs, theirs.hash == ours.hash)
+        .where(ours.upload_id == upload_id, theirs.upload_id != upload_id)
+        .group_by(theirs.upload_id, delta)
+        .having(votes >= min_matches)
+        .order_by(votes.desc())
+    )).all()
+
+    best = {}
+    for other_id, other_delta, other_votes in rows:
+        best.setdefault(other_id, (other_delta, other_votes))  # highest-voted alignment first
+    matched = list(best.items())[:limit]
+    filenames = dict((await db.execute(
+        select(Upload.id, Upload.filename).where(Upload.id.in_([uid for uid, _ in matched]))
+    )).all())
+
+    return {
+        "upload_id": upload_id,
+        "duplicates": [
+            {
+                "id": uid,
+                "filename": filenames.get(uid),
+                "matches": n,
+                "score": n / total,
+                # where in this upload the other one starts
+                "offset_seconds": fingerprint.frames_to_seconds(-d),
+            }
+            for uid, (d, n) in matched
+        ],
+    }
+
+@router.get("/{upload_id}/beats", response_model=BeatGridResponse)
+async def get_beat_grid(upload_id: int, db: AsyncSession = Depends(get_read_db)):
+    """The full beat grid; only this endpoint loads the blob."""
+    row = (await db.execute(
+        select(Upload.id, Upload.beat_grid).where(Upload.id == upload_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if row.beat_grid is None:
+        raise HTTPException(status_code=400, detail="Upload has no beat grid; re-analyze it")
+    times = beatgrid.decode(row.beat_grid)
+    return {"upload_id": upload_id, "count": len(times), "beat_times": times.tolist()}
+
+@router.post("/{upload_id}/link_spotify", response_model=SpotifyLinkResponse)
+async def link_upload_to_spotify(
     upload_id: int, 
     spotify_track_id: str, 
     track_name: str = "Mock Song",
@@ -65,10 +347,10 @@ def link_upload_to_spotify(
     popularity: int = 42,
     preview_url: str = "http://mock.preview/clip.mp3",
     duration_ms: int = 180000,  # 3 minutes
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Link an upload to a Spotify track ID with optional metadata"""
-    upload = db.query(Upload).filter(Upload.id == upload_id).first()
+    upload = await db.scalar(select(Upload).where(Upload.id == upload_id))
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
     
@@ -83,8 +365,9 @@ def link_upload_to_spotify(
     upload.preview_url = preview_url
     upload.duration_ms = duration_ms
         
-    db.commit()
-    db.refresh(upload)
+    await db.commit()
+    await db.refresh(upload)
+    await response_cache.invalidate(UPLOADS)
     
     return {
         "upload_id": upload.id,
@@ -100,45 +383,95 @@ def link_upload_to_spotify(
         "message": "Successfully linked upload to Spotify track"
     }
 
-@router.get("/{upload_id}/similar")
-def get_similar_uploads(upload_id: int, k: int = 5, db: Session = Depends(get_db)):
-    upload = db.query(Upload).filter(Upload.id == upload_id).first()
+@router.get("/{upload_id}/similar", response_model=SimilarResponse)
+async def get_similar_uploads(
+    upload_id: int,
+    request: Request,
+    k: int = 5,
+    mode: Literal["track", "best_segment", "avg_segment"] = "track",
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Most similar uploads. `track` compares whole-track vectors; the segment
+    modes compare 10 s sections (see utils/segments.py).
+    """
+    cached = await response_cache.begin(request, [UPLOADS])
+    if cached.hit:
+        return cached.hit
+    upload = await db.scalar(select(Upload).where(Upload.id == upload_id))
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
     
     if not upload.features:
         raise HTTPException(status_code=400, detail="Upload has not been analyzed yet")
-    
-    # Parse JSON string back to dict for processing
-    current_features = json.loads(upload.features)
-    
-    # Get all other analyzed uploads
-    other_uploads = db.query(Upload).filter(
-        Upload.id != upload_id,
-        Upload.features.isnot(None)
-    ).all()
-    
-    similarities = []
-    for other_upload in other_uploads:
-        other_features = json.loads(other_upload.features)
-        # Simple similarity calculation (you can improve this)
-        score = calculate_similarity(current_features, other_features)
-        similarities.append({
-            "id": other_upload.id,
-            "filename": other_upload.filename,
-            "score": score
-        })
-    
-    # Sort by similarity score and return top k
-    similarities.sort(key=lambda x: x["score"], reverse=True)
-    
-    return {
+
+    if mode != "track":
+        return await cached.respond(await _similar_by_segments(db, upload, k, mode))
+
+    store = get_store()
+    if store is not None:
+        # the store holds every vector parsed and stacked already
+        vector = features_to_vector(json.loads(upload.features))
+        results = await compute.scoring.run(store.top_k, vector, k, exclude=[upload_id])
+        filenames = dict((await db.execute(
+            select(Upload.id, Upload.filename).where(Upload.id.in_([uid for uid, _ in results]))
+        )).all())
+        results = [(uid, score) for uid, score in results if uid in filenames]
+    else:
+        # Get all other analyzed uploads
+        rows = (await db.execute(select(Upload.id, Upload.filename, Upload.features).where(
+            Upload.id != upload_id,
+            Upload.features.isnot(None)
+        ))).all()
+        filenames = {uid: filename for uid, filename, _ in rows}
+
+        results = await compute.scoring.run(
+            _rank_uploads, upload.features, [(uid, features) for uid, _, features in rows], k
+        )
+
+    return await cached.respond({
         "upload_id": upload_id,
-        "similar": similarities[:k]
+        "mode": mode,
+        "similar": [{"id": uid, "filename": filenames[uid], "score": score} for uid, score in results]
+    })
+
+async def _similar_by_segments(db: AsyncSession, upload: Upload, k: int, mode: str):
+    target = await db.scalar(select(Upload.segments).where(Upload.id == upload.id))
+    if target is None:
+        raise HTTPException(status_code=400, detail="Upload has no segment embeddings; re-analyze it")
+
+    # shortlist on whole-track vectors, then rerank only those by segments
+    shortlist_k = max(k * 20, SEGMENT_SHORTLIST)
+    store = get_store()
+    if store is not None:
+        vector = features_to_vector(json.loads(upload.features))
+        shortlist = await compute.scoring.run(store.top_k, vector, shortlist_k, exclude=[upload.id])
+    else:
+        rows = (await db.execute(select(Upload.id, Upload.features).where(
+            Upload.id != upload.id,
+            Upload.features.isnot(None)
+        ))).all()
+        shortlist = await compute.scoring.run(_rank_uploads, upload.features, rows, shortlist_k)
+
+    rows = (await db.execute(select(Upload.id, Upload.filename, Upload.segments).where(
+        Upload.id.in_([uid for uid, _ in shortlist]),
+        Upload.segments.isnot(None)
+    ))).all()
+    filenames = {uid: filename for uid, filename, _ in rows}
+    results = await compute.scoring.run(
+        segments.rank_segments, target, [(uid, blob) for uid, _, blob in rows], k, mode
+    )
+
+    return {
+        "upload_id": upload.id,
+        "mode": mode,
+        "similar": [{"id": uid, "filename": filenames[uid], "score": score} for uid, score in results]
     }
 
-def calculate_similarity(features1: dict, features2: dict) -> float:
-    """Simple similarity calculation - you can make this more sophisticated."""
-    # For now, just return a random similarity score
-    import random
-    return random.uniform(0.0, 1.0)
\ No newline at end of file
+def _rank_uploads(target_features: str, rows, k: int):
+    """
+    Parse stored features and return the top-k (upload_id, score); runs on
+    the scoring pool. Parsing is per-row Python; only used without a feature store.
+    """
+    candidates = [(uid, json.loads(features)) for uid, features in rows]
+    return top_k_similar(json.loads(target_features), candidates, k=k)
@@ -1,47 +1,103 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from music_app.db import get_db
-from music_app.models import User
-from music_app.schemas import UserCreate
+from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from music_app.db import get_db, get_read_db
+from music_app.models import Fingerprint, Upload, User, UserLike
+from music_app.routers.uploads import remove_upload_files
+from music_app.schemas import BulkImportResult, MessageResponse, UserCreate, UserResponse
+from music_app.utils.bulk import bulk_import, conflict_insert
+from music_app.utils.feature_store import get_store
+from music_app.utils.likes import adjust_like_counts, liked_sets
+from music_app.utils.response_cache import LIKES, UPLOADS, response_cache, track_tag, user_likes_tag
 
 router = APIRouter()
 
-@router.post("/create")
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+@router.post("/create", response_model=UserResponse)
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     db_user = User(email=user.email, password=user.password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return {"id": db_user.id, "email": db_user.email}
+    await db.commit()
+    await db.refresh(db_user)
+    return {"id": db_user.id, "email": db_user.email, "created_at": db_user.created_at}
 
+async def _write_users(db: AsyncSession, rows, errors) -> int:
+    # insert-only: an import must never reset the credentials of an existing account
+    first_row = {}
+    for row, user in rows:
+        if user.email in first_row:
+            errors.append({"row": row, "error": "Duplicate email in import"})
+        else:
+            first_row[user.email] = row
+    users = [user.model_dump() for row, user in rows if first_row[user.email] == row]
 
-@router.get("/all")
-def get_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
+    dialect_insert = conflict_insert(db)
+    if dialect_insert is None:
+        await db.execute(insert(User), users)
+        return len(users)
+    stmt = dialect_insert(User).on_conflict_do_nothing(index_elements=["email"]).returning(User.email)
+    inserted = set(await db.scalars(stmt, users))
+    for email, row in first_row.items():
+        if email not in inserted:
+            errors.append({"row": row, "error": "Email already registered"})
+    return len(inserted)
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_create_users(request: Request, db: AsyncSession = Depends(get_db)):
+    """Import users from a JSON array, NDJSON or CSV body; existing emails are reported, not changed."""
+    return await bulk_import(request, db, UserCreate, _write_users)
+
+
+@router.get("/all", response_model=List[UserResponse])
+async def get_users(db: AsyncSession = Depends(get_read_db)):
+    users = (await db.scalars(select(User))).all()
     return [{"id": u.id, "email": u.email, "created_at": u.created_at} for u in users]
 
-@router.get("/{user_id}")
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+@router.get("/{user_id}", response_model=UserResponse)
+async def get_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {"id": user.id, "email": user.email, "created_at": user.created_at}
 
-@router.put("/{user_id}")
-def update_user(user_id: int, email: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+@router.put("/{user_id}", response_model=UserResponse)
+async def update_user(user_id: int, email: str, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.email = email
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return {"id": user.id, "email": user.email, "created_at": user.created_at}
 
-@router.delete("/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+@router.delete("/{user_id}", response_model=MessageResponse)
+async def delete_user(user_id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    # their likes go with them, taking the tracks' like counts down in the same transaction
+    unliked = list(await db.scalars(
+        delete(UserLike).where(UserLike.user_id == user_id).returning(UserLike.track_id)
+    ))
+    await adjust_like_counts(db, [t for t in unliked if t is not None], -1)
+    # and so do their uploads, fingerprints first for the foreign key
+    owned = select(Upload.id).where(Upload.user_id == user_id).scalar_subquery()
+    await db.execute(delete(Fingerprint).where(Fingerprint.upload_id.in_(owned)))
+    uploads = (await db.execute(
+        delete(Upload).where(Upload.user_id == user_id).returning(Upload.id, Upload.filename)
+    )).all()
+    await db.delete(user)
+    await db.commit()
+
+    # the committed rows are gone; now the copies outside the database
+    store = get_store()
+    if store is not None and uploads:
+        await run_in_threadpool(store.remove, [uid for uid, _ in uploads])
+    if uploads:
+        background_tasks.add_task(remove_upload_files, [filename for _, filename in uploads])
+    liked_sets.invalidate(user_id)
+    await response_cache.invalidate(
+        user_likes_tag(user_id), LIKES, UPLOADS, *(track_tag(t) for t in set(unliked) if t is not None)
+    )
     return {"message": f"User {user_id} deleted"}
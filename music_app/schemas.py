@@ -1,5 +1,6 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Dict, List, Optional
 
 class UserBase(BaseModel):
     email: str
@@ -9,6 +10,7 @@ class UserCreate(UserBase):
 
 class UserResponse(UserBase):
     id: int
+    created_at: Optional[datetime] = None
     model_config = ConfigDict(from_attributes=True)
 
 class TrackBase(BaseModel):
@@ -18,4 +20,176 @@ class TrackBase(BaseModel):
 
 class TrackResponse(TrackBase):
     id: int
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    provider: Optional[str] = None
+    external_id: Optional[str] = None
+    duration: Optional[int] = None
+    like_count: int = 0
+    created_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class TrackCreate(TrackBase):
+    provider: str
+    external_id: Optional[str] = None
+    duration: Optional[int] = None
+
+class LikeCreate(BaseModel):
+    user_id: int
+    track_id: int
+
+class LikeBatch(BaseModel):
+    user_id: int
+    like: List[int] = Field(default_factory=list, max_length=1000)
+    unlike: List[int] = Field(default_factory=list, max_length=1000)
+
+class LikeBatchResponse(BaseModel):
+    liked: List[int]    # newly liked; already-liked and unknown tracks are left out
+    unliked: List[int]  # likes that existed and were removed
+
+class LikedCheckResponse(BaseModel):
+    liked: List[int]  # the subset of the asked-for track ids this user has liked
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    received: int
+    imported: int
+    errors: List[BulkRowError]
+
+class MessageResponse(BaseModel):
+    message: str
+
+class LikeAddResponse(MessageResponse):
+    like_id: Optional[int] = None
+
+class LikedTrack(TrackBase):
+    id: int
+    provider: Optional[str] = None
+
+class LikeResponse(BaseModel):
+    id: int
+    track: LikedTrack
+
+class UploadResponse(BaseModel):
+    id: int
+    filename: str
+    user_id: int
+    uploaded_at: Optional[datetime] = None
+    features: Optional[str] = None
+    feature_version: Optional[int] = None
+    size_bytes: Optional[int] = None
+    checksum: Optional[str] = None
+    spotify_id: Optional[str] = None
+    spotify_url: Optional[str] = None
+    track_name: Optional[str] = None
+    artist_name: Optional[str] = None
+    album_name: Optional[str] = None
+    album_image_url: Optional[str] = None
+    popularity: Optional[int] = None
+    preview_url: Optional[str] = None
+    duration_ms: Optional[int] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class UploadSessionResponse(BaseModel):
+    session_id: str
+    user_id: Optional[int] = None
+    filename: Optional[str] = None
+    size: Optional[int] = None
+    created_at: Optional[float] = None
+    offset: int
+
+class AnalyzeResponse(BaseModel):
+    upload_id: int
+    features: Dict[str, Any]
+
+class SimilarUpload(BaseModel):
+    id: int
+    filename: str
+    score: float
+
+class SimilarResponse(BaseModel):
+    upload_id: int
+    mode: str
+    similar: List[SimilarUpload]
+
+class Duplicate(BaseModel):
+    id: int
+    filename: Optional[str] = None
+    matches: int
+    score: float
+    offset_seconds: float
+
+class DuplicatesResponse(BaseModel):
+    upload_id: int
+    duplicates: List[Duplicate]
+
+class BeatGridResponse(BaseModel):
+    upload_id: int
+    count: int
+    beat_times: List[float]
+
+class SpotifyLinkResponse(BaseModel):
+    upload_id: int
+    spotify_id: Optional[str] = None
+    spotify_url: Optional[str] = None
+    track_name: Optional[str] = None
+    artist_name: Optional[str] = None
+    album_name: Optional[str] = None
+    album_image_url: Optional[str] = None
+    popularity: Optional[int] = None
+    preview_url: Optional[str] = None
+    duration_ms: Optional[int] = None
+    message: str
+
+class SpotifyTrack(BaseModel):
+    id: Optional[str] = None
+    name: Optional[str] = None
+    artist: Optional[str] = None
+    album: Optional[str] = None
+    album_image_url: Optional[str] = None
+    popularity: Optional[int] = None
+    preview_url: Optional[str] = None
+    spotify_url: Optional[str] = None
+    duration_ms: Optional[int] = None
+
+class Recommendation(BaseModel):
+    id: int
+    similarity: float
+    spotify: Optional[SpotifyTrack] = None
+
+class RecommendationsResponse(BaseModel):
+    upload_id: int
+    recommendations: List[Recommendation]
+    page: int
+    per_page: int
+    total: int
+
+class SpotifySearchResponse(BaseModel):
+    query: str
+    results: List[SpotifyTrack]
+
+class LinkFromSearchResponse(BaseModel):
+    upload_id: int
+    spotify: SpotifyTrack
+
+class SearchHit(BaseModel):
+    source: str
+    id: int
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    album: Optional[str] = None
+    score: float
+
+class SearchResponse(BaseModel):
+    query: str
+    source: str
+    results: List[Dict[str, Any]]  # SearchHit for local results, SpotifyTrack for the fallback
+
+class Suggestion(BaseModel):
+    text: str
+    kind: str
+
+class AutocompleteResponse(BaseModel):
+    query: str
+    suggestions: List[Suggestion]
@@ -2,12 +2,13 @@ import random
 from faker import Faker
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from main import Base, User, Track, Upload, DATABASE_URL
+from music_app.db import require_database_url
+from music_app.models import User, Track, Upload
 
 fake = Faker()
 
 # --- Setup DB connection ---
-engine = create_engine(DATABASE_URL)
+engine = create_engine(require_database_url())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def seed():
@@ -17,7 +18,8 @@ def seed():
     def get_or_create_user(email):
         user = db.query(User).filter_by(email=email).first()
         if not user:
-            user = User(email=email)
+            # demo accounts; real sign-ups go through /users/create
+            user = User(email=email, password=fake.password())
             db.add(user)
             db.commit()
             db.refresh(user)
@@ -1,31 +1,176 @@
+import logging
+import os
 import librosa
 import numpy as np
-from typing import Dict, Any
+import soundfile as sf
+from typing import Dict, Any, Optional, Tuple
+from music_app.utils.metrics import span
+from music_app.utils.fingerprint import fingerprint
+from music_app.utils import beatgrid, segments, waveform
+from music_app.utils.segments import segment_means
+from music_app.utils.tonality import estimate_key
+from music_app.utils.similarity import FEATURE_VERSION, features_to_vector  # noqa: F401 (re-exported)
 
-def analyze_file(file_path: str) -> Dict[str, Any]:
-    """Run librosa analysis on audio and return features dict."""
+logger = logging.getLogger(__name__)
+
+# Every upload is analysed at this rate, whether it comes from the canonical
+# copy or a fresh decode, so features are comparable across source formats.
+CANONICAL_SR = 22050
+CANONICAL_SUFFIX = ".pcm.npy"
+WAVEFORM_SUFFIX = ".peaks"
+PREVIEW_SUFFIX = ".preview.ogg"
+PREVIEW_SECONDS = 30
+PREVIEW_FADE = 0.05  # seconds of fade at each end to avoid clicks
+
+
+def canonical_path(file_path: str) -> str:
+    """Where the decoded mono float32 copy of `file_path` lives."""
+    return file_path + CANONICAL_SUFFIX
+
+
+def waveform_path(file_path: str) -> str:
+    return file_path + WAVEFORM_SUFFIX
+
+
+def preview_path(file_path: str) -> str:
+    return file_path + PREVIEW_SUFFIX
+
+
+def _replace_with(target: str, write) -> None:
+    """Write via a temp file and rename, so readers never see a partial file."""
+    tmp = target + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, target)
+
+
+def transcode(file_path: str) -> Optional[str]:
+    """
+    Decode an upload once into the canonical format stored beside it.
+    Returns the canonical path, or None if the file can't be decoded.
+    """
     try:
-        y, sr = librosa.load(file_path, sr=None, mono=True)
+        y, _ = librosa.load(file_path, sr=CANONICAL_SR, mono=True)
     except Exception as e:
-        raise ValueError(f"Could not load audio file: {e}")
+        logger.warning("Could not transcode %s: %s", file_path, e)
+        return None
+
+    target = canonical_path(file_path)
+    _replace_with(target, lambda f: np.save(f, np.ascontiguousarray(y, dtype=np.float32)))
+    return target
+
+
+def preview_clip(y: np.ndarray, sr: int) -> np.ndarray:
+    """The loudest PREVIEW_SECONDS of `y`, with short fades."""
+    window = int(PREVIEW_SECONDS * sr)
+    if len(y) > window:
+        energy = np.concatenate([[0.0], np.cumsum(np.square(y, dtype=np.float64))])
+        start = int(np.argmax(energy[window:] - energy[:-window]))
+        start -= start % sr  # whole seconds, so the clip starts on a clean boundary
+        y = y[start:start + window]
+    clip = np.array(y, dtype=np.float32)
+    fade = min(int(PREVIEW_FADE * sr), len(clip) // 2)
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        clip[:fade] *= ramp
+        clip[-fade:] *= ramp[::-1]
+    return clip
+
+
+def prepare_media(file_path: str) -> bool:
+    """
+    Ingest-time work, done once per upload: canonical PCM, waveform peaks
+    and a preview clip, all stored beside the original. Returns False if
+    the file can't be decoded.
+    """
+    canonical = transcode(file_path)
+    if canonical is None:
+        return False
+    y = np.load(canonical, mmap_mode="r")
+    _replace_with(waveform_path(file_path), lambda f: f.write(waveform.build(y, CANONICAL_SR)))
+    clip = preview_clip(y, CANONICAL_SR)
+    _replace_with(preview_path(file_path), lambda f: sf.write(f, clip, CANONICAL_SR, format="OGG", subtype="VORBIS"))
+    return True
+
+
+def load_audio(file_path: str) -> Tuple[np.ndarray, int]:
+    """
+    Load mono samples at CANONICAL_SR, memory-mapping the canonical copy when
+    it exists and decoding the original otherwise.
+    """
+    canonical = canonical_path(file_path)
+    if os.path.exists(canonical):
+        return np.load(canonical, mmap_mode="r"), CANONICAL_SR
+    y, sr = librosa.load(file_path, sr=CANONICAL_SR, mono=True)
+    return y, sr
+
+
+def split_artifacts(result: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Separate analyze_file output into the JSON features and the binary
+    artifacts (arrays) that are stored in their own columns.
+    """
+    features = dict(result)
+    return features, features.pop("artifacts", None) or {}
+
+
+def pack_artifacts(artifacts: Dict[str, Any]) -> Dict[str, Optional[bytes]]:
+    """Upload column values for the blob artifacts present in `artifacts`."""
+    columns = {}
+    if artifacts.get("segments") is not None:
+        columns["segments"] = segments.pack(artifacts["segments"])
+    if artifacts.get("beat_grid") is not None:
+        columns["beat_grid"] = beatgrid.encode(artifacts["beat_grid"])
+    return columns
+
+
+def analyze_file(file_path: str) -> Dict[str, Any]:
+    """
+    Run librosa analysis on audio and return features dict.
+    Large array outputs are under "artifacts"; see split_artifacts.
+    """
+    with span("analyze.decode"):
+        try:
+            y, sr = load_audio(file_path)
+        except Exception as e:
+            raise ValueError(f"Could not load audio file: {e}")
 
     duration = float(librosa.get_duration(y=y, sr=sr))
-    tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
-    beat_times = [float(t) for t in librosa.frames_to_time(beat_frames, sr=sr)]
+    with span("analyze.beat_track"):
+        tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
+        tempo = float(np.atleast_1d(tempo)[0])  # librosa >= 0.10 returns a 1-element array
+        beat_times = [float(t) for t in librosa.frames_to_time(beat_frames, sr=sr)]
 
     # Key detection
-    chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-    chroma_mean = chroma.mean(axis=1)
-    key_index = int(np.argmax(chroma_mean))
-    key_labels = ['C','C#','D','D#','E','F','F#','G','G#','A','A#','B']
-    detected_key = key_labels[key_index]
+    with span("analyze.chroma"):
+        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+        chroma_mean = chroma.mean(axis=1)
+        key = estimate_key(chroma_mean)
 
     # Features
-    spectral_centroid = float(librosa.feature.spectral_centroid(y=y, sr=sr).mean())
-    spectral_contrast = float(librosa.feature.spectral_contrast(y=y, sr=sr).mean())
-    zcr = float(librosa.feature.zero_crossing_rate(y).mean())
-    mfcc = [float(x) for x in librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13).mean(axis=1)]
-    rms = float(librosa.feature.rms(y=y).mean())
+    with span("analyze.spectral"):
+        # frame-level rows: centroid, contrast (band mean), zcr, rms, 13 MFCCs
+        frames = [
+            librosa.feature.spectral_centroid(y=y, sr=sr),
+            librosa.feature.spectral_contrast(y=y, sr=sr).mean(axis=0, keepdims=True),
+            librosa.feature.zero_crossing_rate(y),
+            librosa.feature.rms(y=y),
+            librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13),
+        ]
+        n_frames = min(f.shape[1] for f in frames)
+        frames = np.vstack([f[:, :n_frames] for f in frames])
+        means = frames.mean(axis=1)
+        spectral_centroid = float(means[0])
+        spectral_contrast = float(means[1])
+        zcr = float(means[2])
+        rms = float(means[3])
+        mfcc = [float(x) for x in means[4:]]
+
+    with span("analyze.segments"):
+        segment_vectors = segment_means(frames, sr)
+
+    with span("analyze.fingerprint"):
+        hashes = fingerprint(y, sr)
 
     # Derived features (scaled to 0–1 where possible)
     energy = float(min(1.0, rms / 0.1))
@@ -38,8 +183,11 @@ def analyze_file(file_path: str) -> Dict[str, Any]:
     return {
         "duration": duration,
         "tempo_bpm": float(tempo),
-        "beat_times": beat_times[:20],  # cap at 20 for consistency
-        "key": detected_key,
+        "beat_times": beat_times[:20],  # preview only; the full grid is the beat_grid artifact
+        "beat_count": len(beat_times),
+        "key": key["key"],
+        "mode": key["mode"],
+        "key_confidence": key["key_confidence"],
         "spectral_centroid": spectral_centroid,
         "spectral_contrast": spectral_contrast,
         "zero_crossing_rate": zcr,
@@ -51,26 +199,5 @@ def analyze_file(file_path: str) -> Dict[str, Any]:
         "acousticness": acousticness,
         "instrumentalness": instrumentalness,
         "liveness": liveness,
+        "artifacts": {"segments": segment_vectors, "fingerprint": hashes, "beat_grid": beat_times},
     }
-
-def features_to_vector(features: Dict[str, Any]) -> np.ndarray:
-    """
-    Convert features dict into a numeric vector for similarity comparisons.
-    Non-numeric values (e.g., key, beat_times) are excluded.
-    """
-    vector_parts = [
-        features.get("duration", 0.0),
-        features.get("tempo_bpm", 0.0),
-        features.get("spectral_centroid", 0.0),
-        features.get("spectral_contrast", 0.0),
-        features.get("zero_crossing_rate", 0.0),
-        features.get("rms_energy", 0.0),
-        features.get("energy", 0.0),
-        features.get("danceability", 0.0),
-        features.get("valence", 0.0),
-        features.get("acousticness", 0.0),
-        features.get("instrumentalness", 0.0),
-        features.get("liveness", 0.0),
-    ] + features.get("mfcc", [])
-
-    return np.array(vector_parts, dtype=float)
@@ -0,0 +1,36 @@
+"""
+Compact beat-grid encoding.
+
+Beat times are rounded to milliseconds and stored as LEB128 varints: the
+first beat absolute, every later one as the gap from the previous beat.
+Gaps at normal tempos fit in two bytes, so a full grid for a five-minute
+track is about a kilobyte instead of several KB of JSON floats.
+"""
+import numpy as np
+
+
+def encode(times) -> bytes:
+    ms = np.round(np.asarray(times, dtype=float) * 1000).astype(np.int64)
+    deltas = np.diff(ms, prepend=0)
+    if (deltas < 0).any():
+        raise ValueError("Beat times must be non-decreasing and non-negative")
+    out = bytearray()
+    for value in deltas.tolist():
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode(blob: bytes) -> np.ndarray:
+    """Beat times in seconds."""
+    values, value, shift = [], 0, 0
+    for byte in blob:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value, shift = 0, 0
+    return np.cumsum(np.asarray(values, dtype=np.int64)) / 1000.0
@@ -0,0 +1,334 @@
+import csv
+import json
+from collections import deque
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+BATCH_SIZE = 1000
+# how far one CSV record may run on while a quoted field is open
+MAX_RECORD_LINES = 64
+MAX_RECORD_BYTES = 64 * 1024
+
+JSON_TYPES = {"application/json"}
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+CSV_TYPES = {"text/csv", "application/csv"}
+
+# (row number, validated model) pairs handed to a router's batch writer
+Rows = List[Tuple[int, BaseModel]]
+Errors = List[Dict[str, Any]]
+
+
+# -------------------------------
+# Parsing
+# -------------------------------
+async def _iter_lines(request: Request) -> AsyncIterator[bytes]:
+    """Yield raw lines (without line endings) from the request body as chunks arrive."""
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
+def _decode_error(e: UnicodeDecodeError) -> str:
+    return f"Invalid UTF-8 at byte {e.start}: {e.reason}"
+
+
+class _Lines:
+    """Refillable line source for a single csv.reader kept across the whole body."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+def _quoted_after(line: bytes, quoted: bool) -> bool:
+    """
+    Whether a quoted field is still open at the end of `line`. As in
+    csv.reader, a quote opens a field only at its start; anywhere else in an
+    unquoted field it is an ordinary character. (UTF-8 never uses 0x22 or
+    0x2C inside a multi-byte character.)
+    """
+    if not quoted and b'"' not in line:
+        return False
+    at_field_start = not quoted
+    i = 0
+    while i < len(line):
+        c = line[i:i + 1]
+        if quoted:
+            if c == b'"':
+                if line[i + 1:i + 2] == b'"':
+                    i += 1  # escaped quote
+                else:
+                    quoted = False
+        elif c == b'"' and at_field_start:
+            quoted = True
+        at_field_start = c == b"," and not quoted
+        i += 1
+    return quoted
+
+
+async def _iter_csv_records(request: Request) -> AsyncIterator[Tuple[Optional[List[str]], Optional[str]]]:
+    """
+    Yield (values, error) per CSV record. A record spans physical lines while
+    a quoted field is open, so quoted newlines survive; each complete record
+    is decoded, then parsed by one csv.reader that sees the original line
+    breaks. A quote still open after MAX_RECORD_LINES / MAX_RECORD_BYTES (or
+    at the end of the body) fails only the line that opened it, and the
+    lines after it are read again as records of their own.
+    """
+    source = _Lines()
+    reader = csv.reader(source)
+    lines = _iter_lines(request)
+    replay: deque = deque()
+    record: List[bytes] = []
+    size = 0
+    quoted = finished = False
+    while True:
+        if replay:
+            line = replay.popleft()
+        elif not finished:
+            try:
+                line = await lines.__anext__()
+            except StopAsyncIteration:
+                finished = True
+                continue
+        elif record:
+            yield None, "Unterminated quoted field"
+            replay.extend(record[1:])
+            record, size, quoted = [], 0, False
+            continue
+        else:
+            break
+
+        if not record and not line.strip():
+            continue
+        record.append(line)
+        size += len(line)
+        quoted = _quoted_after(line, quoted)
+        if quoted:
+            if len(record) >= MAX_RECORD_LINES or size >= MAX_RECORD_BYTES:
+                yield None, "Unterminated quoted field"
+                replay.extendleft(reversed(record[1:]))
+                record, size, quoted = [], 0, False
+            continue
+
+        raw, record, size = record, [], 0
+        try:
+            source.lines.extend(part.decode("utf-8") + "\n" for part in raw)
+        except UnicodeDecodeError as e:
+            yield None, _decode_error(e)
+            continue
+        try:
+            yield next(reader), None
+        except csv.Error as e:
+            source.lines.clear()
+            yield None, f"Invalid CSV: {e}"
+
+
+async def iter_records(request: Request) -> AsyncIterator[Tuple[Optional[Any], Optional[str]]]:
+    """
+    Yield (payload, error) pairs from a JSON array, NDJSON or CSV body.
+
+    NDJSON and CSV are parsed record by record as the body streams in, so a
+    malformed line (bad JSON, bad UTF-8, wrong column count) becomes a
+    per-row error instead of failing the request.
+    """
+    media_type = request.headers.get("content-type", "application/json")
+    media_type = media_type.split(";")[0].strip().lower()
+
+    if media_type in NDJSON_TYPES:
+        async for line in _iter_lines(request):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line.decode("utf-8")), None
+            except UnicodeDecodeError as e:
+                yield None, _decode_error(e)
+            except ValueError as e:
+                yield None, f"Invalid JSON: {e}"
+
+    elif media_type in CSV_TYPES:
+        header = None
+        async for values, error in _iter_csv_records(request):
+            if error:
+                if header is None:
+                    raise HTTPException(status_code=400, detail=f"Unreadable CSV header: {error}")
+                yield None, error
+                continue
+            if header is None:
+                header = [h.strip() for h in values]
+                continue
+            if len(values) != len(header):
+                yield None, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            # empty CSV cells mean "not provided"
+            yield {k: (v if v != "" else None) for k, v in zip(header, values)}, None
+
+    elif media_type in JSON_TYPES:
+        try:
+            payload = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        for item in payload:
+            yield item, None
+
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {media_type}")
+
+
+# -------------------------------
+# Validation
+# -------------------------------
+@lru_cache(maxsize=None)
+def _list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[schema])
+
+
+def _format_error(err: Dict[str, Any]) -> str:
+    field = ".".join(str(part) for part in err["loc"][1:])
+    return f"{field}: {err['msg']}" if field else err["msg"]
+
+
+def validate_batch(schema: Type[BaseModel], batch: List[Tuple[int, Any]], errors: Errors) -> Rows:
+    """Validate a whole batch at once, falling back to per-row checks on failure."""
+    try:
+        models = _list_adapter(schema).validate_python([payload for _, payload in batch])
+        return [(row, model) for (row, _), model in zip(batch, models)]
+    except ValidationError as exc:
+        bad = {}
+        for err in exc.errors():
+            bad.setdefault(err["loc"][0], _format_error(err))
+
+    valid = []
+    for i, (row, payload) in enumerate(batch):
+        if i in bad:
+            errors.append({"row": row, "error": bad[i]})
+        else:
+            valid.append((row, schema.model_validate(payload)))
+    return valid
+
+
+# -------------------------------
+# Writing
+# -------------------------------
+def conflict_insert(db: AsyncSession):
+    """The dialect's insert() with ON CONFLICT support, or None if it has none."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+async def upsert(db: AsyncSession, model, rows: List[Dict[str, Any]], key: str, update: List[str]) -> int:
+    """
+    Insert rows in one executemany, updating `update` columns when `key` already exists.
+
+    Rows sharing a key within the batch are collapsed (last one wins) because
+    Postgres refuses to touch the same row twice in one ON CONFLICT statement.
+    """
+    if not rows:
+        return 0
+    keyed = {}
+    unkeyed = []
+    for row in rows:
+        if row.get(key) is None:
+            unkeyed.append(row)
+        else:
+            keyed[row[key]] = row
+    rows = list(keyed.values()) + unkeyed
+
+    dialect_insert = conflict_insert(db)
+    if dialect_insert is None:
+        await db.execute(insert(model), rows)
+        return len(rows)
+
+    stmt = dialect_insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={col: stmt.excluded[col] for col in update},
+    )
+    await db.execute(stmt, rows)
+    return len(rows)
+
+
+async def _flush(db: AsyncSession, schema: Type[BaseModel], write_batch: Callable, batch, errors: Errors) -> int:
+    rows = validate_batch(schema, batch, errors)
+    if not rows:
+        return 0
+    try:
+        count = await write_batch(db, rows, errors)
+        await db.commit()
+        return count
+    except SQLAlchemyError:
+        await db.rollback()
+
+    # the batch failed as a whole: retry row by row to pin down the bad ones
+    count = 0
+    for row, model in rows:
+        try:
+            count += await write_batch(db, [(row, model)], errors)
+            await db.commit()
+        except SQLAlchemyError as e:
+            await db.rollback()
+            errors.append({"row": row, "error": str(e.orig if hasattr(e, "orig") else e)})
+    return count
+
+
+async def bulk_import(
+    request: Request,
+    db: AsyncSession,
+    schema: Type[BaseModel],
+    write_batch: Callable[[AsyncSession, Rows, Errors], Awaitable[int]],
+    batch_size: int = BATCH_SIZE,
+) -> Dict[str, Any]:
+    """
+    Stream records from the request, validate and write them in batches.
+
+    `await write_batch(db, rows, errors)` receives validated (row, model) pairs,
+    may append per-row errors, and returns how many rows it wrote.
+    Row numbers in the report are zero-based record positions.
+    """
+    received = 0
+    imported = 0
+    errors: Errors = []
+    batch: List[Tuple[int, Any]] = []
+
+    async for payload, error in iter_records(request):
+        row = received
+        received += 1
+        if error:
+            errors.append({"row": row, "error": error})
+            continue
+        batch.append((row, payload))
+        if len(batch) >= batch_size:
+            imported += await _flush(db, schema, write_batch, batch, errors)
+            batch = []
+
+    if batch:
+        imported += await _flush(db, schema, write_batch, batch, errors)
+
+    errors.sort(key=lambda e: e["row"])
+    return {"received": received, "imported": imported, "errors": errors}
@@ -0,0 +1,150 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from music_app.utils.metrics import collect_spans, observe_spans
+
+
+class Overloaded(Exception):
+    """The executor's queue is full; the caller should shed the request."""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} executor is saturated")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class TaskTimeout(Exception):
+    """A task ran past its deadline; it may still be finishing in the background."""
+
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"{name} task exceeded {timeout}s")
+        self.name = name
+        self.timeout = timeout
+
+
+class ComputeExecutor:
+    """
+    Bounded pool for CPU-heavy work called from async handlers.
+
+    At most `max_workers + max_queue` tasks are admitted; beyond that `run`
+    raises Overloaded immediately instead of queueing. A slot is released
+    when the task really finishes, not when its caller times out, so
+    abandoned work still counts against the bound.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        max_workers: int,
+        max_queue: int,
+        timeout: float,
+        retry_after: int = 5,
+    ):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._pool: Optional[Executor] = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                # spawn, not fork: the server process has threads and open sockets
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._pool
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    @staticmethod
+    def _observe_spans(future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            observe_spans(future.result()[1])
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                raise Overloaded(self.name, self.retry_after)
+            self._in_flight += 1
+
+        loop = asyncio.get_running_loop()
+        call = partial(fn, *args, **kwargs)
+        if self.kind == "process":
+            # spans in a child would land in the child's REGISTRY; ship them back
+            # with the result, and observe them even if the caller gives up first
+            call = partial(collect_spans, call)
+        try:
+            future = loop.run_in_executor(self._get_pool(), call)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        if self.kind == "process":
+            future.add_done_callback(self._observe_spans)
+
+        deadline = self.timeout if timeout is None else timeout
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), deadline)
+        except asyncio.TimeoutError:
+            raise TaskTimeout(self.name, deadline)
+        return result[0] if self.kind == "process" else result
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+_cpus = os.cpu_count() or 2
+
+# librosa analysis: separate processes, since decoding and feature
+# extraction hold the GIL for long stretches
+analysis = ComputeExecutor(
+    "analysis",
+    kind=os.getenv("ANALYSIS_POOL", "process"),
+    max_workers=_env_int("ANALYSIS_WORKERS", max(1, _cpus // 2)),
+    max_queue=_env_int("ANALYSIS_QUEUE", 8),
+    timeout=float(os.getenv("ANALYSIS_TIMEOUT", "120")),
+    retry_after=30,
+)
+
+# similarity scoring: threads are enough, the NumPy kernels release the GIL
+# (parsing candidate JSON doesn't, which is what the feature store is for)
+scoring = ComputeExecutor(
+    "scoring",
+    kind="thread",
+    max_workers=_env_int("SCORING_WORKERS", min(8, _cpus)),
+    max_queue=_env_int("SCORING_QUEUE", 64),
+    timeout=float(os.getenv("SCORING_TIMEOUT", "10")),
+    retry_after=2,
+)
+
+
+def shutdown() -> None:
+    analysis.shutdown()
+    scoring.shutdown()
@@ -0,0 +1,281 @@
+"""
+On-disk feature matrix shared by every worker through the OS page cache.
+
+A store is a directory:
+
+    manifest.json          {"dim": 24, "next_segment": 3, "segments": [...]}
+    seg-000001.ids.npy     int64 upload ids, shape (n,)
+    seg-000001.vec.npy     float32 L2-normalised vectors, shape (n, dim)
+
+Segments are immutable once written. New uploads go into new segments; a
+later segment wins when an id appears twice, so re-analysis is an append
+too, and `remove` appends a tombstone segment that hides its ids. `compact`
+merges everything into one segment, dropping what was superseded or
+removed; appends leave that to background work (compact_if_needed).
+`replace` swaps in a store built from scratch. The manifest is replaced atomically
+under a file lock, and readers notice a new manifest by its mtime and
+re-open without taking the lock.
+"""
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from music_app.utils.similarity import top_k_indices
+
+MANIFEST = "manifest.json"
+LOCK = ".lock"
+MAX_SEGMENTS = int(os.getenv("FEATURE_STORE_MAX_SEGMENTS", "32"))
+OPEN_RETRIES = 3
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise each row so cosine similarity is a plain dot product; zero rows stay zero."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    out = np.zeros_like(vectors)
+    np.divide(vectors, norms, out=out, where=norms > 0)
+    return out
+
+
+class _Segment:
+    def __init__(self, directory: str, name: str, tombstone: bool = False):
+        self.name = name
+        self.tombstone = tombstone  # its ids are deleted, not re-stored
+        self.ids = np.load(os.path.join(directory, f"{name}.ids.npy"), mmap_mode="r")
+        self.vectors = np.load(os.path.join(directory, f"{name}.vec.npy"), mmap_mode="r")
+        self.superseded: Optional[np.ndarray] = None  # rows overridden by a later segment
+
+
+def _open_segment(directory: str, entry: dict) -> _Segment:
+    return _Segment(directory, entry["name"], tombstone=entry.get("tombstone", False))
+
+
+class FeatureStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.dim: Optional[int] = None
+        self._segments: List[_Segment] = []
+        self._version: Optional[tuple] = None
+        self._open_lock = threading.Lock()
+
+    # -------------------------------
+    # Reading
+    # -------------------------------
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.path, MANIFEST)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def _read_manifest(self) -> dict:
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _manifest_version(self) -> tuple:
+        st = os.stat(self.manifest_path)
+        return (st.st_ino, st.st_mtime_ns)  # os.replace always yields a new inode
+
+    def _open_segments(self) -> Tuple[tuple, dict, List[_Segment]]:
+        # a compaction in another process may delete the segments of the
+        # manifest we just read; its replacement manifest is already
+        # published by then, so read again rather than wait on the writers' lock
+        for attempt in range(OPEN_RETRIES):
+            version = self._manifest_version()  # before the read: at worst we re-open once more
+            manifest = self._read_manifest()
+            try:
+                return version, manifest, [_open_segment(self.path, s) for s in manifest["segments"]]
+            except FileNotFoundError:
+                if attempt == OPEN_RETRIES - 1:
+                    raise
+
+    def refresh(self) -> None:
+        """Re-open the segments if another process published a new manifest."""
+        version = self._manifest_version()
+        if version == self._version:
+            return
+        with self._open_lock:
+            if version == self._version:
+                return
+            version, manifest, segments = self._open_segments()
+            # an id is live only in the last segment that contains it
+            seen = np.empty(0, dtype=np.int64)
+            for seg in reversed(segments):
+                if seg.tombstone:
+                    seg.superseded = np.ones(len(seg.ids), dtype=bool)
+                else:
+                    seg.superseded = np.isin(seg.ids, seen) if seen.size else None
+                seen = np.union1d(seen, seg.ids)
+            self.dim = manifest["dim"]
+            self._segments = segments
+            self._version = version
+
+    def __len__(self) -> int:
+        self.refresh()
+        return sum(
+            len(s.ids) - (int(s.superseded.sum()) if s.superseded is not None else 0)
+            for s in self._segments
+        )
+
+    def ids(self) -> np.ndarray:
+        """Live ids: neither superseded nor removed."""
+        self.refresh()
+        live = [s.ids if s.superseded is None else s.ids[~s.superseded] for s in self._segments]
+        return np.concatenate(live) if live else np.empty(0, dtype=np.int64)
+
+    def top_k(self, target: np.ndarray, k: int, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Cosine top-k of `target` against every live vector, best first."""
+        self.refresh()
+        target = normalize_rows(np.asarray(target, dtype=np.float32).reshape(1, -1))[0]
+        exclude = np.fromiter(exclude, dtype=np.int64)
+
+        ids, scores = [], []
+        for seg in self._segments:
+            if not len(seg.ids):
+                continue
+            seg_scores = np.asarray(seg.vectors @ target)
+            dead = seg.superseded
+            if exclude.size:
+                gone = np.isin(seg.ids, exclude)
+                dead = gone if dead is None else (dead | gone)
+            if dead is not None:
+                seg_scores[dead] = -np.inf
+            top = top_k_indices(seg_scores, k)
+            ids.append(np.asarray(seg.ids[top]))
+            scores.append(seg_scores[top])
+
+        if not ids:
+            return []
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        return [
+            (int(ids[i]), float(scores[i]))
+            for i in top_k_indices(scores, k)
+            if np.isfinite(scores[i])
+        ]
+
+    # -------------------------------
+    # Writing
+    # -------------------------------
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_manifest(self, manifest: dict) -> None:
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+    def _write_segment(self, manifest: dict, ids: np.ndarray, vectors: np.ndarray, tombstone: bool = False) -> dict:
+        name = f"seg-{manifest['next_segment']:06d}"
+        manifest["next_segment"] += 1
+        for suffix, data in (("ids", ids.astype(np.int64)), ("vec", vectors)):
+            final = os.path.join(self.path, f"{name}.{suffix}.npy")
+            with open(final + ".tmp", "wb") as f:
+                np.save(f, data)
+            os.replace(final + ".tmp", final)
+        entry = {"name": name, "rows": int(len(ids))}
+        if tombstone:
+            entry["tombstone"] = True
+        return entry
+
+    def _remove_segment_files(self, segments: List[dict]) -> None:
+        # open readers keep their mappings; the inodes go away when they re-open
+        for s in segments:
+            for suffix in ("ids", "vec"):
+                os.remove(os.path.join(self.path, f"{s['name']}.{suffix}.npy"))
+
+    def append(self, ids: Sequence[int], vectors: np.ndarray) -> None:
+        """Publish a new segment. Never compacts: see compact_if_needed()."""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        with self._locked():
+            manifest = self._read_manifest() if self.exists() else {
+                "dim": int(vectors.shape[1]), "next_segment": 1, "segments": []
+            }
+            if vectors.shape[1] != manifest["dim"]:
+                raise ValueError(f"Vector dim {vectors.shape[1]} != store dim {manifest['dim']}")
+            manifest["segments"].append(self._write_segment(manifest, np.asarray(ids), vectors))
+            self._write_manifest(manifest)
+
+    def remove(self, ids: Sequence[int]) -> None:
+        """Hide `ids` from every reader; the rows go away at the next compaction."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not ids.size or not self.exists():
+            return
+        with self._locked():
+            manifest = self._read_manifest()
+            vectors = np.zeros((len(ids), manifest["dim"]), dtype=np.float32)
+            manifest["segments"].append(self._write_segment(manifest, ids, vectors, tombstone=True))
+            self._write_manifest(manifest)
+
+    def replace(self, ids: Sequence[int], vectors: np.ndarray) -> None:
+        """Swap in a store holding exactly these rows, whatever was there before."""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        with self._locked():
+            manifest = self._read_manifest() if self.exists() else {"next_segment": 1, "segments": []}
+            old = manifest["segments"]
+            manifest["dim"] = int(vectors.shape[1])
+            manifest["segments"] = [self._write_segment(manifest, np.asarray(ids), vectors)]
+            self._write_manifest(manifest)
+            self._remove_segment_files(old)
+
+    def compact(self) -> None:
+        """Merge all segments into one, dropping superseded and removed rows."""
+        with self._locked():
+            self._compact_locked()
+
+    def compact_if_needed(self) -> bool:
+        """
+        Compact once appends have left more than MAX_SEGMENTS segments. A
+        compaction rewrites the whole store, so this runs from background
+        tasks and batch jobs, never inside a request.
+        """
+        if not self.exists() or len(self._read_manifest()["segments"]) <= MAX_SEGMENTS:
+            return False
+        with self._locked():
+            if len(self._read_manifest()["segments"]) <= MAX_SEGMENTS:
+                return False  # another worker got there first
+            self._compact_locked()
+        return True
+
+    def _compact_locked(self) -> None:
+        manifest = self._read_manifest()
+        old = manifest["segments"]
+        if len(old) <= 1:
+            return
+        segments = [_open_segment(self.path, s) for s in old]
+        ids = np.concatenate([s.ids for s in segments])
+        vectors = np.concatenate([s.vectors for s in segments])
+        removed = np.concatenate([np.full(len(s.ids), s.tombstone) for s in segments])
+        # keep the last occurrence of every id, unless that is a tombstone
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = np.sort(len(ids) - 1 - last)
+        keep = keep[~removed[keep]]
+        manifest["segments"] = [self._write_segment(manifest, ids[keep], vectors[keep])]
+        self._write_manifest(manifest)
+        self._remove_segment_files(old)
+
+
+_stores = {}
+
+
+def get_store() -> Optional[FeatureStore]:
+    """The store named by FEATURE_STORE_DIR, or None when unset or not yet exported."""
+    path = os.getenv("FEATURE_STORE_DIR")
+    if not path:
+        return None
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = FeatureStore(path)
+    return store if store.exists() else None
@@ -0,0 +1,64 @@
+"""
+Spectral-peak fingerprints for spotting re-uploads of the same recording.
+
+Local maxima of the log spectrogram are paired with the next few peaks
+after them; each pair hashes (anchor freq, target freq, time gap) into 26
+bits and is stored with the anchor's frame offset. Peaks survive
+re-encoding, and pairs are position-independent, so a trimmed copy still
+produces the same hashes at shifted offsets. Matching is then an index
+lookup on the hash plus a vote over offset differences: a true duplicate
+piles its votes onto one alignment.
+"""
+import numpy as np
+
+N_FFT = 2048
+HOP_LENGTH = 512
+PEAK_NEIGHBORHOOD = (21, 11)   # (freq bins, frames) a peak must dominate
+PEAK_FLOOR_DB = -50.0          # relative to the loudest bin; ignores near-silence
+PEAKS_PER_SECOND = 30          # keep only the strongest peaks, so noise can't flood the index
+MAX_FREQ_BIN = 1023            # 10 bits
+FAN_OUT = 5                    # targets paired with each anchor
+MAX_DT = 63                    # 6 bits, ~1.5 s at 22.05 kHz
+
+
+def spectral_peaks(y: np.ndarray, sr: int):
+    """(freq bins, frames) of spectrogram peaks, ordered by time then frequency."""
+    import librosa
+    from scipy.ndimage import maximum_filter
+    spec = np.abs(librosa.stft(np.asarray(y, dtype=np.float32), n_fft=N_FFT, hop_length=HOP_LENGTH))
+    log_spec = librosa.amplitude_to_db(spec[: MAX_FREQ_BIN + 1], ref=np.max)
+    is_peak = (maximum_filter(log_spec, size=PEAK_NEIGHBORHOOD) == log_spec) & (log_spec > PEAK_FLOOR_DB)
+    freqs, frames = np.nonzero(is_peak)
+    budget = int(PEAKS_PER_SECOND * len(y) / sr) + 1
+    if len(freqs) > budget:
+        strongest = np.argpartition(-log_spec[freqs, frames], budget - 1)[:budget]
+        freqs, frames = freqs[strongest], frames[strongest]
+    order = np.lexsort((freqs, frames))
+    return freqs[order], frames[order]
+
+
+def pair_hashes(freqs: np.ndarray, frames: np.ndarray) -> np.ndarray:
+    """Unique (hash, anchor frame) rows, shape (n, 2)."""
+    out = []
+    for d in range(1, FAN_OUT + 1):
+        f1, f2 = freqs[:-d], freqs[d:]
+        t1, dt = frames[:-d], frames[d:] - frames[:-d]
+        ok = (dt > 0) & (dt <= MAX_DT)
+        h = (f1[ok].astype(np.int64) << 16) | (f2[ok].astype(np.int64) << 6) | dt[ok]
+        out.append(np.stack([h, t1[ok]], axis=1))
+    if not out:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(out), axis=0)
+
+
+def fingerprint(y: np.ndarray, sr: int) -> np.ndarray:
+    return pair_hashes(*spectral_peaks(y, sr))
+
+
+def index_rows(upload_id: int, hashes: np.ndarray) -> list:
+    """Rows for the fingerprints table."""
+    return [{"hash": int(h), "upload_id": upload_id, "time_offset": int(t)} for h, t in hashes]
+
+
+def frames_to_seconds(frames: int, sr: int = 22050) -> float:
+    return frames * HOP_LENGTH / sr
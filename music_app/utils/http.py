@@ -0,0 +1,22 @@
+import hashlib
+import os
+
+from fastapi import Request
+
+
+def file_etag(path: str, *variant) -> str:
+    """Strong ETag from a file's size and mtime, plus anything that changes the representation."""
+    st = os.stat(path)
+    base = "-".join(str(p) for p in (st.st_mtime_ns, st.st_size, *variant))
+    return f'"{hashlib.md5(base.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already names `etag` (answer 304)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag in tags
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(512 * 1024 * 1024)))
+WRITE_BUFFER = 1024 * 1024  # batch small request chunks into ~1 MiB writes
+SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+SESSION_DIR = ".sessions"
+
+
+def safe_filename(filename: str) -> str:
+    return f"{uuid.uuid4()}_{os.path.basename(filename or 'upload')}"
+
+
+def declared_length(header: Optional[str]) -> Optional[int]:
+    """Content-Length as an int; a malformed header is the client's error, not ours."""
+    if header is None:
+        return None
+    if not header.strip().isdigit():
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    return int(header)
+
+
+def check_declared_size(size: Optional[int], limit: Optional[int] = None) -> None:
+    """Reject an upload up front when the client already told us it's too big."""
+    limit = MAX_UPLOAD_BYTES if limit is None else limit
+    if size is not None and size > limit:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+
+
+def _write_at(path: str, offset: int, data: bytes) -> None:
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+async def stream_to_file(
+    chunks: AsyncIterator[bytes],
+    path: str,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    hasher=None,
+) -> int:
+    """
+    Write `chunks` to `path` starting at `offset`, returning the bytes written.
+
+    Chunks are coalesced into WRITE_BUFFER-sized writes done on a worker
+    thread. Raises 413 as soon as the running total passes `limit`. Writing
+    at an explicit offset (rather than appending) makes a retried chunk
+    overwrite itself instead of duplicating data.
+    """
+    limit = MAX_UPLOAD_BYTES if limit is None else limit
+    if not os.path.exists(path):
+        open(path, "wb").close()
+
+    written = 0
+    pending = bytearray()
+    for_hash = hasher.update if hasher is not None else None
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if offset + written + len(pending) + len(chunk) > limit:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+        pending += chunk
+        if for_hash:
+            for_hash(chunk)
+        if len(pending) >= WRITE_BUFFER:
+            await run_in_threadpool(_write_at, path, offset + written, bytes(pending))
+            written += len(pending)
+            pending.clear()
+    if pending:
+        await run_in_threadpool(_write_at, path, offset + written, bytes(pending))
+        written += len(pending)
+    return written
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(WRITE_BUFFER), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# -------------------------------
+# Resumable sessions
+# -------------------------------
+# A session is two files under <upload_dir>/.sessions: <id>.json with the
+# metadata and <id>.part with the bytes so far. The size of the .part file
+# is the authoritative offset, so state survives restarts and works across
+# workers without shared memory.
+class UploadSessions:
+    def __init__(self, upload_dir: str):
+        self.dir = os.path.join(upload_dir, SESSION_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _meta_path(self, session_id: str) -> str:
+        return os.path.join(self.dir, f"{session_id}.json")
+
+    def part_path(self, session_id: str) -> str:
+        return os.path.join(self.dir, f"{session_id}.part")
+
+    def create(self, user_id: int, filename: str, size: Optional[int] = None) -> Dict:
+        check_declared_size(size)
+        self.purge_stale()
+        session_id = uuid.uuid4().hex
+        meta = {
+            "session_id": session_id,
+            "user_id": user_id,
+            "filename": os.path.basename(filename),
+            "size": size,
+            "created_at": time.time(),
+        }
+        open(self.part_path(session_id), "wb").close()
+        with open(self._meta_path(session_id), "w") as f:
+            json.dump(meta, f)
+        return {**meta, "offset": 0}
+
+    def get(self, session_id: str) -> Dict:
+        try:
+            with open(self._meta_path(os.path.basename(session_id))) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        meta["offset"] = os.path.getsize(self.part_path(meta["session_id"]))
+        return meta
+
+    def discard(self, session_id: str) -> None:
+        remove_file(self._meta_path(session_id))
+        remove_file(self.part_path(session_id))
+
+    def purge_stale(self, ttl: int = SESSION_TTL) -> None:
+        """Drop sessions that haven't received a chunk within `ttl` seconds."""
+        cutoff = time.time() - ttl
+        for name in os.listdir(self.dir):
+            if not name.endswith(".json"):
+                continue
+            session_id = name[:-len(".json")]
+            paths = [self._meta_path(session_id), self.part_path(session_id)]
+            last_seen = max((os.path.getmtime(p) for p in paths if os.path.exists(p)), default=0)
+            if last_seen < cutoff:
+                self.discard(session_id)
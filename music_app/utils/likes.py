@@ -0,0 +1,132 @@
+"""
+Like bookkeeping that saves scanning user_likes on reads.
+
+- tracks.like_count is kept in step with user_likes by the write paths,
+  inside the same transaction as the like itself (adjust_like_counts).
+  recount_like_counts() rebuilds it from scratch, for imports and repairs.
+- LikedSets caches each user's liked track ids as a sorted int32 array
+  (4 bytes a like), so "which of these 50 tracks has this user liked" is
+  one binary search over memory instead of a query per page.
+"""
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import bindparam, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from music_app.models import Track, UserLike
+from music_app.utils.upstream import TTLCache
+
+LIKED_SET_TTL = float(os.getenv("LIKED_SET_TTL", "60"))
+LIKED_SET_CACHE_SIZE = 10_000
+
+
+# -------------------------------
+# Per-track counters
+# -------------------------------
+_bump = (
+    update(Track.__table__)
+    .where(Track.__table__.c.id == bindparam("b_id"))
+    .values(like_count=Track.__table__.c.like_count + bindparam("b_delta"))
+)
+
+
+async def adjust_like_counts(db: AsyncSession, track_ids: Iterable[int], delta: int) -> None:
+    """Add `delta` to like_count once per occurrence of each id; call before committing the likes."""
+    counts = Counter(track_ids)
+    if counts:
+        await db.execute(_bump, [{"b_id": t, "b_delta": n * delta} for t, n in counts.items()])
+
+
+def recount_like_counts(connection, lo: Optional[int] = None, hi: Optional[int] = None) -> None:
+    """Recompute like_count from user_likes, for every track or those with lo <= id <= hi."""
+    # one grouped pass over user_likes rather than a correlated COUNT per track
+    ranged = lo is not None
+    params = {"lo": lo, "hi": hi} if ranged else {}
+    connection.execute(text(
+        "UPDATE tracks SET like_count = 0 WHERE like_count <> 0"
+        + (" AND id BETWEEN :lo AND :hi" if ranged else "")
+    ), params)
+    connection.execute(text(
+        "UPDATE tracks SET like_count = counts.n FROM ("
+        "SELECT track_id, COUNT(*) AS n FROM user_likes"
+        + (" WHERE track_id BETWEEN :lo AND :hi" if ranged else "")
+        + " GROUP BY track_id) AS counts WHERE counts.track_id = tracks.id"
+    ), params)
+
+
+# -------------------------------
+# Per-user liked sets
+# -------------------------------
+class LikedSets:
+    """
+    Sorted arrays of liked track ids, per user. Entries live for `ttl`
+    seconds and are dropped by invalidate() when this process writes a
+    like; other workers see the change once their copy expires.
+
+    A load that raced a write must not be cached. Loads in flight are
+    counted per user together with a generation that invalidate() bumps,
+    and clear() bumps a global epoch. A load caches its result only if
+    neither moved while it ran. The per-user entries disappear when the
+    user's last load finishes, so the bookkeeping is bounded by the loads
+    in flight rather than by every user ever invalidated.
+    """
+
+    def __init__(self, ttl: float = LIKED_SET_TTL, maxsize: int = LIKED_SET_CACHE_SIZE):
+        self.cache = TTLCache(maxsize, ttl)
+        self._inflight: Dict[int, List[int]] = {}  # user_id -> [loads, generation]
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    async def get(self, db: AsyncSession, user_id: int) -> np.ndarray:
+        liked = self.cache.get(user_id)
+        if liked is not None:
+            return liked
+        with self._lock:
+            epoch = self._epoch
+            entry = self._inflight.setdefault(user_id, [0, 0])
+            entry[0] += 1
+            generation = entry[1]
+        fresh = False
+        try:
+            ids = await db.scalars(
+                select(UserLike.track_id)
+                .where(UserLike.user_id == user_id, UserLike.track_id.is_not(None))
+                .order_by(UserLike.track_id)
+            )
+            liked = np.fromiter(ids, dtype=np.int32)
+        finally:
+            with self._lock:
+                entry = self._inflight[user_id]
+                fresh = entry[1] == generation and self._epoch == epoch
+                entry[0] -= 1
+                if not entry[0]:
+                    del self._inflight[user_id]
+        if fresh:
+            self.cache.set(user_id, liked)
+        return liked
+
+    async def contains(self, db: AsyncSession, user_id: int, track_ids: List[int]) -> List[bool]:
+        liked = await self.get(db, user_id)
+        if not len(liked) or not track_ids:
+            return [False] * len(track_ids)
+        wanted = np.asarray(track_ids, dtype=np.int64)
+        pos = np.searchsorted(liked, wanted).clip(max=len(liked) - 1)
+        return (liked[pos] == wanted).tolist()
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            entry = self._inflight.get(user_id)
+            if entry is not None:
+                entry[1] += 1
+        self.cache.pop(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+        self.cache.clear()
+
+
+liked_sets = LikedSets()
@@ -0,0 +1,248 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), t[0])) for k, (c, t) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"),
+))
+REQUEST_QUERIES = REGISTRY.register(Histogram(
+    "http_request_sql_queries", "SQL statements issued per HTTP request.",
+    ("method", "route"), buckets=COUNT_BUCKETS,
+))
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "stage_duration_seconds", "Time spent in named stages inside handlers.", ("stage",),
+))
+SQL_LATENCY = REGISTRY.register(Histogram(
+    "sql_query_duration_seconds", "SQL statement execution time by operation.", ("operation",),
+))
+UPSTREAM_CALLS = REGISTRY.register(Counter(
+    "upstream_calls_total", "Calls to external services by outcome.", ("service", "call", "outcome"),
+))
+UPSTREAM_CACHE = REGISTRY.register(Counter(
+    "upstream_cache_total", "Upstream lookups answered without a call of their own, by how.",
+    ("service", "call", "result"),
+))
+RESPONSE_CACHE = REGISTRY.register(Counter(
+    "response_cache_total", "Response cache lookups by route template and result.", ("route", "result"),
+))
+
+
+# -------------------------------
+# Spans
+# -------------------------------
+# Set inside process-pool tasks: a child's REGISTRY is never scraped, so its
+# spans are collected here and observed by the parent (see collect_spans).
+_span_sink: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("span_sink", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Record how long the enclosed block takes under `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        sink = _span_sink.get()
+        if sink is not None:
+            sink.append((stage, elapsed))
+        else:
+            STAGE_LATENCY.observe(elapsed, stage=stage)
+
+
+def collect_spans(fn: Callable, *args, **kwargs) -> Tuple[Any, List[Tuple[str, float]]]:
+    """Call `fn`, returning its result and the spans it ran instead of observing them."""
+    sink: List[Tuple[str, float]] = []
+    token = _span_sink.set(sink)
+    try:
+        return fn(*args, **kwargs), sink
+    finally:
+        _span_sink.reset(token)
+
+
+def observe_spans(spans: List[Tuple[str, float]]) -> None:
+    for stage, elapsed in spans:
+        STAGE_LATENCY.observe(elapsed, stage=stage)
+
+
+# -------------------------------
+# SQL
+# -------------------------------
+# A mutable cell per request; set by the middleware, bumped by the SQL hooks.
+# Sync endpoints run in a worker thread with a copy of the context, and since
+# the cell itself is shared their queries still land on the right request.
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # on the statement's execution context rather than the connection, so a
+    # statement that raises can't leave a start time behind
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _observe_statement(context, statement: str) -> None:
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    del context._metrics_start
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    SQL_LATENCY.observe(time.perf_counter() - start, operation=operation)
+    cell = _request_queries.get()
+    if cell is not None:
+        cell[0] += 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _observe_statement(context, statement)
+
+
+def _handle_error(exception_context) -> None:
+    # failed statements took time too (lock timeouts, constraint violations)
+    if exception_context.execution_context is not None and exception_context.statement:
+        _observe_statement(exception_context.execution_context, exception_context.statement)
+
+
+def instrument_sqlalchemy() -> None:
+    """Time every statement on every engine, including ones created later."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+# -------------------------------
+# HTTP
+# -------------------------------
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and SQL statement counts."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        cell = [0]
+        token = _request_queries.set(cell)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            # label by route template, not raw path, to keep cardinality bounded
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(elapsed, method=scope["method"], route=template, status=status["code"])
+            REQUEST_QUERIES.observe(cell[0], method=scope["method"], route=template)
@@ -0,0 +1,205 @@
+"""
+Response cache for read-heavy GET endpoints.
+
+A cached response is keyed on the route, its query parameters and the
+current version of every tag the response depends on ("uploads",
+"track:12", ...). Writes don't hunt down keys: they bump the versions of
+the tags they touch, so every key built from the old versions simply
+stops being asked for and ages out. That makes invalidation O(tags) and
+correct across processes when the backend is shared.
+
+Backends: in-process memory (default) or Redis, chosen by
+RESPONSE_CACHE_URL ("memory://", "redis://localhost:6379/0", "none").
+Memory only sees invalidations from its own process, so run several
+workers against Redis. A failing Redis degrades to no caching, never to
+errors.
+"""
+import hashlib
+import logging
+import os
+import threading
+from typing import Iterable, List, Optional
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from music_app.utils.http import etag_matches
+from music_app.utils.serialize import dumps
+from music_app.utils.metrics import RESPONSE_CACHE
+from music_app.utils.upstream import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "memory://")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+KEY_PREFIX = "music_app:resp:"
+TAG_PREFIX = "music_app:tag:"
+
+# Tags. The coarse ones cover writes that touch many rows at once (bulk
+# imports, analysis changing the candidate set for every similarity query).
+TRACKS = "tracks"
+LIKES = "likes"
+UPLOADS = "uploads"
+
+
+def track_tag(track_id: int) -> str:
+    return f"track:{track_id}"
+
+
+def user_likes_tag(user_id: int) -> str:
+    return f"likes:user:{user_id}"
+
+
+# -------------------------------
+# Backends
+# -------------------------------
+class MemoryBackend:
+    blocking = False
+
+    def __init__(self, ttl: float, maxsize: int = 4096):
+        self.entries = TTLCache(maxsize, ttl)
+        self.tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.entries.get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.entries.set(key, value)
+
+    def versions(self, tags: List[str]) -> List[int]:
+        with self._lock:
+            return [self.tags.get(t, 0) for t in tags]
+
+    def bump(self, tags: List[str]) -> None:
+        with self._lock:
+            for t in tags:
+                self.tags[t] = self.tags.get(t, 0) + 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+        with self._lock:
+            self.tags.clear()
+
+
+class RedisBackend:
+    blocking = True  # a network round trip: keep it off the event loop
+
+    def __init__(self, url: str, ttl: float):
+        import redis  # optional dependency, only needed for this backend
+        self.redis = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self.ttl = max(1, int(ttl))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.redis.get(KEY_PREFIX + key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.redis.set(KEY_PREFIX + key, value, ex=self.ttl)
+
+    def versions(self, tags: List[str]) -> List[int]:
+        return [int(v or 0) for v in self.redis.mget([TAG_PREFIX + t for t in tags])]
+
+    def bump(self, tags: List[str]) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        for t in tags:
+            pipe.incr(TAG_PREFIX + t)
+        pipe.execute()
+
+    def clear(self) -> None:
+        for prefix in (KEY_PREFIX, TAG_PREFIX):
+            keys = list(self.redis.scan_iter(prefix + "*"))
+            if keys:
+                self.redis.delete(*keys)
+
+
+def make_backend(url: str, ttl: float):
+    if url in ("", "none"):
+        return None
+    if url.startswith("memory://"):
+        return MemoryBackend(ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url, ttl)
+    raise ValueError(f"Unsupported RESPONSE_CACHE_URL: {url}")
+
+
+# -------------------------------
+# Cache
+# -------------------------------
+class CachedRequest:
+    """One GET request's view of the cache: a hit to return, or a key to fill."""
+
+    def __init__(self, cache: "ResponseCache", request: Request, key: Optional[str], stored: Optional[bytes]):
+        self.cache = cache
+        self.request = request
+        self.key = key
+        self.hit = None
+        if stored is not None:
+            etag, body = stored.split(b"\n", 1)
+            self.hit = self._response(etag.decode(), body, "hit")
+
+    def _response(self, etag: str, body: bytes, outcome: str) -> Response:
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Cache": outcome}
+        if etag_matches(self.request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def respond(self, payload, store: bool = True) -> Response:
+        """Serialise `payload`, keep it unless `store` is False (e.g. a degraded answer)."""
+        body = dumps(payload)
+        etag = f'"{hashlib.md5(body, usedforsecurity=False).hexdigest()}"'
+        if store and self.key is not None:
+            await self.cache._call("set", self.key, etag.encode() + b"\n" + body)
+        return self._response(etag, body, "miss")
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def _call(self, method: str, *args):
+        fn = getattr(self.backend, method)
+        try:
+            if self.backend.blocking:
+                return await run_in_threadpool(fn, *args)
+            return fn(*args)
+        except Exception as e:
+            logger.warning("Response cache %s failed: %s", method, e)
+            return None
+
+    async def begin(self, request: Request, tags: Iterable[str]) -> CachedRequest:
+        """Look the request up; `.hit` is the response to return when cached."""
+        if self.backend is None:
+            return CachedRequest(self, request, None, None)
+        tags = sorted(tags)
+        versions = await self._call("versions", tags)
+        if versions is None:
+            return CachedRequest(self, request, None, None)
+        raw = "|".join([
+            request.url.path,
+            "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items())),
+            ",".join(f"{t}={v}" for t, v in zip(tags, versions)),
+        ])
+        key = hashlib.sha1(raw.encode()).hexdigest()
+        stored = await self._call("get", key)
+        route = getattr(request.scope.get("route"), "path", request.url.path)
+        RESPONSE_CACHE.inc(route=route, result="hit" if stored is not None else "miss")
+        return CachedRequest(self, request, key, stored)
+
+    async def invalidate(self, *tags: str) -> None:
+        """Call after the write has committed, so a reader can't re-cache the old data."""
+        if self.backend is not None and tags:
+            await self._call("bump", list(tags))
+
+    def invalidate_sync(self, *tags: str) -> None:
+        """invalidate() for scripts and CLIs outside the event loop."""
+        if self.backend is not None and tags:
+            try:
+                self.backend.bump(list(tags))
+            except Exception as e:
+                logger.warning("Response cache bump failed: %s", e)
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+
+response_cache = ResponseCache(make_backend(RESPONSE_CACHE_URL, RESPONSE_CACHE_TTL))
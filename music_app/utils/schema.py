@@ -0,0 +1,37 @@
+"""
+Bring the indexes of an existing database up to date with the models.
+
+create_all() only creates missing tables, so an index declared on a table
+that already exists would never be built. ensure_indexes() adds those; it
+is idempotent and cheap when there is nothing to do. Application databases
+get their indexes from the migrations (music_app/migrations); this is for
+throwaway databases built with create_all(), like benchmark datasets.
+"""
+from sqlalchemy import inspect, text
+from music_app.db import Base
+
+LIKES_UNIQUE_INDEX = "ux_user_likes_user_track"
+
+
+def dedupe_likes(connection) -> None:
+    """Drop duplicate likes (keeping the oldest) so the unique index can be built."""
+    connection.execute(text(
+        "DELETE FROM user_likes WHERE id NOT IN "
+        "(SELECT MIN(id) FROM user_likes GROUP BY user_id, track_id)"
+    ))
+
+
+def ensure_indexes(connection) -> None:
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        present = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if index.name in present or not {c.name for c in index.columns} <= columns:
+                continue  # already there, or its columns are still to be added
+            if index.name == LIKES_UNIQUE_INDEX:
+                dedupe_likes(connection)
+            index.create(connection)
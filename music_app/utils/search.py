@@ -0,0 +1,488 @@
+"""
+Local full-text search over the catalog (tracks) and uploads.
+
+The index lives in the database next to the rows it covers:
+
+- SQLite: an external-content FTS5 table per source, kept in sync by
+  triggers and ranked with bm25 (title weighted over artist over album).
+- Postgres: a generated tsvector column with a GIN index for ranked word
+  matches, plus a pg_trgm index on the same text for typo-tolerant lookups
+  when the word match finds nothing.
+
+Both are created by DDL events on the tables, so create_all (and the test
+fixtures) build them; ensure_search_index() adds them to databases created
+before the index existed. Autocomplete is served from an in-process
+PrefixIndex that committed writes patch in place (see Autocomplete).
+"""
+import asyncio
+import bisect
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import DDL, event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from music_app.models import Track, Upload
+from music_app.utils.metrics import span
+
+# source name -> (table, (title, artist, album) columns)
+SOURCES: Dict[str, Tuple[str, Tuple[str, str, str]]] = {
+    "track": ("tracks", ("title", "artist", "album")),
+    "upload": ("uploads", ("track_name", "artist_name", "album_name")),
+}
+BM25_WEIGHTS = (10.0, 5.0, 1.0)  # title, artist, album
+MAX_TOKENS = 8
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+# -------------------------------
+# Query text
+# -------------------------------
+def normalize(value: str) -> str:
+    """Casefold and strip accents, so "Beyoncé" and "beyonce" index alike."""
+    decomposed = unicodedata.normalize("NFKD", value or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokens(query: str) -> List[str]:
+    return _TOKEN.findall(normalize(query))[:MAX_TOKENS]
+
+
+def fts5_query(query: str) -> Optional[str]:
+    """Every token must match, the last one as a prefix (search-as-you-type)."""
+    words = tokens(query)
+    if not words:
+        return None
+    quoted = [f'"{w}"' for w in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def tsquery(query: str) -> Optional[str]:
+    words = tokens(query)
+    if not words:
+        return None
+    return " & ".join(words[:-1] + [words[-1] + ":*"])
+
+
+# -------------------------------
+# Index DDL
+# -------------------------------
+def _sqlite_ddl(table: str, columns: Tuple[str, str, str]) -> List[str]:
+    fts = f"{table}_fts"
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def _postgres_ddl(table: str, columns: Tuple[str, str, str]) -> List[str]:
+    doc = " || ' ' || ".join(f"coalesce({c}, '')" for c in columns)
+    weighted = " || ".join(
+        f"setweight(to_tsvector('simple', coalesce({c}, '')), '{w}')" for c, w in zip(columns, "ABC")
+    )
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({weighted}) STORED",
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_text text "
+        f"GENERATED ALWAYS AS (lower({doc})) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_trgm ON {table} USING gin (search_text gin_trgm_ops)",
+    ]
+
+
+def index_ddl(dialect: str, source: str) -> List[str]:
+    table, columns = SOURCES[source]
+    if dialect == "sqlite":
+        return _sqlite_ddl(table, columns)
+    if dialect == "postgresql":
+        return _postgres_ddl(table, columns)
+    return []
+
+
+def _register(model, source: str) -> None:
+    table, _ = SOURCES[source]
+    for dialect in ("sqlite", "postgresql"):
+        for statement in index_ddl(dialect, source):
+            event.listen(model.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
+    # An external-content FTS table outlives its source; drop it too, or a
+    # recreated table would inherit stale index entries.
+    event.listen(model.__table__, "before_drop", DDL(f"DROP TABLE IF EXISTS {table}_fts").execute_if(dialect="sqlite"))
+
+
+_register(Track, "track")
+_register(Upload, "upload")
+
+
+def ensure_search_index(connection) -> None:
+    """Add the index to a database whose tables predate it (idempotent)."""
+    dialect = connection.dialect.name
+    existing = set(inspect(connection).get_table_names())
+    for source, (table, _) in SOURCES.items():
+        if table not in existing:
+            continue
+        missing = dialect == "sqlite" and f"{table}_fts" not in existing
+        for statement in index_ddl(dialect, source):
+            connection.execute(text(statement))
+        if missing:
+            connection.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+
+
+# -------------------------------
+# Ranked search
+# -------------------------------
+def _sqlite_sql(table: str, columns: Tuple[str, str, str]) -> str:
+    title, artist, album = columns
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    # Rank and limit inside the index first; only the winners touch the table.
+    return (
+        f"SELECT s.id, s.{title}, s.{artist}, s.{album}, f.score FROM ("
+        f"SELECT rowid, -bm25({table}_fts, {weights}) AS score FROM {table}_fts "
+        f"WHERE {table}_fts MATCH :q ORDER BY score DESC LIMIT :limit"
+        f") f JOIN {table} s ON s.id = f.rowid ORDER BY f.score DESC"
+    )
+
+
+def _postgres_sql(table: str, columns: Tuple[str, str, str]) -> str:
+    title, artist, album = columns
+    return (
+        f"SELECT id, {title}, {artist}, {album}, ts_rank(search_vector, query) AS score "
+        f"FROM {table}, to_tsquery('simple', :q) query "
+        f"WHERE search_vector @@ query ORDER BY score DESC LIMIT :limit"
+    )
+
+
+def _trigram_sql(table: str, columns: Tuple[str, str, str]) -> str:
+    title, artist, album = columns
+    return (
+        f"SELECT id, {title}, {artist}, {album}, similarity(search_text, :raw) AS score "
+        f"FROM {table} WHERE search_text % :raw ORDER BY score DESC LIMIT :limit"
+    )
+
+
+def _like_sql(table: str, columns: Tuple[str, str, str]) -> str:
+    title, artist, album = columns
+    match = " OR ".join(f"lower({c}) LIKE :like" for c in columns)
+    return f"SELECT id, {title}, {artist}, {album}, 1.0 AS score FROM {table} WHERE {match} LIMIT :limit"
+
+
+@dataclass
+class Hit:
+    source: str
+    id: int
+    title: Optional[str]
+    artist: Optional[str]
+    album: Optional[str]
+    score: float
+
+
+async def _source_hits(db, dialect: str, source: str, query: str, limit: int) -> List[Hit]:
+    table, columns = SOURCES[source]
+    if dialect == "sqlite":
+        q = fts5_query(query)
+        attempts = [(_sqlite_sql(table, columns), {"q": q})] if q else []
+    elif dialect == "postgresql":
+        q = tsquery(query)
+        attempts = [(_postgres_sql(table, columns), {"q": q})] if q else []
+        attempts.append((_trigram_sql(table, columns), {"raw": normalize(query)}))
+    else:
+        attempts = [(_like_sql(table, columns), {"like": f"%{normalize(query)}%"})]
+
+    for sql, params in attempts:
+        rows = (await db.execute(text(sql), {**params, "limit": limit})).all()
+        if rows:
+            return [Hit(source, *row[:4], float(row[4])) for row in rows]
+    return []
+
+
+async def search(db, query: str, limit: int = 20, sources: Iterable[str] = tuple(SOURCES)) -> List[Hit]:
+    """Best `limit` matches across `sources`, highest score first."""
+    dialect = db.get_bind().dialect.name
+    hits: List[Hit] = []
+    with span("search.local"):
+        for source in sources:
+            hits += await _source_hits(db, dialect, source, query, limit)
+    hits.sort(key=lambda h: h.score, reverse=True)
+    return hits[:limit]
+
+
+# -------------------------------
+# Autocomplete
+# -------------------------------
+class PrefixIndex:
+    """
+    Prefix lookup over titles and artist names, for autocomplete.
+
+    This is a trie flattened into a sorted array of keys: a prefix maps to
+    one contiguous run found with two binary searches, which costs a
+    fraction of the memory of a node-per-character trie. Every word start
+    in a phrase is a key, so "love" completes "Crazy in Love" as well.
+    """
+
+    def __init__(self, phrases: Iterable[Tuple[str, str, float]] = ()):
+        # (text, kind, weight) -> deduplicated on (normalized text, kind)
+        merged: Dict[Tuple[str, str], list] = {}
+        for value, kind, weight in phrases:
+            if not value:
+                continue
+            entry = merged.setdefault((normalize(value), kind), [value, kind, 0.0])
+            entry[2] += weight
+
+        self.suggestions: List[Tuple[str, str]] = []
+        self._slots: Dict[Tuple[str, str], int] = {}
+        weights, keys = [], []
+        for (norm, kind), (value, _, weight) in merged.items():
+            idx = len(self.suggestions)
+            self._slots[(norm, kind)] = idx
+            self.suggestions.append((value, kind))
+            weights.append(weight)
+            words = _TOKEN.findall(norm)
+            keys += [(" ".join(words[i:]), idx) for i in range(len(words))]
+        keys.sort()
+        self.keys = [k for k, _ in keys]
+        self.owners = np.array([i for _, i in keys], dtype=np.int64)
+        self.weights = np.array(weights, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.suggestions)
+
+    def add(self, value: Optional[str], kind: str, weight: float) -> None:
+        self.add_many([(value, kind, weight)])
+
+    def add_many(self, phrases: Iterable[Tuple[str, str, float]]) -> None:
+        """
+        Patch phrases in place; a negative weight takes one back out. The
+        keys of new phrases are merged into the sorted arrays in one pass
+        for the whole batch, so a commit copies the index once, not once
+        per word. Phrases whose weight drops to zero stay as dead entries
+        until the next rebuild.
+        """
+        deltas: Dict[int, float] = {}
+        added: List[Tuple[str, int]] = []
+        for value, kind, weight in phrases:
+            if not value:
+                continue
+            norm = normalize(value)
+            idx = self._slots.get((norm, kind))
+            if idx is None:
+                if weight <= 0:
+                    continue
+                idx = self._slots[(norm, kind)] = len(self.suggestions)
+                self.suggestions.append((value, kind))
+                words = _TOKEN.findall(norm)
+                added += [(" ".join(words[i:]), idx) for i in range(len(words))]
+            deltas[idx] = deltas.get(idx, 0.0) + weight
+
+        grow = len(self.suggestions) - len(self.weights)
+        if grow:
+            self.weights = np.concatenate([self.weights, np.zeros(grow)])
+        if deltas:
+            self.weights[np.fromiter(deltas, dtype=np.int64)] += np.fromiter(deltas.values(), dtype=np.float64)
+        if added:
+            added.sort()
+            # equal keys go after the existing ones, in (key, idx) order
+            positions = [bisect.bisect_right(self.keys, key) for key, _ in added]
+            keys, start = [], 0
+            for pos, (key, _) in zip(positions, added):
+                keys += self.keys[start:pos]
+                keys.append(key)
+                start = pos
+            keys += self.keys[start:]
+            self.keys = keys
+            self.owners = np.insert(self.owners, positions, [idx for _, idx in added])
+
+    def complete(self, prefix: str, limit: int = 10) -> List[dict]:
+        """Heaviest suggestions with a word starting with `prefix`."""
+        key = " ".join(tokens(prefix))
+        if not key:
+            return []
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_left(self.keys, key + "\uffff", lo)
+        owners = np.unique(self.owners[lo:hi])
+        owners = owners[self.weights[owners] > 1e-9]  # removed by add()
+        if len(owners) > limit:
+            owners = owners[np.argpartition(-self.weights[owners], limit - 1)[:limit]]
+        order = np.lexsort((owners, -self.weights[owners]))
+        return [
+            {"text": self.suggestions[i][0], "kind": self.suggestions[i][1]}
+            for i in owners[order]
+        ]
+
+
+AUTOCOMPLETE_TTL = 300.0  # rebuild at least this often, for writes from other processes
+PATCH_LIMIT = 5000  # phrases; a commit writing more than this is left to a rebuild
+# the columns the index is built from; writes that leave them alone don't touch it
+INDEXED_COLUMNS = {
+    "tracks": {"title", "artist"},
+    "uploads": {"track_name", "artist_name", "popularity"},
+}
+
+
+def _phrases(table: str, title, artist, popularity=None) -> List[Tuple[str, str, float]]:
+    weight = 1.0 if table == "tracks" else 1.0 + (popularity or 0) / 100
+    return [(title, "title", weight), (artist, "artist", weight)]
+
+
+class Autocomplete:
+    """
+    The process-wide PrefixIndex. Committed ORM writes patch it in place;
+    it is rebuilt from the database only on first use, after bulk
+    statements that change indexed columns, and every AUTOCOMPLETE_TTL
+    seconds to pick up writes made by other processes.
+    """
+
+    def __init__(self):
+        self.index: Optional[PrefixIndex] = None
+        self.built_at = 0.0
+        self.dirty = True
+        self._patches = 0  # bumped by patch(), so a build that raced a write is redone
+
+    def invalidate(self) -> None:
+        self.dirty = True
+
+    def patch(self, phrases: List[Tuple[str, str, float]]) -> None:
+        self._patches += 1
+        if self.index is None:
+            return
+        if len(phrases) > PATCH_LIMIT:
+            self.invalidate()
+        else:
+            self.index.add_many(phrases)
+
+    def stale(self) -> bool:
+        return self.index is None or self.dirty or time.monotonic() - self.built_at > AUTOCOMPLETE_TTL
+
+    async def get(self, db) -> PrefixIndex:
+        if self.stale():
+            self.dirty = False
+            patches = self._patches
+            with span("search.autocomplete_build"):
+                phrases = await _load_phrases(db)
+                self.index = await asyncio.to_thread(PrefixIndex, phrases)
+            self.built_at = time.monotonic()
+            if self._patches != patches:
+                self.dirty = True  # a commit landed mid-build and may be missing from it
+        return self.index
+
+
+async def _load_phrases(db) -> List[Tuple[str, str, float]]:
+    phrases = []
+    for title, artist in (await db.execute(select(Track.title, Track.artist))).all():
+        phrases += _phrases("tracks", title, artist)
+    rows = await db.execute(select(Upload.track_name, Upload.artist_name, Upload.popularity))
+    for title, artist, popularity in rows.all():
+        phrases += _phrases("uploads", title, artist, popularity)
+    return phrases
+
+
+autocomplete = Autocomplete()
+
+
+# -------------------------------
+# Keeping the index current
+# -------------------------------
+_OLD, _NEW = 0, 1
+_PENDING = "autocomplete_patches"
+
+
+def _values(obj, columns: List[str], which: int) -> Optional[list]:
+    """
+    Column values before (_OLD) or after (_NEW) the flush, from what the
+    session already holds (no lazy loads); None when one isn't loaded.
+    """
+    state = inspect(obj)
+    values = []
+    for key in columns:
+        history = state.attrs[key].history
+        if which == _OLD and history.has_changes():
+            if not history.deleted:
+                return None
+            values.append(history.deleted[0])
+        elif key in state.dict:
+            values.append(state.dict[key])
+        else:
+            return None
+    return values
+
+
+def _object_phrases(obj, which: int) -> Optional[List[Tuple[str, str, float]]]:
+    if isinstance(obj, Track):
+        values = _values(obj, ["title", "artist"], which)
+        return None if values is None else _phrases("tracks", *values)
+    values = _values(obj, ["track_name", "artist_name", "popularity"], which)
+    return None if values is None else _phrases("uploads", *values)
+
+
+def _collect_patches(session, flush_context) -> None:
+    """Queue index patches for the flushed rows; they apply once the transaction commits."""
+    patches = session.info.setdefault(_PENDING, [])
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, (Track, Upload)):
+            continue
+        new_row, deleted = obj in session.new, obj in session.deleted
+        if not new_row and not deleted:
+            attrs = inspect(obj).attrs
+            if not any(attrs[c].history.has_changes() for c in INDEXED_COLUMNS[obj.__table__.name]):
+                continue  # e.g. a like_count bump or new features
+        old = [] if new_row else _object_phrases(obj, _OLD)
+        new = [] if deleted else _object_phrases(obj, _NEW)
+        if old is None or new is None:
+            autocomplete.invalidate()  # text we'd need isn't loaded; rebuild instead
+            continue
+        patches += [(v, k, -w) for v, k, w in old] + new
+
+
+def _apply_patches(session) -> None:
+    patches = session.info.pop(_PENDING, None)
+    if patches:
+        autocomplete.patch(patches)
+
+
+def _drop_patches(session, previous_transaction) -> None:
+    if session.info.pop(_PENDING, None):
+        # a savepoint rollback may have discarded only some of them
+        autocomplete.invalidate()
+
+
+def _set_columns(state) -> set:
+    """Columns an UPDATE statement assigns, from .values() or from ORM bulk-by-primary-key params."""
+    names = {getattr(key, "key", key) for key in (getattr(state.statement, "_values", None) or {})}
+    if not names and state.parameters:
+        rows = state.parameters if isinstance(state.parameters, list) else [state.parameters]
+        names = {key for row in rows for key in row}
+    return names
+
+
+def _statement_touches_index(state) -> None:
+    """Bulk statements don't say which rows changed, so the index is rebuilt instead."""
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    table = getattr(getattr(state.statement, "table", None), "name", None)
+    if table not in INDEXED_COLUMNS:
+        return
+    if state.is_update and not _set_columns(state) & INDEXED_COLUMNS[table]:
+        return
+    autocomplete.invalidate()
+
+
+event.listen(Session, "after_flush", _collect_patches)
+event.listen(Session, "after_commit", _apply_patches)
+event.listen(Session, "after_soft_rollback", _drop_patches)
+event.listen(Session, "do_orm_execute", _statement_touches_index)
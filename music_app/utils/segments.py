@@ -0,0 +1,92 @@
+"""
+Per-segment embeddings: one small vector for every SEGMENT_SECONDS of audio.
+
+A segment vector is the mean over its frames of
+[spectral centroid, spectral contrast, zero-crossing rate, RMS, 13 MFCCs].
+They're stored as a float16 blob of shape (n_segments, SEGMENT_DIM) so a
+five-minute track costs about a kilobyte.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+from music_app.utils.similarity import top_k_indices
+
+SEGMENT_SECONDS = 10.0
+SEGMENT_DIM = 17
+MODES = ("best_segment", "avg_segment")
+
+
+def segment_means(frames: np.ndarray, sr: int, hop_length: int = 512) -> np.ndarray:
+    """Average (dim, n_frames) frame features over fixed windows -> (n_segments, dim)."""
+    per_segment = max(1, int(round(SEGMENT_SECONDS * sr / hop_length)))
+    n_frames = frames.shape[1]
+    starts = np.arange(0, n_frames, per_segment)
+    sums = np.add.reduceat(frames, starts, axis=1)
+    counts = np.diff(np.append(starts, n_frames))
+    return (sums / counts).T.astype(np.float32)
+
+
+def pack(segments: np.ndarray) -> bytes:
+    return np.ascontiguousarray(segments, dtype=np.float16).tobytes()
+
+
+def unpack(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.float16).reshape(-1, SEGMENT_DIM).astype(np.float32)
+
+
+def _standardize(m: np.ndarray) -> np.ndarray:
+    """
+    Z-score each dimension over the segments being compared. The raw
+    dimensions are on unrelated scales (the centroid is in Hz, ZCR a
+    fraction), so an unscaled cosine would mostly compare brightness. A
+    dimension that doesn't vary across them says nothing and drops out.
+    """
+    mean = m.mean(axis=0)
+    std = m.std(axis=0)
+    out = np.zeros_like(m)
+    np.divide(m - mean, std, out=out, where=std > 1e-6 * np.maximum(1.0, np.abs(mean)))
+    return out
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    out = np.zeros_like(m)
+    np.divide(m, norms, out=out, where=norms > 0)
+    return out
+
+
+def segment_scores(target: np.ndarray, candidates: Sequence[np.ndarray], mode: str) -> np.ndarray:
+    """
+    Score each candidate's segments against the target's in one matrix
+    product: cosine similarity of segment vectors standardized over the
+    target and all candidates together.
+
+    best_segment: the single best-matching pair of segments, so a shared
+        chorus or drop is enough for a match.
+    avg_segment: every target segment finds its closest candidate segment,
+        and those similarities are averaged, rewarding tracks that match
+        section for section.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown segment mode: {mode}")
+    keep = [c for c in candidates if len(c)]
+    scores = np.zeros(len(candidates), dtype=float)
+    if not keep or not len(target):
+        return scores
+
+    lengths = np.array([len(c) for c in keep])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    pooled = _normalize(_standardize(np.concatenate([target, *keep])))
+    sims = pooled[:len(target)] @ pooled[len(target):].T  # (target segs, all candidate segs)
+    best_per_target = np.maximum.reduceat(sims, starts, axis=1)      # (target segs, candidates)
+    reduced = best_per_target.max(axis=0) if mode == "best_segment" else best_per_target.mean(axis=0)
+
+    scores[[i for i, c in enumerate(candidates) if len(c)]] = reduced
+    return scores
+
+
+def rank_segments(target_blob: bytes, rows: List[tuple], k: int, mode: str) -> List[tuple]:
+    """(upload_id, segments blob) rows -> top-k (upload_id, score), best first."""
+    scores = segment_scores(unpack(target_blob), [unpack(blob) for _, blob in rows], mode)
+    return [(rows[i][0], float(scores[i])) for i in top_k_indices(scores, k)]
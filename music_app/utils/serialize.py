@@ -0,0 +1,34 @@
+"""
+JSON straight to bytes with orjson.
+
+FastAPI's default path runs every response through jsonable_encoder (and
+response-model validation) before the JSON encoder ever sees it; on
+large lists that walk costs more than the query. Endpoints returning many
+rows build plain dicts/tuples from SQL rows and hand back json_response()
+directly, which FastAPI passes through untouched.
+"""
+from typing import Any, Mapping, Optional
+
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any):
+    # ORM objects, pydantic models, Decimals...: the slow path, only for what orjson can't do natively
+    return jsonable_encoder(obj)
+
+
+def dumps(payload: Any) -> bytes:
+    return orjson.dumps(payload, default=_default, option=OPTIONS)
+
+
+def json_response(payload: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None) -> Response:
+    return Response(dumps(payload), status_code=status_code, media_type="application/json", headers=headers)
+
+
+def rows_response(result) -> Response:
+    """A SQLAlchemy result as a JSON array of objects keyed by column label."""
+    return json_response([row._asdict() for row in result])
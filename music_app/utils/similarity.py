@@ -1,6 +1,15 @@
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 
+# Bump whenever analyze_file output or the vector layout below changes;
+# uploads analysed under an older version are picked up by music_app.reanalyze.
+#   1: native sample rate, no recorded version (legacy rows have NULL)
+#   2: analysis at the canonical 22.05 kHz mono rate, single shared vectorizer
+#   3: per-segment embeddings stored in Upload.segments
+#   4: spectral-peak fingerprints indexed in the fingerprints table
+#   5: full beat grid in Upload.beat_grid; Krumhansl key with mode
+FEATURE_VERSION = 5
+
 FEATURE_KEYS = [
     "tempo_bpm", "spectral_centroid", "spectral_contrast", "zero_crossing_rate",
     "rms_energy", "energy", "danceability", "valence", "acousticness",
@@ -10,7 +19,11 @@ MFCC_DIM = 13
 
 
 def features_to_vector(feat: Dict) -> Optional[np.ndarray]:
-    """Convert feature dict into a numeric vector suitable for similarity."""
+    """
+    Convert feature dict into a numeric vector suitable for similarity.
+    This is the only vectorizer; everything that scores or stores vectors goes through it.
+    Duration is deliberately left out: track length says nothing about how it sounds.
+    """
     if not feat or not isinstance(feat, dict):
         return None
 
@@ -39,6 +52,27 @@ def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
     return float(np.dot(a, b) / (na * nb))
 
 
+def cosine_scores(target: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Cosine similarity of `target` against every row of `matrix`; zero rows score 0."""
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(target)
+    dots = matrix @ target
+    scores = np.zeros(len(matrix), dtype=float)
+    np.divide(dots, norms, out=scores, where=norms > 0)
+    return scores
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first; ties keep candidate order."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=int)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.lexsort((top, -scores[top]))]
+
+
 def top_k_similar(
     target_features: Dict,
     candidates: List[Tuple[int, Dict]],
@@ -46,21 +80,33 @@ def top_k_similar(
 ) -> List[Tuple[int, float]]:
     """
     Compute top-k most similar uploads.
-    
+
+    Candidates are stacked into one matrix and scored in a single NumPy
+    pass, but vectorizing each dict is a Python loop that holds the GIL;
+    with many candidates, score against the feature store instead.
+
     Args:
         target_features: feature dict of the target upload.
         candidates: list of (upload_id, feature_dict).
         k: number of results to return.
-    
+
     Returns:
         List of (upload_id, similarity_score) sorted descending.
     """
     target_vec = features_to_vector(target_features)
-    results = []
-    for upload_id, feat in candidates:
+    if not candidates or k <= 0:
+        return []
+
+    ids = [upload_id for upload_id, _ in candidates]
+    if target_vec is None:
+        return [(upload_id, 0.0) for upload_id in ids[:k]]
+
+    dim = len(target_vec)
+    matrix = np.zeros((len(candidates), dim), dtype=float)
+    for i, (_, feat) in enumerate(candidates):
         vec = features_to_vector(feat)
-        score = cosine_similarity(target_vec, vec)
-        results.append((upload_id, score))
+        if vec is not None:
+            matrix[i] = vec
 
-    results.sort(key=lambda x: x[1], reverse=True)
-    return results[:k]
+    scores = cosine_scores(target_vec, matrix)
+    return [(ids[i], float(scores[i])) for i in top_k_indices(scores, k)]
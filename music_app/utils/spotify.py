@@ -1,22 +1,202 @@
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
+import logging
 import os
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import re
+import threading
+from typing import TYPE_CHECKING
+from music_app.utils.metrics import UPSTREAM_CACHE, UPSTREAM_CALLS, span
+from music_app.utils.upstream import (
+    CircuitBreaker, CircuitOpen, RateLimited, SingleFlight, TTLCache, TokenBucket, hedged,
+)
 
+if TYPE_CHECKING:
+    from spotipy.exceptions import SpotifyException
 
-def get_spotify_client():
+# spotipy is imported on first use: it drags in redis and requests, which
+# would otherwise be paid for by every process that imports the app.
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.spotify.com/v1/"
+TOKEN_URL = "https://accounts.spotify.com/api/token"  # SpotifyClientCredentials.OAUTH_TOKEN_URL
+
+# Every call has a deadline: the HTTP timeout bounds one attempt, and track
+# lookups are hedged (a second copy after HEDGE_AFTER) under CALL_TIMEOUT.
+CALL_TIMEOUT = float(os.getenv("SPOTIFY_TIMEOUT", "2"))
+HEDGE_AFTER = float(os.getenv("SPOTIFY_HEDGE_AFTER", "0.3"))
+
+# Search-as-you-type traffic: identical and prefix-extending queries arrive in
+# bursts, so answers are cached briefly, shared between concurrent callers
+# and upstream calls are metered by a token bucket.
+SEARCH_CACHE_TTL = float(os.getenv("SPOTIFY_SEARCH_TTL", "30"))
+SEARCH_CACHE_SIZE = 2048
+SEARCH_MAX_WAIT = 0.25   # seconds a search may queue for a token before answering 429
+MIN_PREFIX = 2
+
+limiter = TokenBucket("spotify", rate=float(os.getenv("SPOTIFY_RATE", "5")), burst=int(os.getenv("SPOTIFY_BURST", "10")))
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+_search_flight = SingleFlight()
+_WORD = re.compile(r"\w+")
+
+# Track metadata barely changes: serve it for a day, and for a week past
+# that as stale while a background refresh runs.
+track_cache = TTLCache(
+    maxsize=8192,
+    ttl=float(os.getenv("SPOTIFY_TRACK_TTL", "86400")),
+    stale_ttl=float(os.getenv("SPOTIFY_TRACK_STALE_TTL", "604800")),
+)
+_track_flight = SingleFlight()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="spotify")
+# Stale-entry refreshes get their own few threads: a burst of them must not
+# take the workers that foreground lookups (and their hedges) run on.
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPOTIFY_REFRESH_WORKERS", "2")), thread_name_prefix="spotify-refresh"
+)
+
+
+def _is_upstream_failure(e: BaseException) -> bool:
+    """Client errors (404 for an unknown id, 400) say nothing about Spotify's health."""
+    from spotipy.exceptions import SpotifyException
+    if isinstance(e, SpotifyException):
+        return e.http_status >= 500 or e.http_status == 429
+    return not isinstance(e, (CircuitOpen, RateLimited))
+
+
+breaker = CircuitBreaker(
+    "spotify",
+    failure_rate=0.5,
+    min_calls=int(os.getenv("SPOTIFY_BREAKER_MIN_CALLS", "10")),
+    window=30.0,
+    cooldown=float(os.getenv("SPOTIFY_BREAKER_COOLDOWN", "15")),
+    is_failure=_is_upstream_failure,
+)
+
+
+@lru_cache(maxsize=4)
+def _client(api_url: str, token_url: str, client_id, client_secret, timeout: float):
+    import spotipy
+    from spotipy.cache_handler import MemoryCacheHandler
+    from spotipy.oauth2 import SpotifyClientCredentials
+    # keep the token in memory; the default handler writes ./.cache wherever the app runs
     auth_manager = SpotifyClientCredentials(
-        client_id=os.getenv("SPOTIPY_CLIENT_ID"),
-        client_secret=os.getenv("SPOTIPY_CLIENT_SECRET"),
+        client_id=client_id, client_secret=client_secret, cache_handler=MemoryCacheHandler()
+    )
+    auth_manager.OAUTH_TOKEN_URL = token_url
+    # 429 is left out of the retry list so it reaches us with its Retry-After
+    # instead of blocking a worker thread inside urllib3's backoff; one quick
+    # retry at most, since hedging and the breaker handle the rest.
+    sp = spotipy.Spotify(
+        auth_manager=auth_manager,
+        requests_timeout=timeout,
+        status_forcelist=(500, 502, 503, 504),
+        retries=1,
+        status_retries=1,
+        backoff_factor=0.1,
     )
-    return spotipy.Spotify(auth_manager=auth_manager)
+    sp.prefix = api_url
+    return sp
 
 
-def search_tracks(query: str, limit: int = 10):
-    """Search Spotify tracks by text query."""
+def get_spotify_client():
+    """
+    Shared client for the current settings, so the access token is reused.
+    SPOTIFY_API_URL / SPOTIFY_TOKEN_URL point it elsewhere (e.g. a local fake).
+    """
+    return _client(
+        os.getenv("SPOTIFY_API_URL", API_URL),
+        os.getenv("SPOTIFY_TOKEN_URL", TOKEN_URL),
+        os.getenv("SPOTIPY_CLIENT_ID"),
+        os.getenv("SPOTIPY_CLIENT_SECRET"),
+        CALL_TIMEOUT,
+    )
+
+
+def _call(name: str, fn, *args, **kwargs):
+    """Run an upstream Spotify call under a timing span and outcome counter."""
+    with span(f"spotify.{name}"):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            UPSTREAM_CALLS.inc(service="spotify", call=name, outcome="error")
+            raise
+    UPSTREAM_CALLS.inc(service="spotify", call=name, outcome="ok")
+    return result
+
+
+def _query_key(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def _retry_after(e: "SpotifyException", default: float = 1.0) -> float:
+    try:
+        return float((e.headers or {}).get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _matches(track: dict, words) -> bool:
+    """Every query word starts some word of the track's name, artist or album."""
+    text = " ".join(filter(None, (track.get("name"), track.get("artist"), track.get("album"))))
+    have = _WORD.findall(text.casefold())
+    return all(any(h.startswith(w) for h in have) for w in words)
+
+
+def _cached_search(key: str, limit: int):
+    """
+    Answer from the query cache if possible: the same query fetched with at
+    least `limit` results, or a shorter prefix of it whose result list was
+    complete (fewer hits than asked for), filtered down to this query.
+    """
+    entry = search_cache.get(key)
+    if entry is not None:
+        fetched, tracks = entry
+        if fetched >= limit or len(tracks) < fetched:
+            UPSTREAM_CACHE.inc(service="spotify", call="search", result="hit")
+            return tracks[:limit]
+    words = _WORD.findall(key)
+    for end in range(len(key) - 1, MIN_PREFIX - 1, -1):
+        entry = search_cache.get(key[:end].rstrip())
+        if entry is not None and len(entry[1]) < entry[0]:
+            UPSTREAM_CACHE.inc(service="spotify", call="search", result="prefix")
+            return [t for t in entry[1] if _matches(t, words)][:limit]
+    return None
+
+
+def _search_upstream(key: str, limit: int):
+    from spotipy.exceptions import SpotifyException
+    limiter.acquire(max_wait=SEARCH_MAX_WAIT)
     sp = get_spotify_client()
-    results = sp.search(q=query, type="track", limit=limit)
-    return [map_spotify_track(item) for item in results["tracks"]["items"]]
+    try:
+        results = breaker.call(_call, "search", sp.search, q=key, type="track", limit=limit)
+    except SpotifyException as e:
+        # spotipy also reports exhausted 5xx retries as 429, but without headers
+        if e.http_status != 429 or e.headers is None:
+            raise
+        retry_after = _retry_after(e)
+        limiter.pause(retry_after)
+        raise RateLimited("spotify", retry_after) from e
+    tracks = [map_spotify_track(item) for item in results["tracks"]["items"]]
+    search_cache.set(key, (limit, tracks))
+    return tracks
+
+
+def search_tracks(query: str, limit: int = 10):
+    """
+    Search Spotify tracks by text query. Served from the short-lived query
+    cache when possible; concurrent identical searches share one call.
+    Raises RateLimited when the upstream budget is spent.
+    """
+    key = _query_key(query)
+    cached = _cached_search(key, limit)
+    if cached is not None:
+        return cached
+    tracks, shared = _search_flight.do((key, limit), lambda: _search_upstream(key, limit))
+    if shared:
+        UPSTREAM_CACHE.inc(service="spotify", call="search", result="shared")
+    return tracks
 
 
 def map_spotify_track(track: dict) -> dict:
@@ -37,8 +217,63 @@ def map_spotify_track(track: dict) -> dict:
     }
 
 
-@lru_cache(maxsize=512)
-def cached_track_lookup(track_id: str) -> dict:
-    """Fetch and cache Spotify track lookups."""
+def _fetch_track(track_id: str, hedge: bool = True) -> dict:
     sp = get_spotify_client()
-    return map_spotify_track(sp.track(track_id))
+    if hedge:
+        raw = breaker.call(
+            hedged, "spotify.track", lambda: _call("track", sp.track, track_id), _executor,
+            hedge_after=HEDGE_AFTER, timeout=CALL_TIMEOUT,
+            on_hedge=lambda: UPSTREAM_CALLS.inc(service="spotify", call="track", outcome="hedged"),
+        )
+    else:
+        raw = breaker.call(_call, "track", sp.track, track_id)
+    track = map_spotify_track(raw)
+    track_cache.set(track_id, track)
+    return track
+
+
+def _refresh_track(track_id: str) -> None:
+    try:
+        # nobody is waiting on a refresh, so no hedge: it would only add load
+        _track_flight.do(track_id, lambda: _fetch_track(track_id, hedge=False))
+    except Exception as e:
+        logger.info("Background refresh of Spotify track %s failed: %s", track_id, e)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(track_id)
+
+
+def _refresh_in_background(track_id: str) -> None:
+    with _refreshing_lock:
+        if track_id in _refreshing:
+            return
+        _refreshing.add(track_id)
+    _refresh_executor.submit(_refresh_track, track_id)
+
+
+def cached_track_lookup(track_id: str) -> dict:
+    """
+    Spotify track metadata, stale-while-revalidate: a stale cached copy is
+    returned at once while a background call refreshes it. Misses call
+    Spotify (concurrent misses for one id share the call) and raise
+    CircuitOpen without calling when Spotify is failing.
+    """
+    track, fresh = track_cache.lookup(track_id)
+    if track is not None:
+        UPSTREAM_CACHE.inc(service="spotify", call="track", result="hit" if fresh else "stale")
+        if not fresh:
+            _refresh_in_background(track_id)
+        return track
+    track, shared = _track_flight.do(track_id, lambda: _fetch_track(track_id))
+    if shared:
+        UPSTREAM_CACHE.inc(service="spotify", call="track", result="shared")
+    return track
+
+
+def reset() -> None:
+    """Forget cached answers and upstream health (tests, or after re-configuring)."""
+    search_cache.clear()
+    track_cache.clear()
+    limiter.reset()
+    breaker.reset()
+    _client.cache_clear()
@@ -0,0 +1,38 @@
+"""Krumhansl-Schmuckler key estimation from a mean chroma vector."""
+from typing import Dict
+
+import numpy as np
+
+KEY_LABELS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Krumhansl & Kessler (1982) probe-tone ratings, tonic first
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+
+def _profiles() -> np.ndarray:
+    """(24, 12) z-scored profiles: 12 major keys then 12 minor keys."""
+    rows = [np.roll(MAJOR_PROFILE, k) for k in range(12)] + [np.roll(MINOR_PROFILE, k) for k in range(12)]
+    p = np.array(rows)
+    return (p - p.mean(axis=1, keepdims=True)) / p.std(axis=1, keepdims=True)
+
+
+_PROFILES = _profiles()
+
+
+def estimate_key(chroma_mean: np.ndarray) -> Dict:
+    """
+    Correlate the chroma with all 24 rotated key profiles.
+    Returns {"key", "mode", "key_confidence"}; confidence is the winning Pearson r.
+    """
+    c = np.asarray(chroma_mean, dtype=float)
+    if c.std() == 0:
+        return {"key": KEY_LABELS[0], "mode": "major", "key_confidence": 0.0}
+    c = (c - c.mean()) / c.std()
+    r = _PROFILES @ c / len(c)
+    best = int(np.argmax(r))
+    return {
+        "key": KEY_LABELS[best % 12],
+        "mode": "major" if best < 12 else "minor",
+        "key_confidence": float(r[best]),
+    }
@@ -0,0 +1,275 @@
+"""
+Guards for calls to third-party APIs.
+
+All of these are thread-safe: upstream clients are synchronous and run on
+the threadpool, so several requests can be inside them at once.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class RateLimited(Exception):
+    """An upstream budget is spent; answered as 429 with Retry-After."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} rate limit reached, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitOpen(Exception):
+    """The breaker is open: the upstream is failing and calls are skipped."""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"{name} gave no answer within {timeout:g}s")
+        self.name = name
+        self.timeout = timeout
+
+
+# -------------------------------
+# Token bucket
+# -------------------------------
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average with bursts of up to `burst`.
+    pause() empties it until a deadline, for when the upstream itself has
+    answered 429 with a Retry-After.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, max_wait: float = 0.0) -> None:
+        """Take a token, waiting up to `max_wait` seconds; raise RateLimited otherwise."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                raise RateLimited(self.name, self._paused_until - now)
+            self._refill(now)
+            wait = (1.0 - self._tokens) / self.rate if self._tokens < 1.0 else 0.0
+            if wait > max_wait:
+                raise RateLimited(self.name, wait)
+            self._tokens -= 1.0  # may go negative: the wait below pays it back
+        if wait:
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tokens = float(self.burst)
+            self._updated = time.monotonic()
+            self._paused_until = 0.0
+
+
+# -------------------------------
+# Single flight
+# -------------------------------
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result (or error)."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """-> (result, shared); shared is True for callers that waited on another's call."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
+
+
+# -------------------------------
+# Circuit breaker
+# -------------------------------
+class CircuitBreaker:
+    """
+    Opens when at least `failure_rate` of the calls in the last `window`
+    seconds failed (given `min_calls` of them), so callers fail fast instead
+    of queueing on a sick upstream. After `cooldown` one probe call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 10,
+                 window: float = 30.0, cooldown: float = 15.0,
+                 is_failure: Callable[[BaseException], bool] = lambda e: True):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.is_failure = is_failure
+        self._outcomes: deque = deque()  # (time, failed)
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, failed: bool) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._probing:
+                self._probing = False
+                self._outcomes.clear()
+                self._opened_at = now if failed else None
+                return
+            self._outcomes.append((now, failed))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            failures = sum(f for _, f in self._outcomes)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                self._opened_at = now
+
+    def call(self, fn: Callable, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpen(self.name)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.record(self.is_failure(e))
+            raise
+        self.record(False)
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._outcomes.clear()
+            self._opened_at = None
+            self._probing = False
+
+
+# -------------------------------
+# Hedged calls
+# -------------------------------
+def hedged(name: str, fn: Callable[[], Any], executor: Executor, hedge_after: float, timeout: float,
+           on_hedge: Optional[Callable[[], None]] = None):
+    """
+    Run `fn` on `executor`; if it hasn't answered after `hedge_after`
+    seconds, start a second copy and take whichever answers first. Only for
+    idempotent reads. Raises DeadlineExceeded after `timeout` (the losing
+    copy is left to finish in the background).
+    """
+    start = time.monotonic()
+    first = executor.submit(fn)
+    done, pending = wait([first], timeout=min(hedge_after, timeout))
+    if done:
+        return first.result()
+    if hedge_after < timeout:
+        pending.add(executor.submit(fn))
+        if on_hedge:
+            on_hedge()
+
+    error = None
+    while pending:
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                return f.result()
+            error = f.exception()
+    if error is not None and not pending:
+        raise error
+    raise DeadlineExceeded(name, timeout)
+
+
+# -------------------------------
+# TTL cache
+# -------------------------------
+class TTLCache:
+    """
+    A small LRU whose entries are fresh for `ttl` seconds after they're
+    stored. With `stale_ttl`, lookup() keeps serving them (marked stale)
+    for that much longer, for stale-while-revalidate.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float = 0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: Hashable) -> Tuple[Optional[Any], bool]:
+        """-> (value, fresh); (None, False) if missing or past its stale window."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None, False
+            now = time.monotonic()
+            if entry[0] + self.stale_ttl < now:
+                del self._data[key]
+                return None, False
+            self._data.move_to_end(key)
+            return entry[1], entry[0] >= now
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value, fresh = self.lookup(key)
+        return value if fresh else None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
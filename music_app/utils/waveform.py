@@ -0,0 +1,76 @@
+"""
+Multi-resolution waveform peaks.
+
+Each level holds (min, max) per bucket as int8 pairs; level 0 has
+BASE_BUCKET samples per bucket and every next level is LEVEL_FACTOR times
+coarser, so a client can draw anything from a thumbnail to a zoomed
+editor view without touching the audio. File layout (little endian):
+
+    "WVPK" u8 version  u32 sample_rate  u8 n_levels
+    n_levels x (u32 samples_per_bucket, u32 n_buckets)
+    n_levels x int8[n_buckets, 2]
+"""
+import struct
+from typing import List, Tuple
+
+import numpy as np
+
+MAGIC = b"WVPK"
+FORMAT_VERSION = 1
+BASE_BUCKET = 256
+LEVEL_FACTOR = 4
+N_LEVELS = 4
+
+_HEADER = struct.Struct("<4sBIB")
+_LEVEL = struct.Struct("<II")
+
+
+def _to_int8(x: np.ndarray) -> np.ndarray:
+    return np.round(np.clip(x, -1.0, 1.0) * 127).astype(np.int8)
+
+
+def build(y: np.ndarray, sr: int) -> bytes:
+    """Encode the peaks of mono samples `y` at every level."""
+    y = np.asarray(y, dtype=np.float32)
+    if not len(y):
+        y = np.zeros(1, dtype=np.float32)
+    starts = np.arange(0, len(y), BASE_BUCKET)
+    lo, hi = np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
+
+    levels = []
+    spb = BASE_BUCKET
+    for _ in range(N_LEVELS):
+        levels.append((spb, np.stack([_to_int8(lo), _to_int8(hi)], axis=1)))
+        starts = np.arange(0, len(lo), LEVEL_FACTOR)
+        lo, hi = np.minimum.reduceat(lo, starts), np.maximum.reduceat(hi, starts)
+        spb *= LEVEL_FACTOR
+
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, sr, len(levels))]
+    parts += [_LEVEL.pack(spb, len(data)) for spb, data in levels]
+    parts += [data.tobytes() for _, data in levels]
+    return b"".join(parts)
+
+
+def read(blob: bytes) -> Tuple[int, List[Tuple[int, np.ndarray]]]:
+    """-> (sample_rate, [(samples_per_bucket, int8 array (n, 2)), ...]) finest first."""
+    magic, version, sr, n_levels = _HEADER.unpack_from(blob)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not a waveform peaks file")
+    pos = _HEADER.size
+    shapes = []
+    for _ in range(n_levels):
+        shapes.append(_LEVEL.unpack_from(blob, pos))
+        pos += _LEVEL.size
+    levels = []
+    for spb, n in shapes:
+        levels.append((spb, np.frombuffer(blob, dtype=np.int8, count=n * 2, offset=pos).reshape(n, 2)))
+        pos += n * 2
+    return sr, levels
+
+
+def pick_level(levels: List[Tuple[int, np.ndarray]], buckets: int) -> int:
+    """Index of the coarsest level that still has at least `buckets` buckets."""
+    for i in range(len(levels) - 1, -1, -1):
+        if len(levels[i][1]) >= buckets:
+            return i
+    return 0
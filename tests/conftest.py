@@ -1,14 +1,31 @@
+import os
 import pytest
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from music_app.db import Base, get_db
+from sqlalchemy.pool import NullPool
+
+# Run analysis on threads: tests patch analyze_file with mocks that can't be pickled
+os.environ.setdefault("ANALYSIS_POOL", "thread")
+# Tests may fall back to the local SQLite default; production never does
+os.environ.setdefault("ENV", "test")
+
+from music_app.db import Base, enforce_foreign_keys, get_db
 from music_app.main import app
+from music_app.utils import spotify
+from music_app.utils.likes import liked_sets
+from music_app.utils.response_cache import response_cache
 from fastapi.testclient import TestClient
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The API runs on an AsyncSession. TestClient starts a fresh event loop per
+# request, so pooled aiosqlite connections can't be reused across requests.
+async_engine = enforce_foreign_keys(create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool))
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
@@ -22,28 +39,26 @@ def db_session():
 
 @pytest.fixture
 def client():
-    def override_get_db():
-        db = TestingSessionLocal()
-        try:
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
             yield db
-        finally:
-            db.close()
     app.dependency_overrides[get_db] = override_get_db
     return TestClient(app)
 
 
 # Override DB dependency
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 app.dependency_overrides[get_db] = override_get_db
 
 @pytest.fixture(scope="function", autouse=True)
 def setup_and_teardown():
+    # Upstream caches and rate limits must not leak between tests
+    spotify.reset()
+    response_cache.clear()
+    liked_sets.clear()
     # Create tables
     Base.metadata.create_all(bind=engine)
     yield
@@ -54,3 +69,19 @@ def setup_and_teardown():
 @pytest.fixture(scope="function")
 def client():
     return TestClient(app)
+
+
+@pytest.fixture
+def fake_spotify(monkeypatch):
+    """A local fake Spotify API, with the real client pointed at it."""
+    from tests.fake_spotify import FakeSpotify
+
+    server = FakeSpotify().start()
+    monkeypatch.setenv("SPOTIFY_API_URL", server.url + "/v1/")
+    monkeypatch.setenv("SPOTIFY_TOKEN_URL", server.url + "/api/token")
+    monkeypatch.setenv("SPOTIPY_CLIENT_ID", "fake-id")
+    monkeypatch.setenv("SPOTIPY_CLIENT_SECRET", "fake-secret")
+    spotify.reset()
+    yield server
+    server.stop()
+    spotify.reset()
@@ -0,0 +1,101 @@
+"""
+A local stand-in for the Spotify Web API, for exercising the real client
+(spotipy over HTTP) against latency and failures.
+
+Serves the client-credentials token endpoint, GET /v1/tracks/{id} and
+GET /v1/search. Set `latency` (or queue per-request `delays`) to slow it
+down and `fail_status` to make every API call fail with that status.
+"""
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_track(track_id: str, name: str = None, popularity: int = 50) -> dict:
+    return {
+        "id": track_id,
+        "name": name or f"Song {track_id}",
+        "artists": [{"name": "Fake Artist"}],
+        "album": {"name": "Fake Album", "images": [{"url": "http://img"}]},
+        "popularity": popularity,
+        "preview_url": None,
+        "external_urls": {"spotify": f"http://open.spotify.com/track/{track_id}"},
+        "duration_ms": 200000,
+    }
+
+
+class FakeSpotify:
+    def __init__(self):
+        self.tracks = {}
+        self.latency = 0.0
+        self.delays = deque()
+        self.fail_status = None
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.server.block_on_close = False  # don't wait for slow requests on shutdown
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def count(self, prefix: str) -> int:
+        with self._lock:
+            return sum(p.startswith(prefix) for p in self.requests)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                self._send(200, {"access_token": "fake-token", "token_type": "Bearer", "expires_in": 3600})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                with fake._lock:
+                    fake.requests.append(url.path)
+                    delay = fake.delays.popleft() if fake.delays else fake.latency
+                if delay:
+                    time.sleep(delay)
+                if fake.fail_status:
+                    return self._send(fake.fail_status, {"error": {"status": fake.fail_status, "message": "fake failure"}})
+
+                if url.path.startswith("/v1/tracks/"):
+                    track = fake.tracks.get(url.path.rsplit("/", 1)[1])
+                    if track is None:
+                        return self._send(404, {"error": {"status": 404, "message": "non existing id"}})
+                    return self._send(200, track)
+                if url.path == "/v1/search":
+                    params = parse_qs(url.query)
+                    q = params.get("q", [""])[0].lower()
+                    limit = int(params.get("limit", ["10"])[0])
+                    items = [t for t in fake.tracks.values() if q in t["name"].lower()][:limit]
+                    return self._send(200, {"tracks": {"items": items}})
+                self._send(404, {"error": {"status": 404, "message": "unknown endpoint"}})
+
+        return Handler
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from music_app.models import Upload
+from music_app.utils import beatgrid
+from music_app.utils.tonality import MAJOR_PROFILE, MINOR_PROFILE, estimate_key
+
+
+def test_beat_grid_round_trip_is_compact():
+    beats = np.arange(0.37, 300.0, 0.5)  # 120 bpm for five minutes
+    beats = np.append(beats, 400.123)     # a long silent gap still encodes
+    blob = beatgrid.encode(beats)
+    assert len(blob) <= 2 * len(beats) + 2
+    assert np.allclose(beatgrid.decode(blob), beats, atol=5e-4)
+    assert beatgrid.decode(beatgrid.encode([])).size == 0
+    with pytest.raises(ValueError):
+        beatgrid.encode([1.0, 0.5])
+
+
+@pytest.mark.parametrize("profile, shift, key, mode", [
+    (MAJOR_PROFILE, 0, "C", "major"),
+    (MAJOR_PROFILE, 7, "G", "major"),
+    (MINOR_PROFILE, 9, "A", "minor"),
+])
+def test_estimate_key(profile, shift, key, mode):
+    result = estimate_key(np.roll(profile, shift))
+    assert (result["key"], result["mode"]) == (key, mode)
+    assert result["key_confidence"] == pytest.approx(1.0)
+
+
+def test_beats_endpoint_loads_grid_on_demand(client, db_session):
+    beats = [0.5, 1.0, 1.5, 2.02]
+    with_grid = Upload(filename="a.wav", user_id=1, beat_grid=beatgrid.encode(beats))
+    without = Upload(filename="b.wav", user_id=1)
+    db_session.add_all([with_grid, without])
+    db_session.commit()
+
+    r = client.get(f"/uploads/{with_grid.id}/beats")
+    assert r.status_code == 200
+    assert r.json()["count"] == 4
+    assert r.json()["beat_times"] == pytest.approx(beats)
+    assert "beat_grid" not in client.get(f"/uploads/{with_grid.id}").json()
+    assert client.get(f"/uploads/{without.id}/beats").status_code == 400
+    assert client.get("/uploads/9999/beats").status_code == 404
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from music_app.models import Upload
+from music_app.utils import compute
+from music_app.utils.metrics import REGISTRY, span
+from music_app.utils.similarity import top_k_similar
+
+
+def test_executor_sheds_load_when_full():
+    executor = compute.ComputeExecutor("test", kind="thread", max_workers=1, max_queue=0, timeout=5)
+    release = threading.Event()
+
+    async def scenario():
+        busy = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(compute.Overloaded) as exc:
+            await executor.run(lambda: None)
+        release.set()
+        await busy
+        return exc.value
+
+    exc = asyncio.run(scenario())
+    assert exc.retry_after == executor.retry_after
+    assert executor.in_flight == 0
+    executor.shutdown()
+
+
+def test_executor_timeout_keeps_slot_until_done():
+    executor = compute.ComputeExecutor("test", kind="thread", max_workers=1, max_queue=0, timeout=0.05)
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(compute.TaskTimeout):
+            await executor.run(release.wait)
+        # the abandoned task still occupies the only worker
+        with pytest.raises(compute.Overloaded):
+            await executor.run(lambda: None)
+        release.set()
+        await asyncio.sleep(0.05)
+        return await executor.run(lambda: 42)
+
+    assert asyncio.run(scenario()) == 42
+    executor.shutdown()
+
+
+def _timed_work(n):
+    with span("test.child_stage"):
+        return sum(range(n))
+
+
+def test_process_pool_spans_reach_the_parent_registry():
+    executor = compute.ComputeExecutor("test", kind="process", max_workers=1, max_queue=0, timeout=60)
+    try:
+        assert asyncio.run(executor.run(_timed_work, 10)) == 45
+    finally:
+        executor.shutdown()
+    assert 'stage_duration_seconds_count{stage="test.child_stage"} 1' in REGISTRY.render()
+
+
+def test_top_k_similar_orders_by_cosine():
+    target = {"tempo_bpm": 120.0, "energy": 0.5, "mfcc": [1.0, 2.0]}
+    candidates = [
+        (1, {"tempo_bpm": 60.0, "energy": 0.9, "mfcc": [-1.0, 0.0]}),
+        (2, {"tempo_bpm": 120.0, "energy": 0.5, "mfcc": [1.0, 2.0]}),
+        (3, None),
+        (4, {"tempo_bpm": 118.0, "energy": 0.4, "mfcc": [1.0, 2.5]}),
+    ]
+    results = top_k_similar(target, candidates, k=3)
+    assert [uid for uid, _ in results] == [2, 4, 1]
+    assert results[0][1] == pytest.approx(1.0)
+    assert top_k_similar(target, candidates, k=10)[-1] == (3, 0.0)
+
+
+def test_analyze_returns_503_when_saturated(client, db_session, monkeypatch):
+    upload = Upload(filename="busy.mp3", user_id=1)
+    db_session.add(upload)
+    db_session.commit()
+
+    saturated = compute.ComputeExecutor("analysis", kind="thread", max_workers=0, max_queue=0, timeout=1)
+    monkeypatch.setattr(compute, "analysis", saturated)
+
+    r = client.post(f"/uploads/{upload.id}/analyze")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == str(saturated.retry_after)
+
+
+def test_similar_uses_real_scores(client, db_session):
+    features = {"tempo_bpm": 120.0, "energy": 0.5}
+    rows = [
+        Upload(filename="a.mp3", user_id=1, features=json.dumps(features)),
+        Upload(filename="b.mp3", user_id=1, features=json.dumps({"tempo_bpm": 10.0, "energy": 0.9})),
+        Upload(filename="c.mp3", user_id=1, features=json.dumps(features)),
+    ]
+    db_session.add_all(rows)
+    db_session.commit()
+
+    r = client.get(f"/uploads/{rows[0].id}/similar?k=2")
+    assert r.status_code == 200
+    similar = r.json()["similar"]
+    assert [s["filename"] for s in similar] == ["c.mp3", "b.mp3"]
+    assert similar[0]["score"] == pytest.approx(1.0)
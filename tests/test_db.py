@@ -0,0 +1,59 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from music_app.db import Base, RoutingSession, pool_options
+from music_app.models import User
+
+
+def test_routing_session_reads_from_replica(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(bind=primary)
+    Base.metadata.create_all(bind=replica)
+    Session = sessionmaker(class_=RoutingSession, primary=primary, replica=replica)
+
+    # a row that only exists on the replica tells us where reads went
+    with replica.begin() as conn:
+        conn.execute(User.__table__.insert(), {"email": "replica@example.com", "password": "x"})
+
+    with Session() as db:
+        assert db.query(User).count() == 0
+
+    with Session() as db:
+        db.info["read_only"] = True
+        assert db.query(User).count() == 1
+        # writes from a read-only session still land on the primary
+        db.add(User(email="primary@example.com", password="x"))
+        db.commit()
+
+    with primary.connect() as conn:
+        assert conn.execute(User.__table__.select()).fetchall()[0].email == "primary@example.com"
+
+
+def test_pool_options_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "60")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    options = pool_options("postgresql://u:p@localhost/db")
+    assert options == {
+        "pool_pre_ping": False, "pool_recycle": 60,
+        "pool_size": 3, "max_overflow": 20, "pool_timeout": 30,
+    }
+    assert "pool_size" not in pool_options("sqlite:///./x.db")
+
+
+def test_ensure_indexes_dedupes_likes_on_existing_tables(tmp_path):
+    from sqlalchemy import inspect, text
+    from music_app.utils.schema import LIKES_UNIQUE_INDEX, ensure_indexes
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # a database from before the unique index, with a duplicated like
+        conn.execute(text(f"DROP INDEX {LIKES_UNIQUE_INDEX}"))
+        conn.execute(text("INSERT INTO user_likes (user_id, track_id) VALUES (1, 1), (1, 1), (1, 2)"))
+
+    with engine.begin() as conn:
+        ensure_indexes(conn)
+        ensure_indexes(conn)  # idempotent
+        assert conn.execute(text("SELECT id FROM user_likes ORDER BY id")).scalars().all() == [1, 3]
+        assert LIKES_UNIQUE_INDEX in {ix["name"] for ix in inspect(conn).get_indexes("user_likes")}
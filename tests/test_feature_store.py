@@ -0,0 +1,125 @@
+import json
+
+import numpy as np
+import pytest
+
+from music_app.feature_export import export_features
+from music_app.generate import synthetic_features
+from music_app.models import Upload
+from music_app.utils.feature_store import FeatureStore
+from music_app.utils.response_cache import response_cache
+
+
+def test_append_supersede_and_compact(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    store.append([1, 2, 3], np.array([[1, 0], [0, 1], [1, 1]], dtype=np.float32))
+    assert store.top_k(np.array([1.0, 0.0]), k=2) == [(1, pytest.approx(1.0)), (3, pytest.approx(0.7071, abs=1e-4))]
+
+    # re-analysed upload 1 now points the other way; the later segment wins
+    store.append([1], np.array([[0, 1]], dtype=np.float32))
+    assert len(store) == 3
+    results = store.top_k(np.array([1.0, 0.0]), k=3)
+    assert results[0][0] == 3 and {uid for uid, _ in results[1:]} == {1, 2}
+    assert results[1][1] == pytest.approx(0.0)
+    assert {uid for uid, _ in store.top_k(np.array([1.0, 0.0]), k=3, exclude=[3])} == {1, 2}
+
+    store.compact()
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert len(manifest["segments"]) == 1
+    assert sorted(store.ids().tolist()) == [1, 2, 3]
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+
+    with pytest.raises(ValueError):
+        store.append([4], np.zeros((1, 3)))
+
+
+def test_removed_ids_stay_gone_through_compaction(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    store.append([1, 2, 3], np.array([[1, 0], [0, 1], [1, 1]], dtype=np.float32))
+    store.remove([1, 3])
+    assert store.ids().tolist() == [2]
+    assert len(store) == 1
+    assert [uid for uid, _ in store.top_k(np.array([1.0, 0.0]), k=3)] == [2]
+
+    # re-adding after a removal brings the id back
+    store.append([3], np.array([[1, 0]], dtype=np.float32))
+    store.compact()
+    assert sorted(store.ids().tolist()) == [2, 3]
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+
+
+def test_appends_leave_compaction_to_background_work(tmp_path, monkeypatch):
+    monkeypatch.setattr("music_app.utils.feature_store.MAX_SEGMENTS", 2)
+    store = FeatureStore(str(tmp_path))
+    for uid in range(1, 5):
+        store.append([uid], np.array([[1, uid]], dtype=np.float32))
+    assert len(json.loads((tmp_path / "manifest.json").read_text())["segments"]) == 4
+
+    assert store.compact_if_needed() is True
+    assert store.compact_if_needed() is False
+    assert len(json.loads((tmp_path / "manifest.json").read_text())["segments"]) == 1
+    assert sorted(store.ids().tolist()) == [1, 2, 3, 4]
+
+
+def test_refresh_survives_a_concurrent_compaction(tmp_path, monkeypatch):
+    writer = FeatureStore(str(tmp_path))
+    writer.append([1], np.array([[1, 0]], dtype=np.float32))
+    writer.append([2], np.array([[0, 1]], dtype=np.float32))
+    reader = FeatureStore(str(tmp_path))
+    assert len(reader) == 2
+
+    writer.append([3], np.array([[1, 1]], dtype=np.float32))
+    # the reader reads the three-segment manifest, then another process
+    # compacts and deletes those segments before the reader opens them
+    read_manifest = reader._read_manifest
+    reads = []
+
+    def racing_read():
+        manifest = read_manifest()
+        reads.append(manifest)
+        if len(reads) == 1:
+            writer.compact()
+        return manifest
+
+    monkeypatch.setattr(reader, "_read_manifest", racing_read)
+    assert sorted(reader.ids().tolist()) == [1, 2, 3]
+    assert [len(m["segments"]) for m in reads] == [3, 1]
+
+
+def test_recommendations_from_exported_store(client, db_session, tmp_path, monkeypatch):
+    feats = synthetic_features(np.random.default_rng(7), 30)
+    uploads = [Upload(filename=f"{i}.wav", user_id=1, features=json.dumps(f)) for i, f in enumerate(feats)]
+    db_session.add_all(uploads)
+    db_session.commit()
+
+    from_db = client.get("/recommendations", params={"upload_id": uploads[0].id, "k": 5}).json()
+    similar_from_db = client.get(f"/uploads/{uploads[0].id}/similar", params={"k": 5}).json()
+
+    store = FeatureStore(str(tmp_path))
+    assert export_features(db_session.get_bind(), store) == 30
+    monkeypatch.setenv("FEATURE_STORE_DIR", str(tmp_path))
+    response_cache.clear()
+    from_store = client.get("/recommendations", params={"upload_id": uploads[0].id, "k": 5}).json()
+    similar_from_store = client.get(f"/uploads/{uploads[0].id}/similar", params={"k": 5}).json()
+
+    assert [r["id"] for r in from_store["recommendations"]] == [r["id"] for r in from_db["recommendations"]]
+    for a, b in zip(from_store["recommendations"], from_db["recommendations"]):
+        assert a["similarity"] == pytest.approx(b["similarity"], abs=1e-5)
+    assert [(r["id"], r["filename"]) for r in similar_from_store["similar"]] == \
+        [(r["id"], r["filename"]) for r in similar_from_db["similar"]]
+    for a, b in zip(similar_from_store["similar"], similar_from_db["similar"]):
+        assert a["score"] == pytest.approx(b["score"], abs=1e-5)
+
+    # nothing new to export incrementally
+    assert export_features(db_session.get_bind(), store, incremental=True) == 0
+
+    # an upload deleted after the export is filtered out, and a full export drops it
+    gone = from_store["recommendations"][0]["id"]
+    db_session.delete(db_session.get(Upload, gone))
+    db_session.commit()
+    response_cache.clear()
+    after = client.get("/recommendations", params={"upload_id": uploads[0].id, "k": 5}).json()
+    assert gone not in [r["id"] for r in after["recommendations"]]
+    assert export_features(db_session.get_bind(), store) == 29
+    assert gone not in store.ids().tolist()
+    assert len(json.loads((tmp_path / "manifest.json").read_text())["segments"]) == 1
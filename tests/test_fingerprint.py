@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from sqlalchemy import insert
+
+from music_app.models import Fingerprint, Upload
+from music_app.utils import fingerprint
+
+SR = 22050
+
+
+def _melody(rng, notes=80):
+    t = np.arange(int(SR * 0.25)) / SR
+    env = np.exp(-t * 12)
+    return np.concatenate([
+        env * (np.sin(2 * np.pi * f * t) + 0.5 * np.sin(4 * np.pi * f * t))
+        for f in rng.uniform(150, 2500, notes)
+    ]).astype(np.float32)
+
+
+def test_duplicates_found_through_hash_index(client, db_session):
+    rng = np.random.default_rng(0)
+    original = _melody(rng)
+    trim = 130 * fingerprint.HOP_LENGTH  # ~3 s
+    reupload = original[trim:] + 0.02 * rng.standard_normal(len(original) - trim).astype(np.float32)
+    unrelated = _melody(rng)
+
+    uploads = [Upload(filename=name, user_id=1) for name in ("orig.mp3", "copy.mp3", "other.mp3", "bare.mp3")]
+    db_session.add_all(uploads)
+    db_session.commit()
+    for upload, y in zip(uploads, (original, reupload, unrelated)):
+        db_session.execute(insert(Fingerprint), fingerprint.index_rows(upload.id, fingerprint.fingerprint(y, SR)))
+    db_session.commit()
+
+    r = client.get(f"/uploads/{uploads[0].id}/duplicates")
+    assert r.status_code == 200
+    dups = r.json()["duplicates"]
+    assert [d["filename"] for d in dups] == ["copy.mp3"]
+    assert dups[0]["offset_seconds"] == pytest.approx(trim / SR, abs=0.05)
+
+    # symmetric: the copy finds the original, starting before it
+    dups = client.get(f"/uploads/{uploads[1].id}/duplicates").json()["duplicates"]
+    assert [d["filename"] for d in dups] == ["orig.mp3"]
+    assert dups[0]["offset_seconds"] < 0
+
+    assert client.get(f"/uploads/{uploads[3].id}/duplicates").status_code == 400
+    assert client.get("/uploads/9999/duplicates").status_code == 404
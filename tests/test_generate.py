@@ -0,0 +1,27 @@
+import numpy as np
+from music_app.generate import _rng, generate, upload_rows
+from music_app.models import User, Track, Upload, UserLike, UserHistory
+
+
+def test_generate_writes_requested_rows(db_session):
+    engine = db_session.get_bind()
+    written = generate(engine, users=30, tracks=20, uploads=25,
+                       likes_per_user=5, history_per_user=3, seed=7, batch_size=8)
+
+    assert written == {"users": 30, "tracks": 20, "uploads": 25, "user_likes": 150, "user_history": 90}
+    assert db_session.query(User).count() == 30
+    assert db_session.query(Upload).filter(Upload.features.isnot(None)).count() == 25
+    pairs = db_session.query(UserLike.user_id, UserLike.track_id).all()
+    assert len(set(pairs)) == len(pairs)
+    track_ids = {t.id for t in db_session.query(Track)}
+    assert {h.track_id for h in db_session.query(UserHistory)} <= track_ids
+    assert sum(t.like_count for t in db_session.query(Track)) == 150
+
+
+def test_generate_is_deterministic_by_seed():
+    ids = np.arange(1, 11)
+    a = upload_rows(_rng(42, "uploads", 0), ids, 1, 5)
+    b = upload_rows(_rng(42, "uploads", 0), ids, 1, 5)
+    c = upload_rows(_rng(43, "uploads", 0), ids, 1, 5)
+    assert a == b
+    assert a["features"] != c["features"]
@@ -50,4 +50,120 @@ def list_user_likes(user_id: int, db: Session = Depends(get_db)):
             }
         }
         for l in likes
-    ]
\ No newline at end of file
+    ]
+
+def test_bulk_add_likes(client):
+    user_id = client.post("/users/create", json={"email": "bulklikes@example.com", "password": "pw"}).json()["id"]
+    track_id = client.post("/tracks/add", params={"title": "T", "artist": "A", "provider": "local"}).json()["id"]
+
+    response = client.post("/likes/bulk", json=[
+        {"user_id": user_id, "track_id": track_id},
+        {"user_id": user_id, "track_id": track_id},
+        {"user_id": user_id, "track_id": 9999},
+        {"user_id": "nope", "track_id": track_id},
+    ])
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 1
+    assert [e["row"] for e in data["errors"]] == [2, 3]
+    assert len(client.get(f"/likes/{user_id}").json()) == 1
+
+
+def test_add_like_is_idempotent_and_checked_by_constraints(client):
+    user_id = client.post("/users/create", json={"email": "idem@example.com", "password": "pw"}).json()["id"]
+    track_id = client.post("/tracks/add", params={"title": "T", "artist": "A", "provider": "local"}).json()["id"]
+
+    first = client.post("/likes/add", params={"user_id": user_id, "track_id": track_id}).json()
+    assert first["like_id"]
+    assert client.post("/likes/add", params={"user_id": user_id, "track_id": track_id}).json() == {
+        "message": "Already liked", "like_id": None,
+    }
+    assert len(client.get(f"/likes/{user_id}").json()) == 1
+
+    r = client.post("/likes/add", params={"user_id": 9999, "track_id": track_id})
+    assert r.status_code == 404 and r.json()["detail"] == "User not found"
+    r = client.post("/likes/add", params={"user_id": user_id, "track_id": 9999})
+    assert r.status_code == 404 and r.json()["detail"] == "Track not found"
+
+    assert client.delete("/likes/remove", params={"user_id": user_id, "track_id": track_id}).status_code == 200
+    assert client.delete("/likes/remove", params={"user_id": user_id, "track_id": track_id}).status_code == 404
+
+
+def test_batch_like_and_unlike(client):
+    user_id = client.post("/users/create", json={"email": "batch@example.com", "password": "pw"}).json()["id"]
+    tracks = [
+        client.post("/tracks/add", params={"title": f"T{i}", "artist": "A", "provider": "local"}).json()["id"]
+        for i in range(4)
+    ]
+    client.post("/likes/add", params={"user_id": user_id, "track_id": tracks[0]})
+
+    r = client.post("/likes/batch", json={"user_id": user_id, "like": tracks[:3] + [9999], "unlike": [tracks[3]]})
+    assert r.status_code == 200
+    assert r.json() == {"liked": tracks[1:3], "unliked": []}
+
+    r = client.post("/likes/batch", json={"user_id": user_id, "like": [tracks[3]], "unlike": tracks[:2]})
+    assert r.json() == {"liked": [tracks[3]], "unliked": tracks[:2]}
+    assert sorted(l["track"]["id"] for l in client.get(f"/likes/{user_id}").json()) == tracks[2:]
+
+    r = client.post("/likes/batch", json={"user_id": 9999, "like": tracks})
+    assert r.status_code == 404
+
+
+def test_like_counts_and_membership_follow_writes(client):
+    users = [
+        client.post("/users/create", json={"email": f"count{i}@example.com", "password": "pw"}).json()["id"]
+        for i in range(2)
+    ]
+    tracks = [
+        client.post("/tracks/add", params={"title": f"T{i}", "artist": "A", "provider": "local"}).json()["id"]
+        for i in range(3)
+    ]
+    assert client.get(f"/tracks/{tracks[0]}").json()["like_count"] == 0
+
+    for user_id in users:
+        client.post("/likes/add", params={"user_id": user_id, "track_id": tracks[0]})
+    client.post("/likes/add", params={"user_id": users[0], "track_id": tracks[0]})  # repeat: not counted
+    client.post("/likes/batch", json={"user_id": users[0], "like": tracks[1:]})
+    client.post("/likes/bulk", json=[{"user_id": users[1], "track_id": tracks[2]}])
+    assert [client.get(f"/tracks/{t}").json()["like_count"] for t in tracks] == [2, 1, 2]
+
+    check = lambda user_id: client.get(f"/likes/{user_id}/contains", params={"track_id": tracks + [9999]}).json()
+    assert check(users[0]) == {"liked": tracks}
+    assert check(users[1]) == {"liked": [tracks[0], tracks[2]]}
+
+    client.delete("/likes/remove", params={"user_id": users[0], "track_id": tracks[0]})
+    client.post("/likes/batch", json={"user_id": users[1], "unlike": [tracks[2]]})
+    assert [client.get(f"/tracks/{t}").json()["like_count"] for t in tracks] == [1, 1, 1]
+    assert check(users[0]) == {"liked": tracks[1:]}
+    assert check(users[1]) == {"liked": [tracks[0]]}
+
+    # deleting a user takes their likes out of the counts and the caches
+    assert len(client.get(f"/likes/{users[0]}").json()) == 2
+    client.delete(f"/users/{users[0]}")
+    assert client.get(f"/likes/{users[0]}").json() == []
+    assert check(users[0]) == {"liked": []}
+    assert [client.get(f"/tracks/{t}").json()["like_count"] for t in tracks] == [1, 0, 0]
+
+
+def test_liked_sets_never_cache_a_load_that_raced_a_write():
+    import asyncio
+    from music_app.utils.likes import LikedSets
+
+    class RacingDb:
+        def __init__(self, write):
+            self.write = write
+
+        async def scalars(self, query):
+            self.write()  # lands while the load's query is running
+            return [1, 2]
+
+    sets = LikedSets()
+    for write in (lambda: sets.invalidate(7), sets.clear):
+        assert list(asyncio.run(sets.get(RacingDb(write), 7))) == [1, 2]
+        assert sets.cache.get(7) is None
+    asyncio.run(sets.get(RacingDb(lambda: None), 7))
+    assert list(sets.cache.get(7)) == [1, 2]
+
+    for user_id in range(100):
+        sets.invalidate(user_id)
+    assert sets._inflight == {}  # nothing kept for users without a load in flight
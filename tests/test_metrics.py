@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from music_app.utils.metrics import Histogram, span, SQL_LATENCY, STAGE_LATENCY
+
+
+def test_metrics_endpoint_reports_routes_and_sql(client):
+    client.post("/users/create", json={"email": "metrics@example.com", "password": "testpass123"})
+    client.get("/tracks/1")
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert 'http_request_duration_seconds_count{method="POST",route="/users/create",status="200"}' in body
+    # labelled by template, not by the concrete id
+    assert 'route="/tracks/{track_id}"' in body
+    assert 'sql_query_duration_seconds_count{operation="INSERT"}' in body
+    assert 'http_request_sql_queries_bucket{method="POST",route="/users/create"' in body
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("demo_seconds", "demo", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        h.observe(value, stage="x")
+    lines = h.render()
+    assert 'demo_seconds_bucket{stage="x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="x",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{stage="x",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="x"} 3' in lines
+
+
+def test_span_records_stage():
+    with span("test.stage"):
+        pass
+    assert any('stage="test.stage"' in line for line in STAGE_LATENCY.render())
+
+
+def _sql_count(operation):
+    prefix = f'sql_query_duration_seconds_count{{operation="{operation}"}} '
+    return next((int(line[len(prefix):]) for line in SQL_LATENCY.render() if line.startswith(prefix)), 0)
+
+
+def test_failed_statements_are_timed_and_leave_nothing_behind():
+    engine = create_engine("sqlite://")
+    before = _sql_count("SELECT")
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert "query_start" not in conn.info
+    assert _sql_count("SELECT") == before + 4
@@ -0,0 +1,89 @@
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from music_app.backfill import DutyCycle, backfill_status, pending_backfills, run_backfill
+from music_app.db import Base, enforce_foreign_keys
+from music_app.migrations import include_object, upgrade_database
+
+
+def _engine(tmp_path, name="app.db"):
+    return enforce_foreign_keys(create_engine(f"sqlite:///{tmp_path / name}"))
+
+
+def test_upgrade_builds_the_model_schema(tmp_path):
+    engine = _engine(tmp_path)
+    upgrade_database(engine)
+    upgrade_database(engine)  # nothing left to do the second time
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar() == "0002"
+        context = MigrationContext.configure(conn, opts={"include_object": include_object, "compare_type": True})
+        # a model change without a revision shows up here
+        assert compare_metadata(context, Base.metadata) == []
+        assert "tracks_fts" in inspect(conn).get_table_names()
+
+
+def test_upgrade_adopts_a_create_all_database(tmp_path):
+    engine = _engine(tmp_path)
+    with engine.begin() as conn:
+        # the legacy top-level schema: no password, like_count or indexes, duplicated likes
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR(100) NOT NULL UNIQUE, "
+                          "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"))
+        conn.execute(text("CREATE TABLE tracks (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, "
+                          "artist VARCHAR(200) NOT NULL, album VARCHAR(200), provider VARCHAR(50), "
+                          "external_id VARCHAR(100), duration INTEGER, created_at TIMESTAMP)"))
+        conn.execute(text("CREATE TABLE user_likes (id INTEGER PRIMARY KEY, user_id INTEGER, track_id INTEGER)"))
+        conn.execute(text("INSERT INTO users (id, email) VALUES (1, 'old@example.com')"))
+        conn.execute(text("INSERT INTO tracks (id, title, artist) VALUES (1, 'Old Song', 'Old Artist')"))
+        conn.execute(text("INSERT INTO user_likes (user_id, track_id) VALUES (1, 1), (1, 1)"))
+
+    upgrade_database(engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT email FROM users")).scalar() == "old@example.com"
+        assert conn.execute(text("SELECT like_count FROM tracks")).scalar() == 0
+        assert conn.execute(text("SELECT COUNT(*) FROM user_likes")).scalar() == 1
+        assert "ix_uploads_analyzed" in {ix["name"] for ix in inspect(conn).get_indexes("uploads")}
+        assert conn.execute(text("SELECT rowid FROM tracks_fts WHERE tracks_fts MATCH 'old'")).scalar() == 1
+    assert pending_backfills(engine) == ["like_counts", "users_created_at"]
+
+    run_backfill(engine, "like_counts", duty=1)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT like_count FROM tracks")).scalar() == 1
+
+
+def test_backfill_resumes_where_it_stopped(tmp_path):
+    engine = _engine(tmp_path)
+    upgrade_database(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, email, password) VALUES (1, 'a@x', 'pw'), (2, 'b@x', 'pw'), "
+                          "(3, 'c@x', 'pw'), (4, 'd@x', 'pw'), (5, 'e@x', 'pw')"))
+        conn.execute(text("INSERT INTO uploads (filename, user_id, uploaded_at) VALUES ('a.wav', 1, '2020-01-02 00:00:00'), "
+                          "('b.wav', 1, '2020-01-01 00:00:00')"))
+    sleeps = []
+    throttle = DutyCycle(0.25, sleep=sleeps.append)
+
+    first = run_backfill(engine, "users_created_at", batch_size=2, max_batches=2, throttle=throttle)
+    assert first == {"batches": 2, "rows": 4, "done": 0}
+    assert len(sleeps) == 2  # three times as long as each batch took
+    state = {row["name"]: row for row in backfill_status(engine)}["users_created_at"]
+    assert (state["last_id"], state["rows"], state["done"]) == (4, 4, False)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id FROM users WHERE created_at IS NULL")).scalars().all() == [5]
+
+    second = run_backfill(engine, "users_created_at", batch_size=2, throttle=throttle)
+    assert second == {"batches": 1, "rows": 1, "done": 1}
+    assert run_backfill(engine, "users_created_at") == {"batches": 0, "rows": 0, "done": 1}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM users WHERE created_at IS NULL")).scalar() == 0
+        # taken from the user's first upload where there is one
+        assert str(conn.execute(text("SELECT created_at FROM users WHERE id = 1")).scalar()).startswith("2020-01-01")
+
+
+def test_duty_cycle_sleeps_in_proportion_to_work():
+    sleeps = []
+    throttle = DutyCycle(0.25, sleep=sleeps.append)
+    assert throttle.pace(1.0) == 3.0
+    assert DutyCycle(1.0, sleep=sleeps.append).pace(1.0) == 0
+    assert sleeps == [3.0]
@@ -0,0 +1,95 @@
+"""
+Query-plan regression tests: drive the routers, record the SQL they send,
+and EXPLAIN every statement. A full scan of a table that grows with usage
+fails the test unless the route is a deliberate full listing.
+"""
+import json
+import re
+
+import pytest
+from sqlalchemy import event
+
+from music_app.db import Base
+from music_app.models import Fingerprint, Upload
+from tests.conftest import async_engine, engine
+
+LARGE_TABLES = {"uploads", "user_likes", "user_history", "fingerprints", "tracks", "users"}
+# walking a partial index only visits the rows it was built for, so it passes
+PARTIAL_INDEXES = {
+    index.name
+    for table in Base.metadata.tables.values()
+    for index in table.indexes
+    if index.dialect_options["sqlite"]["where"] is not None
+}
+SCAN = re.compile(r"\bSCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+
+
+@pytest.fixture
+def statements():
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            captured.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    yield captured
+    event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+def full_scans(captured):
+    scans = []
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            for row in plan:
+                match = SCAN.search(row[-1])
+                if match and match.group(1) in LARGE_TABLES and match.group(2) not in PARTIAL_INDEXES:
+                    scans.append((row[-1], statement))
+    return scans
+
+
+def _seed(client, db_session):
+    user_id = client.post("/users/create", json={"email": "plans@example.com", "password": "pw"}).json()["id"]
+    tracks = [
+        client.post("/tracks/add", params={"title": f"T{i}", "artist": "A", "provider": "local"}).json()["id"]
+        for i in range(3)
+    ]
+    features = json.dumps({"tempo_bpm": 120.0, "energy": 0.5})
+    uploads = [Upload(filename=f"{i}.wav", user_id=user_id, features=features) for i in range(3)]
+    db_session.add_all(uploads)
+    db_session.flush()
+    db_session.add_all(Fingerprint(hash=7, upload_id=u.id, time_offset=i) for i, u in enumerate(uploads))
+    db_session.commit()
+    return user_id, tracks, [u.id for u in uploads]
+
+
+def test_router_queries_use_indexes(client, db_session, statements):
+    user_id, tracks, uploads = _seed(client, db_session)
+    other_id = client.post("/users/create", json={"email": "other@example.com", "password": "pw"}).json()["id"]
+    client.post("/likes/add", params={"user_id": other_id, "track_id": tracks[0]})
+    statements.clear()  # seeding isn't under test
+
+    client.post("/likes/add", params={"user_id": user_id, "track_id": tracks[0]})
+    client.post("/likes/batch", json={"user_id": user_id, "like": tracks[1:], "unlike": [tracks[0]]})
+    client.delete("/likes/remove", params={"user_id": user_id, "track_id": tracks[1]})
+    client.get(f"/likes/{user_id}")
+    client.get(f"/likes/{user_id}/contains", params={"track_id": tracks})
+    client.get(f"/tracks/{tracks[0]}")
+    client.put(f"/tracks/{tracks[0]}", params={"title": "Renamed"})
+    client.get(f"/uploads/{uploads[0]}")
+    client.get(f"/uploads/{uploads[0]}/duplicates", params={"min_matches": 1})
+    client.get(f"/uploads/{uploads[0]}/similar")
+    client.get("/recommendations", params={"upload_id": uploads[0], "k": 2})
+    client.get("/search", params={"q": "t0", "fallback": False})
+    client.delete(f"/tracks/{tracks[2]}")  # detaches the track's likes and history
+    client.delete(f"/users/{other_id}")    # and the user's uploads, likes and history
+
+    assert len(statements) > 20
+    assert full_scans(statements) == []
+
+
+def test_plan_check_flags_full_scans(client, statements):
+    # the listing endpoints read whole tables on purpose; they prove the check bites
+    client.get("/tracks/all")
+    assert [plan for plan, _ in full_scans(statements)] == ["SCAN tracks"]
@@ -0,0 +1,46 @@
+import json
+
+from music_app.models import Upload
+from music_app.reanalyze import CpuThrottle, reanalyze
+from music_app.utils.similarity import FEATURE_VERSION
+
+
+def test_reanalyze_only_touches_stale_uploads(db_session):
+    old = {"tempo_bpm": 100.0}
+    db_session.add_all([
+        Upload(filename="legacy.wav", user_id=1, features=json.dumps(old)),
+        Upload(filename="v1.wav", user_id=1, features=json.dumps(old), feature_version=1),
+        Upload(filename="current.wav", user_id=1, features=json.dumps(old), feature_version=FEATURE_VERSION),
+        Upload(filename="broken.wav", user_id=1, features=json.dumps(old), feature_version=1),
+        Upload(filename="never.wav", user_id=1),
+    ])
+    db_session.commit()
+
+    seen = []
+
+    def fake_analyze(path):
+        seen.append(path)
+        if path.endswith("broken.wav"):
+            raise ValueError("Could not load audio file")
+        return {"tempo_bpm": 128.0}
+
+    counts = reanalyze(db_session.get_bind(), upload_dir="up", batch_size=2, analyze=fake_analyze,
+                       throttle=CpuThrottle(1.0, sleep=lambda s: None))
+    assert counts == {"updated": 2, "failed": 1}
+    assert seen == ["up/legacy.wav", "up/v1.wav", "up/broken.wav"]
+
+    db_session.expire_all()
+    rows = {u.filename: u for u in db_session.query(Upload)}
+    assert rows["legacy.wav"].feature_version == FEATURE_VERSION
+    assert json.loads(rows["v1.wav"].features) == {"tempo_bpm": 128.0}
+    assert json.loads(rows["current.wav"].features) == old
+    assert rows["broken.wav"].feature_version == 1
+    assert rows["never.wav"].features is None
+
+
+def test_cpu_throttle_sleeps_in_proportion_to_budget():
+    slept = []
+    throttle = CpuThrottle(0.25, sleep=slept.append)
+    sum(i * i for i in range(300_000))  # burn some CPU
+    delay = throttle.pace()
+    assert delay > 0 and slept == [delay]
@@ -0,0 +1,105 @@
+import io
+
+from music_app.utils.response_cache import RedisBackend, response_cache
+
+
+def _track(client, **params):
+    return client.post("/tracks/add", params={"title": "Song", "artist": "Artist", "provider": "local", **params}).json()["id"]
+
+
+def test_track_is_cached_and_revalidated(client):
+    track_id = _track(client)
+
+    first = client.get(f"/tracks/{track_id}")
+    assert first.status_code == 200
+    assert first.headers["X-Cache"] == "miss"
+    second = client.get(f"/tracks/{track_id}")
+    assert second.headers["X-Cache"] == "hit"
+    assert second.json() == first.json()
+
+    etag = first.headers["ETag"]
+    r = client.get(f"/tracks/{track_id}", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+
+    # a write invalidates: new body, new ETag, and the old ETag no longer matches
+    client.put(f"/tracks/{track_id}", params={"title": "Renamed"})
+    r = client.get(f"/tracks/{track_id}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["X-Cache"] == "miss"
+    assert r.json()["title"] == "Renamed"
+    assert r.headers["ETag"] != etag
+
+    client.delete(f"/tracks/{track_id}")
+    assert client.get(f"/tracks/{track_id}").status_code == 404
+
+
+def test_likes_list_invalidated_by_like_and_track_update(client):
+    user_id = client.post("/users/create", json={"email": "cache@example.com", "password": "testpass123"}).json()["id"]
+    track_id = _track(client)
+
+    assert client.get(f"/likes/{user_id}").json() == []
+    assert client.get(f"/likes/{user_id}").headers["X-Cache"] == "hit"
+
+    client.post("/likes/add", params={"user_id": user_id, "track_id": track_id})
+    r = client.get(f"/likes/{user_id}")
+    assert r.headers["X-Cache"] == "miss"
+    assert [like["track"]["title"] for like in r.json()] == ["Song"]
+
+    client.put(f"/tracks/{track_id}", params={"title": "Renamed"})
+    assert [like["track"]["title"] for like in client.get(f"/likes/{user_id}").json()] == ["Renamed"]
+
+    client.delete("/likes/remove", params={"user_id": user_id, "track_id": track_id})
+    assert client.get(f"/likes/{user_id}").json() == []
+
+
+def test_similar_invalidated_by_analysis(client, monkeypatch):
+    monkeypatch.setattr("music_app.routers.uploads.analyze_file", lambda _: {"tempo_bpm": 120.0, "mfcc": [0.1] * 13})
+    user_id = client.post("/users/create", json={"email": "sim@example.com", "password": "testpass123"}).json()["id"]
+
+    def upload():
+        r = client.post(f"/uploads/?user_id={user_id}", files={"file": ("u.mp3", io.BytesIO(b"x"), "audio/mpeg")})
+        upload_id = r.json()["id"]
+        client.post(f"/uploads/{upload_id}/analyze")
+        return upload_id
+
+    u1, u2 = upload(), upload()
+    assert [s["id"] for s in client.get(f"/uploads/{u1}/similar").json()["similar"]] == [u2]
+    assert client.get(f"/uploads/{u1}/similar").headers["X-Cache"] == "hit"
+    # different parameters are different entries
+    assert client.get(f"/uploads/{u1}/similar", params={"k": 1}).headers["X-Cache"] == "miss"
+
+    u3 = upload()
+    r = client.get(f"/uploads/{u1}/similar")
+    assert r.headers["X-Cache"] == "miss"
+    assert {s["id"] for s in r.json()["similar"]} == {u2, u3}
+
+
+def test_degraded_recommendations_are_not_cached(client, monkeypatch):
+    monkeypatch.setattr("music_app.routers.uploads.analyze_file", lambda _: {"tempo_bpm": 120.0, "mfcc": [0.1] * 13})
+
+    def unavailable(track_id):
+        raise RuntimeError("spotify down")
+
+    monkeypatch.setattr("music_app.routers.recommendations.cached_track_lookup", unavailable)
+    user_id = client.post("/users/create", json={"email": "deg@example.com", "password": "testpass123"}).json()["id"]
+    ids = []
+    for i in range(2):
+        r = client.post(f"/uploads/?user_id={user_id}", files={"file": (f"u{i}.mp3", io.BytesIO(b"x"), "audio/mpeg")})
+        ids.append(r.json()["id"])
+        client.post(f"/uploads/{ids[-1]}/analyze")
+        client.post(f"/uploads/{ids[-1]}/link_spotify?spotify_track_id=s{i}")
+
+    r = client.get("/recommendations", params={"upload_id": ids[0]})
+    assert r.json()["recommendations"][0]["spotify"] is None
+    assert client.get("/recommendations", params={"upload_id": ids[0]}).headers["X-Cache"] == "miss"
+
+
+def test_unreachable_redis_degrades_to_no_cache(client, monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", RedisBackend("redis://127.0.0.1:1/0", ttl=60))
+    track_id = _track(client)
+    for _ in range(2):
+        r = client.get(f"/tracks/{track_id}")
+        assert r.status_code == 200
+        assert r.headers["X-Cache"] == "miss"
+    assert client.put(f"/tracks/{track_id}", params={"title": "Renamed"}).status_code == 200
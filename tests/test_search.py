@@ -0,0 +1,156 @@
+from music_app.models import Track, Upload, User
+from music_app.utils.search import PrefixIndex, fts5_query
+
+
+def _catalog(db_session):
+    db_session.add_all([
+        Track(title="Crazy in Love", artist="Beyoncé", album="Dangerously in Love", provider="local"),
+        Track(title="Love on Top", artist="Beyoncé", album="4", provider="local"),
+        Track(title="Lovely Day", artist="Bill Withers", album="Menagerie", provider="local"),
+        Track(title="Halo", artist="Beyoncé", album="I Am... Sasha Fierce", provider="local"),
+    ])
+    user = User(email="search@example.com", password="x")
+    db_session.add(user)
+    db_session.flush()
+    db_session.add(Upload(filename="demo.mp3", user_id=user.id, track_name="Love Song Demo", artist_name="Local Band"))
+    db_session.commit()
+
+
+def test_fts5_query_prefixes_last_token():
+    assert fts5_query('Crazy "in" lo') == '"crazy" "in" "lo"*'
+    assert fts5_query("  ?! ") is None
+
+
+def test_search_ranks_title_matches_first(client, db_session, monkeypatch):
+    _catalog(db_session)
+    monkeypatch.setattr("music_app.routers.search.search_tracks", lambda *a, **k: 1 / 0)
+
+    r = client.get("/search", params={"q": "love"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["source"] == "local"
+    titles = [hit["title"] for hit in data["results"]]
+    # prefix match on the last token, across tracks and uploads; Halo has no "love*"
+    assert set(titles) == {"Crazy in Love", "Love on Top", "Lovely Day", "Love Song Demo"}
+    assert {hit["source"] for hit in data["results"]} == {"track", "upload"}
+
+    # accents are folded, and every token has to match
+    data = client.get("/search", params={"q": "beyonce halo"}).json()
+    assert [hit["title"] for hit in data["results"]] == ["Halo"]
+
+    data = client.get("/search", params={"q": "love", "type": "upload"}).json()
+    assert [hit["title"] for hit in data["results"]] == ["Love Song Demo"]
+
+
+def test_search_index_follows_updates_and_deletes(client, db_session):
+    _catalog(db_session)
+    track = db_session.query(Track).filter_by(title="Halo").one()
+    track.title = "Sweet Dreams"
+    db_session.commit()
+
+    assert client.get("/search", params={"q": "halo", "fallback": False}).json()["results"] == []
+    assert client.get("/search", params={"q": "sweet"}).json()["results"][0]["id"] == track.id
+
+    db_session.delete(track)
+    db_session.commit()
+    assert client.get("/search", params={"q": "sweet", "fallback": False}).json()["results"] == []
+
+
+def test_search_falls_back_to_spotify(client, db_session, monkeypatch):
+    _catalog(db_session)
+    calls = []
+
+    def fake_search(q, limit=10):
+        calls.append(q)
+        return [{"id": "sp1", "name": "Remote Song"}]
+
+    monkeypatch.setattr("music_app.routers.search.search_tracks", fake_search)
+
+    assert client.get("/search", params={"q": "love"}).json()["source"] == "local"
+    assert calls == []
+
+    data = client.get("/search", params={"q": "nothing here"}).json()
+    assert data["source"] == "spotify"
+    assert data["results"][0]["id"] == "sp1"
+    assert calls == ["nothing here"]
+
+
+def test_autocomplete(client, db_session):
+    _catalog(db_session)
+    r = client.get("/search/autocomplete", params={"q": "lov"})
+    assert r.status_code == 200
+    suggestions = {(s["text"], s["kind"]) for s in r.json()["suggestions"]}
+    # word starts inside a title complete too
+    assert ("Crazy in Love", "title") in suggestions
+    assert ("Lovely Day", "title") in suggestions
+    assert ("Halo", "title") not in suggestions
+
+    # committed writes patch the index, so new titles show up
+    db_session.add(Track(title="Lovefool", artist="The Cardigans", provider="local"))
+    db_session.commit()
+    texts = [s["text"] for s in client.get("/search/autocomplete", params={"q": "lovef"}).json()["suggestions"]]
+    assert texts == ["Lovefool"]
+
+
+def test_autocomplete_patches_instead_of_rebuilding(client, db_session, monkeypatch):
+    from music_app.utils import search
+    _catalog(db_session)
+    client.get("/search/autocomplete", params={"q": "lov"})  # first build
+    builds = []
+    load = search._load_phrases
+    monkeypatch.setattr(search, "_load_phrases", lambda db: builds.append(1) or load(db))
+
+    track_id = db_session.query(Track.id).filter_by(title="Lovely Day").scalar()
+    user_id = db_session.query(User.id).scalar()
+    client.post("/likes/add", params={"user_id": user_id, "track_id": track_id})  # bumps like_count
+    assert not search.autocomplete.stale()
+
+    track = db_session.get(Track, track_id)
+    track.title = "Lovesong"
+    db_session.commit()
+    texts = [s["text"] for s in client.get("/search/autocomplete", params={"q": "love"}).json()["suggestions"]]
+    assert "Lovesong" in texts and "Lovely Day" not in texts
+
+    db_session.delete(track)
+    db_session.commit()
+    texts = [s["text"] for s in client.get("/search/autocomplete", params={"q": "love"}).json()["suggestions"]]
+    assert "Lovesong" not in texts
+    assert builds == []
+
+
+def test_prefix_index_prefers_heavier_suggestions():
+    index = PrefixIndex([
+        ("Beyoncé", "artist", 1.0), ("Beyoncé", "artist", 1.0), ("beyonce", "artist", 1.0),
+        ("Bell X1", "artist", 1.0), ("Bent", "artist", 5.0),
+    ])
+    assert len(index) == 3  # "beyonce" folds into "Beyoncé"
+    assert [s["text"] for s in index.complete("be", limit=2)] == ["Bent", "Beyoncé"]
+    assert index.complete("zz") == []
+
+
+def test_prefix_index_batch_patch_matches_a_rebuild(monkeypatch):
+    from music_app.utils import search
+    base = [("Crazy in Love", "title", 1.0), ("Love Me Do", "title", 2.0), ("Beyoncé", "artist", 1.0)]
+    batch = [("Lovely Day", "title", 3.0), ("Love Me Do", "title", 1.0), ("In Love Again", "title", 1.0),
+             ("Beyoncé", "artist", -1.0), ("Bill Withers", "artist", 1.0)]
+    patched = PrefixIndex(base)
+    patched.add_many(batch)
+    rebuilt = PrefixIndex(base + batch)
+    assert patched.keys == sorted(patched.keys) == rebuilt.keys
+    for prefix in ("lov", "in", "b", "crazy"):
+        assert patched.complete(prefix) == rebuilt.complete(prefix)
+
+    # a commit too big to patch leaves the index to a rebuild
+    monkeypatch.setattr(search, "PATCH_LIMIT", 2)
+    monkeypatch.setattr(search.autocomplete, "index", patched)
+    monkeypatch.setattr(search.autocomplete, "dirty", False)
+    search.autocomplete.patch(batch)
+    assert search.autocomplete.dirty
+
+
+def test_prefix_index_add_and_remove():
+    index = PrefixIndex([("Halo", "title", 1.0)])
+    index.add("Hallelujah", "title", 1.0)
+    assert [s["text"] for s in index.complete("hal")] == ["Halo", "Hallelujah"]  # ties by insertion
+    index.add("Halo", "title", -1.0)
+    assert [s["text"] for s in index.complete("hal")] == ["Hallelujah"]
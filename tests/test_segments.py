@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import pytest
+
+from music_app.models import Upload
+from music_app.utils import segments
+
+
+def _segs(*rows):
+    out = np.zeros((len(rows), segments.SEGMENT_DIM), dtype=np.float32)
+    for i, row in enumerate(rows):
+        out[i, :len(row)] = row
+    return out
+
+
+INTRO = np.array([1, 1, -1, -1])
+DROP = np.array([1, -1, 1, -1])
+# target: a quiet intro then a drop
+TARGET = _segs(INTRO, DROP)
+ALL_DROP = _segs(DROP, DROP, DROP)
+SAME_SHAPE = _segs(0.9 * INTRO + 0.1 * DROP, 0.1 * INTRO + 0.9 * DROP)
+UNRELATED = _segs([-1, 1, 1, -1], -INTRO)
+
+
+def test_segment_modes():
+    candidates = [ALL_DROP, SAME_SHAPE, UNRELATED, _segs()]
+    best = segments.segment_scores(TARGET, candidates, "best_segment")
+    avg = segments.segment_scores(TARGET, candidates, "avg_segment")
+    assert best[0] == pytest.approx(1.0)
+    assert avg[0] < 0.5
+    assert 0.98 < avg[1] <= best[1] < 1.0
+    assert best[2] < 0.1 and avg[2] < avg[0]
+    assert best[3] == avg[3] == 0.0
+
+
+def test_segment_scores_standardize_dimensions():
+    # same centroid (Hz) but the opposite timbre vs. a darker take of the same timbre
+    timbre = np.linspace(-20, 20, segments.SEGMENT_DIM - 4)
+    target = _segs([2000, 20, 0.1, 0.1, *timbre])
+    bright = _segs([2000, 20, 0.1, 0.1, *-timbre])
+    dark = _segs([500, 20, 0.1, 0.1, *timbre])
+    for mode in segments.MODES:
+        bright_score, dark_score = segments.segment_scores(target, [bright, dark], mode)
+        assert dark_score > 0.5 > bright_score
+
+
+def test_segment_means_and_packing():
+    frames = np.arange(segments.SEGMENT_DIM * 1000, dtype=np.float32).reshape(segments.SEGMENT_DIM, 1000)
+    segs = segments.segment_means(frames, sr=22050)
+    assert segs.shape == (3, segments.SEGMENT_DIM)  # 431 frames per 10 s window
+    assert segs[0, 0] == pytest.approx(frames[0, :431].mean())
+    assert np.allclose(segments.unpack(segments.pack(segs)), segs, rtol=1e-3)
+
+
+def test_similar_by_segments(client, db_session):
+    features = json.dumps({"tempo_bpm": 120.0, "energy": 0.5})
+    target = Upload(filename="t.wav", user_id=1, features=features, segments=segments.pack(TARGET))
+    drop = Upload(filename="drop.wav", user_id=1, features=features, segments=segments.pack(ALL_DROP))
+    shape = Upload(filename="shape.wav", user_id=1, features=features, segments=segments.pack(SAME_SHAPE))
+    other = Upload(filename="other.wav", user_id=1, features=features, segments=segments.pack(UNRELATED))
+    legacy = Upload(filename="legacy.wav", user_id=1, features=features)
+    db_session.add_all([target, drop, shape, other, legacy])
+    db_session.commit()
+
+    r = client.get(f"/uploads/{target.id}/similar", params={"mode": "best_segment", "k": 5})
+    assert r.status_code == 200
+    assert [s["filename"] for s in r.json()["similar"]] == ["drop.wav", "shape.wav", "other.wav"]
+
+    r = client.get(f"/uploads/{target.id}/similar", params={"mode": "avg_segment", "k": 5})
+    assert [s["filename"] for s in r.json()["similar"]] == ["shape.wav", "drop.wav", "other.wav"]
+
+    assert client.get(f"/uploads/{legacy.id}/similar", params={"mode": "best_segment"}).status_code == 400
+    assert client.get(f"/uploads/{target.id}/similar", params={"mode": "nope"}).status_code == 422
+
+    # deferred blob never leaks into plain upload responses
+    assert "segments" not in client.get(f"/uploads/{target.id}").json()
@@ -86,3 +86,89 @@ def test_link_upload_to_spotify(client, db_session, monkeypatch):
     assert data["spotify"]["name"] == "Linked Song"
     assert data["spotify"]["artist"] == "Link Artist"
     assert data["spotify"]["album"] == "Link Album"
+
+
+class CountingSpotify:
+    """search() returns a fixed catalog filtered by the query, counting calls."""
+
+    CATALOG = [
+        {"id": "1", "name": "God's Plan", "artists": [{"name": "Drake"}], "album": {"name": "Scorpion"}},
+        {"id": "2", "name": "Hotline Bling", "artists": [{"name": "Drake"}], "album": {"name": "Views"}},
+        {"id": "3", "name": "Dreams", "artists": [{"name": "Fleetwood Mac"}], "album": {"name": "Rumours"}},
+    ]
+
+    def __init__(self):
+        self.queries = []
+
+    def search(self, q, type, limit):
+        self.queries.append((q, limit))
+        words = q.split()
+        items = [t for t in self.CATALOG
+                 if all(any(w2.lower().startswith(w) for w2 in
+                            (t["name"] + " " + t["artists"][0]["name"]).split()) for w in words)]
+        return {"tracks": {"items": items[:limit]}}
+
+
+def test_spotify_search_reuses_cached_and_prefix_results(client, monkeypatch):
+    fake = CountingSpotify()
+    monkeypatch.setattr("music_app.utils.spotify.get_spotify_client", lambda: fake)
+
+    assert len(client.get("/spotify/search?q=dr&limit=10").json()["results"]) == 3
+    # same query (modulo case/space) and narrower ones are answered from the complete "dr" result
+    assert len(client.get("/spotify/search?q=DR &limit=5").json()["results"]) == 3
+    names = [t["name"] for t in client.get("/spotify/search?q=drake hot&limit=10").json()["results"]]
+    assert names == ["Hotline Bling"]
+    assert fake.queries == [("dr", 10)]
+
+    # a truncated result (as many hits as asked for) can't stand in for a longer query
+    client.get("/spotify/search?q=ho&limit=1")
+    client.get("/spotify/search?q=hot&limit=1")
+    assert fake.queries[1:] == [("ho", 1), ("hot", 1)]
+
+
+def test_spotify_search_coalesces_concurrent_queries(monkeypatch):
+    import threading
+    from music_app.utils import spotify
+
+    release = threading.Event()
+    fake = CountingSpotify()
+    original = fake.search
+
+    def slow_search(**kwargs):
+        release.wait(5)
+        return original(**kwargs)
+
+    fake.search = slow_search
+    monkeypatch.setattr(spotify, "get_spotify_client", lambda: fake)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(spotify.search_tracks("drake"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(fake.queries) == 1
+    assert all(r == results[0] for r in results)
+
+
+def test_spotify_search_rate_limited(client, monkeypatch):
+    from spotipy.exceptions import SpotifyException
+    from music_app.utils import spotify
+
+    class LimitedSpotify:
+        calls = 0
+
+        def search(self, q, type, limit):
+            LimitedSpotify.calls += 1
+            raise SpotifyException(429, -1, "too many requests", headers={"Retry-After": "7"})
+
+    monkeypatch.setattr(spotify, "get_spotify_client", lambda: LimitedSpotify())
+
+    r = client.get("/spotify/search?q=drake")
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "7"
+    # the limiter now holds further calls back without touching the upstream
+    r = client.get("/spotify/search?q=other")
+    assert r.status_code == 429
+    assert LimitedSpotify.calls == 1
@@ -0,0 +1,126 @@
+import io
+import time
+
+import pytest
+
+from music_app.utils import spotify
+from music_app.utils.upstream import CircuitOpen, DeadlineExceeded
+from tests.fake_spotify import make_track
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_track_lookup_over_http_is_cached(fake_spotify):
+    fake_spotify.tracks["t1"] = make_track("t1", "First")
+    assert spotify.cached_track_lookup("t1")["name"] == "First"
+    assert spotify.cached_track_lookup("t1")["name"] == "First"
+    assert fake_spotify.count("/v1/tracks/") == 1
+
+
+def test_slow_lookup_is_hedged(fake_spotify, monkeypatch):
+    monkeypatch.setattr(spotify, "HEDGE_AFTER", 0.1)
+    fake_spotify.tracks["t1"] = make_track("t1")
+    fake_spotify.delays.extend([1.5, 0.0])  # the first attempt stalls, the hedge doesn't
+
+    start = time.monotonic()
+    assert spotify.cached_track_lookup("t1")["id"] == "t1"
+    assert time.monotonic() - start < 1.0
+    assert fake_spotify.count("/v1/tracks/") == 2
+
+
+def test_lookup_deadline(fake_spotify, monkeypatch):
+    monkeypatch.setattr(spotify, "CALL_TIMEOUT", 0.3)
+    monkeypatch.setattr(spotify, "HEDGE_AFTER", 0.1)
+    fake_spotify.tracks["t1"] = make_track("t1")
+    fake_spotify.latency = 1.0
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        spotify.cached_track_lookup("t1")
+    assert time.monotonic() - start < 0.8
+
+
+def test_breaker_opens_on_errors_and_recovers(fake_spotify, monkeypatch):
+    monkeypatch.setattr(spotify.breaker, "min_calls", 4)
+    monkeypatch.setattr(spotify.breaker, "cooldown", 0.2)
+    fake_spotify.tracks.update({f"t{i}": make_track(f"t{i}") for i in range(10)})
+    fake_spotify.fail_status = 503
+
+    for i in range(4):
+        with pytest.raises(Exception):
+            spotify.cached_track_lookup(f"t{i}")
+    calls = fake_spotify.count("/v1/tracks/")
+    with pytest.raises(CircuitOpen):
+        spotify.cached_track_lookup("t5")
+    assert fake_spotify.count("/v1/tracks/") == calls  # failed fast, no upstream call
+    assert spotify.breaker.state == "open"
+
+    # unknown ids are the caller's problem, not Spotify's: they don't count
+    fake_spotify.fail_status = None
+    time.sleep(0.25)
+    assert spotify.breaker.state == "half_open"
+    assert spotify.cached_track_lookup("t6")["id"] == "t6"  # the probe succeeds
+    assert spotify.breaker.state == "closed"
+    for _ in range(5):
+        with pytest.raises(Exception):
+            spotify.cached_track_lookup("missing")
+    assert spotify.breaker.state == "closed"
+
+
+def test_stale_track_is_served_while_refreshing(fake_spotify, monkeypatch):
+    monkeypatch.setattr(spotify.track_cache, "ttl", 0.0)  # cached entries are stale at once
+    fake_spotify.tracks["t1"] = make_track("t1", "Old name")
+    spotify.cached_track_lookup("t1")
+    fake_spotify.tracks["t1"] = make_track("t1", "New name")
+    fake_spotify.latency = 0.3
+
+    start = time.monotonic()
+    assert spotify.cached_track_lookup("t1")["name"] == "Old name"
+    assert time.monotonic() - start < 0.2  # served from cache, not after the slow call
+    assert _wait_for(lambda: spotify.track_cache.lookup("t1")[0]["name"] == "New name")
+
+
+def test_refresh_burst_leaves_lookups_their_workers(fake_spotify, monkeypatch):
+    monkeypatch.setattr(spotify.track_cache, "ttl", 0.0)
+    ids = [f"t{i}" for i in range(40)]
+    fake_spotify.tracks.update({i: make_track(i) for i in [*ids, "new"]})
+    for track_id in ids:
+        spotify.cached_track_lookup(track_id)
+    fake_spotify.latency = 0.2
+
+    for track_id in ids:  # all stale: 40 refreshes queued at once
+        spotify.cached_track_lookup(track_id)
+    start = time.monotonic()
+    assert spotify.cached_track_lookup("new")["id"] == "new"
+    assert time.monotonic() - start < 1.0
+
+
+def test_recommendations_survive_slow_spotify(client, fake_spotify, monkeypatch):
+    monkeypatch.setattr("music_app.routers.recommendations.ENRICH_DEADLINE", 0.3)
+    monkeypatch.setattr(spotify, "HEDGE_AFTER", 5.0)
+    monkeypatch.setattr("music_app.routers.uploads.analyze_file", lambda _: {"tempo_bpm": 120.0, "mfcc": [0.1] * 13})
+
+    user_id = client.post("/users/create", json={"email": "slow@example.com", "password": "testpass123"}).json()["id"]
+    ids = []
+    for i in range(3):
+        r = client.post(f"/uploads/?user_id={user_id}", files={"file": (f"u{i}.mp3", io.BytesIO(b"x"), "audio/mpeg")})
+        ids.append(r.json()["id"])
+        client.post(f"/uploads/{ids[-1]}/analyze")
+        fake_spotify.tracks[f"s{i}"] = make_track(f"s{i}")
+        client.post(f"/uploads/{ids[-1]}/link_spotify?spotify_track_id=s{i}")
+    fake_spotify.latency = 1.5
+
+    start = time.monotonic()
+    r = client.get("/recommendations", params={"upload_id": ids[0], "k": 5})
+    assert r.status_code == 200
+    assert time.monotonic() - start < 1.0  # lookups ran concurrently and were cut off at the deadline
+    recs = r.json()["recommendations"]
+    assert len(recs) == 2
+    assert all(rec["spotify"] is None for rec in recs)
@@ -0,0 +1,70 @@
+"""
+Startup budget: import the app in a fresh interpreter under -X importtime.
+Heavy dependencies must stay off the import path (they load on first use)
+and importing must not touch the database.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# cumulative import time of music_app.main; it was ~1.3s with the heavy imports
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1200"))
+LAZY = ("librosa.core", "numba", "scipy.ndimage", "spotipy", "redis", "alembic")
+
+
+def _python(args, tmp_path):
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'app.db'}", "DB_AUTO_MIGRATE": "true"}
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def _importtime(module, tmp_path):
+    result = _python(["-X", "importtime", "-c", f"import {module}"], tmp_path)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def test_app_import_stays_light(tmp_path):
+    times = _importtime("music_app.main", tmp_path)
+
+    eager = sorted(name for name in times if name in LAZY or name.startswith(tuple(m + "." for m in LAZY)))
+    assert eager == []
+    assert times["music_app.main"] < IMPORT_BUDGET_MS
+    # migrations run in the lifespan, not at import
+    assert not (tmp_path / "app.db").exists()
+
+
+def test_app_migrates_on_startup(tmp_path):
+    code = (
+        "from fastapi.testclient import TestClient\n"
+        "from music_app.main import app\n"
+        "with TestClient(app) as client:\n"
+        "    assert client.get('/health').status_code == 200\n"
+    )
+    _python(["-c", code], tmp_path)
+
+    with sqlite3.connect(tmp_path / "app.db") as conn:
+        assert conn.execute("SELECT version_num FROM alembic_version").fetchone() is not None
+
+
+def test_app_refuses_to_start_without_database_url(tmp_path):
+    # outside ENV=dev/test there's no SQLite fallback to quietly migrate
+    env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "ENV")}
+    env["PYTHONPATH"] = ROOT
+    code = (
+        "from fastapi.testclient import TestClient\n"
+        "from music_app.main import app\n"
+        "with TestClient(app):\n"
+        "    pass\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "DatabaseNotConfigured: DATABASE_URL is not set" in result.stderr
+    assert not (tmp_path / "app.db").exists()
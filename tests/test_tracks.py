@@ -10,3 +10,75 @@ def test_add_track(client):
     assert response.status_code in [200, 201]
     data = response.json()
     assert "id" in data
+
+
+def test_bulk_add_tracks_ndjson(client):
+    body = "\n".join([
+        '{"title": "Bulk A", "artist": "Artist", "provider": "local", "external_id": "bulk-a"}',
+        '{"title": "Bulk B", "artist": "Artist", "provider": "local", "external_id": "bulk-b"}',
+        '{"title": "Missing artist", "provider": "local"}',
+        'not json',
+    ])
+    response = client.post("/tracks/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["received"] == 4
+    assert data["imported"] == 2
+    assert [e["row"] for e in data["errors"]] == [2, 3]
+
+    # re-sending an external_id updates the existing row instead of duplicating it
+    response = client.post("/tracks/bulk", json=[
+        {"title": "Bulk A v2", "artist": "Artist", "provider": "local", "external_id": "bulk-a"},
+    ])
+    assert response.json()["imported"] == 1
+    titles = sorted(t["title"] for t in client.get("/tracks/all").json())
+    assert titles == ["Bulk A v2", "Bulk B"]
+
+
+def test_bulk_add_tracks_bad_bytes_and_quoted_newlines(client):
+    body = b"\n".join([
+        b'{"title": "\xff", "artist": "A", "provider": "local"}',
+        b'{"title": "Fine", "artist": "A", "provider": "local"}',
+    ])
+    data = client.post("/tracks/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}).json()
+    assert data["imported"] == 1
+    assert data["errors"][0]["row"] == 0 and "UTF-8" in data["errors"][0]["error"]
+
+    body = 'title,artist,provider,external_id\r\n"Line1\nLine2",A,local,\r\nSolo,B,local,\r\n'
+    data = client.post("/tracks/bulk", content=body, headers={"Content-Type": "text/csv"}).json()
+    assert (data["received"], data["imported"], data["errors"]) == (2, 2, [])
+    titles = sorted(t["title"] for t in client.get("/tracks/all").json())
+    assert titles == ["Fine", "Line1\nLine2", "Solo"]
+
+
+def test_bulk_csv_stray_quote_fails_only_its_row(client, monkeypatch):
+    # a quote inside an unquoted field is just a character
+    body = 'title,artist,provider,external_id\nRo"ck,A,local,\nNext,A,local,\n'
+    data = client.post("/tracks/bulk", content=body, headers={"Content-Type": "text/csv"}).json()
+    assert (data["imported"], data["errors"]) == (2, [])
+
+    # an unclosed quote fails its own row; every later line is still read
+    rows = "".join(f"T{i},B,local,\n" for i in range(5))
+    body = f'title,artist,provider,external_id\n"Open,B,local,\n{rows}'
+    data = client.post("/tracks/bulk", content=body, headers={"Content-Type": "text/csv"}).json()
+    assert data["imported"] == 5
+    assert data["errors"] == [{"row": 0, "error": "Unterminated quoted field"}]
+
+    monkeypatch.setattr("music_app.utils.bulk.MAX_RECORD_LINES", 3)
+    body = f'title,artist,provider,external_id\n"Capped,C,local,\n{rows.replace("B,", "C,")}'
+    data = client.post("/tracks/bulk", content=body, headers={"Content-Type": "text/csv"}).json()
+    assert data["imported"] == 5 and len(data["errors"]) == 1
+
+
+def test_list_tracks_serialization(client):
+    client.post("/tracks/add", params={"title": "Ünïcode", "artist": "A", "provider": "local", "external_id": "u1"})
+    response = client.get("/tracks/all")
+    assert response.headers["content-type"] == "application/json"
+    [track] = response.json()
+    assert track["title"] == "Ünïcode"
+    assert {"id", "title", "artist", "album", "provider", "external_id", "duration"} <= set(track)
+
+    # every route documents its response
+    paths = client.get("/openapi.json").json()["paths"]
+    assert "$ref" in str(paths["/uploads/{upload_id}/similar"]["get"]["responses"]["200"])
+    assert paths["/tracks/all"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]["type"] == "array"
@@ -112,4 +112,157 @@ def test_similar_uploads(mock_analyze_file, client, db_session):
     assert "similar" in data
     # Should find one similar upload (u2)
     if data["similar"]:  # May be empty if similarity calculation returns no results
-        assert len(data["similar"]) <= 1
\ No newline at end of file
+        assert len(data["similar"]) <= 1
+
+def test_stream_upload_writes_file_and_checksum(client, db_session, tmp_path, monkeypatch):
+    user_id = client.post("/users/create", json={"email": "uploader@example.com", "password": "testpass123"}).json()["id"]
+    import hashlib
+    from music_app.routers import uploads
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+
+    body = b"RIFF" + bytes(range(256)) * 4096
+    r = client.post(f"/uploads/stream?user_id={user_id}&filename=big.wav", content=body)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["size_bytes"] == len(body)
+    assert data["checksum"] == hashlib.sha256(body).hexdigest()
+    assert (tmp_path / data["filename"]).read_bytes() == body
+
+
+def test_stream_upload_rejects_oversized_body(client, db_session, tmp_path, monkeypatch):
+    user_id = client.post("/users/create", json={"email": "uploader@example.com", "password": "testpass123"}).json()["id"]
+    from music_app.routers import uploads
+    from music_app.utils import ingest
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest, "MAX_UPLOAD_BYTES", 1024)
+
+    r = client.post(f"/uploads/stream?user_id={user_id}&filename=big.wav", content=b"x" * 2048)
+    assert r.status_code == 413
+    r = client.post(f"/uploads/stream?user_id={user_id}&filename=bad.wav", content=b"x",
+                    headers={"Content-Length": "one"})
+    assert r.status_code == 400
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_resumable_upload_session(client, db_session, tmp_path, monkeypatch):
+    user_id = client.post("/users/create", json={"email": "uploader@example.com", "password": "testpass123"}).json()["id"]
+    import hashlib
+    from music_app.routers import uploads
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+
+    body = b"0123456789" * 1000
+    r = client.post(f"/uploads/sessions?user_id={user_id}&filename=song.mp3&size={len(body)}")
+    assert r.status_code == 200
+    sid = r.json()["session_id"]
+
+    assert client.put(f"/uploads/sessions/{sid}?offset=0", content=body[:4000]).json()["offset"] == 4000
+
+    # a stale offset is refused and the current one reported
+    r = client.put(f"/uploads/sessions/{sid}?offset=0", content=body[:4000])
+    assert r.status_code == 409
+    assert r.headers["Upload-Offset"] == "4000"
+
+    # not done yet
+    assert client.post(f"/uploads/sessions/{sid}/complete").status_code == 409
+
+    # resume from where the server says we are
+    offset = client.get(f"/uploads/sessions/{sid}").json()["offset"]
+    client.put(f"/uploads/sessions/{sid}?offset={offset}", content=body[offset:])
+
+    r = client.post(f"/uploads/sessions/{sid}/complete")
+    assert r.status_code == 200
+    data = r.json()
+    assert data["size_bytes"] == len(body)
+    assert data["checksum"] == hashlib.sha256(body).hexdigest()
+    assert (tmp_path / data["filename"]).read_bytes() == body
+    assert client.get(f"/uploads/sessions/{sid}").status_code == 404
+
+
+def test_upload_is_transcoded_to_canonical_pcm(client, db_session, tmp_path, monkeypatch):
+    user_id = client.post("/users/create", json={"email": "uploader@example.com", "password": "testpass123"}).json()["id"]
+    import numpy as np
+    import soundfile as sf
+    from music_app.routers import uploads
+    from music_app.utils.audio import CANONICAL_SR, canonical_path, load_audio
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+
+    t = np.arange(44100) / 44100
+    stereo = np.stack([np.sin(2 * np.pi * 440 * t)] * 2, axis=1).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, stereo, 44100, format="WAV")
+
+    r = client.post(f"/uploads/stream?user_id={user_id}&filename=tone.wav", content=buf.getvalue())
+    assert r.status_code == 200
+    path = str(tmp_path / r.json()["filename"])
+
+    # the background task ran once the response was sent
+    pcm = np.load(canonical_path(path))
+    assert pcm.dtype == np.float32 and pcm.ndim == 1
+    assert abs(len(pcm) - CANONICAL_SR) <= 1
+
+    y, sr = load_audio(path)
+    assert isinstance(y, np.memmap) and sr == CANONICAL_SR
+
+
+def test_undecodable_upload_is_not_transcoded(client, db_session, tmp_path, monkeypatch):
+    user_id = client.post("/users/create", json={"email": "uploader@example.com", "password": "testpass123"}).json()["id"]
+    from music_app.routers import uploads
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+
+    r = client.post(f"/uploads/stream?user_id={user_id}&filename=junk.mp3", content=b"not audio")
+    assert r.status_code == 200
+    assert [p.name for p in tmp_path.iterdir() if p.is_file()] == [r.json()["filename"]]
+
+
+def test_waveform_and_preview_are_served_with_caching(client, db_session, tmp_path, monkeypatch):
+    user_id = client.post("/users/create", json={"email": "uploader@example.com", "password": "testpass123"}).json()["id"]
+    import numpy as np
+    import soundfile as sf
+    from music_app.routers import uploads
+    from music_app.utils import waveform
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+
+    sr = 22050
+    t = np.arange(sr * 40) / sr
+    y = (np.sin(2 * np.pi * 220 * t) * np.where(t > 20, 0.9, 0.1)).astype(np.float32)  # loud second half
+    buf = io.BytesIO()
+    sf.write(buf, y, sr, format="WAV")
+    upload_id = client.post(f"/uploads/stream?user_id={user_id}&filename=wave.wav", content=buf.getvalue()).json()["id"]
+
+    r = client.get(f"/uploads/{upload_id}/waveform", params={"buckets": 500})
+    assert r.status_code == 200
+    body = r.json()
+    # coarsest level with >= 500 buckets: 40 s / 1024 samples per bucket
+    assert body["samples_per_bucket"] == waveform.BASE_BUCKET * waveform.LEVEL_FACTOR
+    assert len(body["min"]) == len(body["max"]) >= 500
+    assert max(body["max"]) > 100 and min(body["min"]) < -100
+
+    r304 = client.get(f"/uploads/{upload_id}/waveform", params={"buckets": 500},
+                      headers={"If-None-Match": r.headers["etag"]})
+    assert r304.status_code == 304
+
+    binary = client.get(f"/uploads/{upload_id}/waveform", params={"buckets": 500, "format": "binary"})
+    assert binary.headers["etag"] != r.headers["etag"]
+    assert len(binary.content) == 2 * len(body["min"])
+
+    preview = client.get(f"/uploads/{upload_id}/preview")
+    assert preview.status_code == 200
+    assert preview.headers["content-type"] == "audio/ogg"
+    clip, clip_sr = sf.read(io.BytesIO(preview.content))
+    assert len(clip) == 30 * clip_sr
+    assert np.abs(clip).max() > 0.5  # picked from the loud half
+
+    partial = client.get(f"/uploads/{upload_id}/preview", headers={"Range": "bytes=0-99"})
+    assert partial.status_code == 206
+    assert partial.content == preview.content[:100]
+    assert client.get(f"/uploads/{upload_id}/preview",
+                      headers={"If-None-Match": preview.headers["etag"]}).status_code == 304
+
+
+def test_waveform_missing_for_undecodable_upload(client, db_session, tmp_path, monkeypatch):
+    user_id = client.post("/users/create", json={"email": "uploader@example.com", "password": "testpass123"}).json()["id"]
+    from music_app.routers import uploads
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    upload_id = client.post(f"/uploads/stream?user_id={user_id}&filename=junk.mp3", content=b"junk").json()["id"]
+    assert client.get(f"/uploads/{upload_id}/waveform").status_code == 404
+    assert client.get(f"/uploads/{upload_id}/preview").status_code == 404
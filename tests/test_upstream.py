@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+from music_app.utils.upstream import RateLimited, SingleFlight, TTLCache, TokenBucket
+
+
+def test_token_bucket_bursts_then_limits():
+    bucket = TokenBucket("test", rate=10, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    with pytest.raises(RateLimited) as exc:
+        bucket.acquire()
+    assert 0 < exc.value.retry_after <= 0.1
+    bucket.acquire(max_wait=0.2)  # waits for the next token instead
+
+
+def test_token_bucket_pause_honours_retry_after():
+    bucket = TokenBucket("test", rate=100, burst=5)
+    bucket.pause(5)
+    with pytest.raises(RateLimited) as exc:
+        bucket.acquire(max_wait=1)
+    assert exc.value.retry_after > 4
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    calls, results = [], []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(results) == [("value", False)] + [("value", True)] * 4
+
+    # the key is free again afterwards, and errors propagate
+    with pytest.raises(ZeroDivisionError):
+        flight.do("k", lambda: 1 / 0)
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)  # evicts b, the least recently used
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    time.sleep(0.06)
+    assert cache.get("a") is None
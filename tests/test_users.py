@@ -1,3 +1,13 @@
+import json
+import os
+
+import numpy as np
+
+from music_app.models import Fingerprint, Upload, User
+from music_app.routers.uploads import UPLOAD_DIR
+from music_app.utils.feature_store import FeatureStore
+
+
 def test_create_user(client):
     unique_email = "user_test@example.com"
     response = client.post(
@@ -8,3 +18,58 @@ def test_create_user(client):
     data = response.json()
     assert "id" in data
     assert data["email"] == unique_email
+    assert data["created_at"] is not None
+    assert client.get(f"/users/{data['id']}").json()["created_at"] == data["created_at"]
+
+
+def test_bulk_create_users_csv(client):
+    body = "email,password\nbulk1@example.com,pw1\nbulk2@example.com,pw2\nbulk3@example.com\n"
+    response = client.post("/users/bulk", content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["received"] == 3
+    assert data["imported"] == 2
+    assert data["errors"][0]["row"] == 2
+
+
+def test_bulk_import_never_changes_existing_users(client, db_session):
+
+    client.post("/users/create", json={"email": "keep@example.com", "password": "one"})
+    body = [{"email": "keep@example.com", "password": "two"},
+            {"email": "new@example.com", "password": "pw"},
+            {"email": "new@example.com", "password": "again"}]
+    data = client.post("/users/bulk", json=body).json()
+    assert data["imported"] == 1
+    assert data["errors"] == [
+        {"row": 0, "error": "Email already registered"},
+        {"row": 2, "error": "Duplicate email in import"},
+    ]
+    assert db_session.query(User.password).filter_by(email="keep@example.com").scalar() == "one"
+
+
+def test_delete_user_removes_their_uploads(client, db_session, tmp_path, monkeypatch):
+    owner = client.post("/users/create", json={"email": "owner@example.com", "password": "pw"}).json()["id"]
+    other = client.post("/users/create", json={"email": "other@example.com", "password": "pw"}).json()["id"]
+    features = json.dumps({"tempo_bpm": 120.0, "mfcc": [1.0]})
+    mine = [Upload(filename=f"owned-{i}.wav", user_id=owner, features=features) for i in range(2)]
+    theirs = Upload(filename="kept.wav", user_id=other, features=features)
+    db_session.add_all([*mine, theirs])
+    db_session.flush()
+    db_session.add(Fingerprint(hash=7, upload_id=mine[0].id, time_offset=0))
+    db_session.commit()
+    mine_ids, kept_id = [u.id for u in mine], theirs.id
+    files = [os.path.join(UPLOAD_DIR, u.filename + suffix) for u in mine for suffix in ("", ".peaks")]
+    for path in files:
+        with open(path, "wb") as f:
+            f.write(b"x")
+    store = FeatureStore(str(tmp_path))
+    store.append([*mine_ids, kept_id], np.ones((3, 2), dtype=np.float32))
+    monkeypatch.setenv("FEATURE_STORE_DIR", str(tmp_path))
+
+    assert client.delete(f"/users/{owner}").status_code == 200
+
+    db_session.expunge_all()
+    assert db_session.query(Upload.id).all() == [(kept_id,)]
+    assert db_session.query(Fingerprint).count() == 0
+    assert store.ids().tolist() == [kept_id]
+    assert not any(os.path.exists(path) for path in files)